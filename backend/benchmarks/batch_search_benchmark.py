@@ -0,0 +1,110 @@
+"""
+Compare VectorStore.batch_similarity_search with a loop of similarity_search
+calls over the same queries.
+
+Runs offline against benchmarks.fake_services (one embedding request costs
+--embedding-latency-ms plus HTTP overhead, like the real API's per-request
+latency): builds a store of --chunks synthetic chunks, optionally padded with
+random vectors to --index-chunks, then searches --queries queries both ways.
+Reports wall time, queries/sec and embedding requests for each, the FAISS part
+alone (n single-row searches vs one (n, dim) matrix search over the same
+embeddings), and how closely the two paths agree: scores differ only by float
+rounding (~1e-7), which can reorder chunks whose scores tie.
+
+Usage (from the backend directory):
+    python -m benchmarks.batch_search_benchmark --queries 1000 --chunks 5000
+    python -m benchmarks.batch_search_benchmark --queries 1000 --index-chunks 1000000 --out batch.json
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_services import FakeConfig, FakeServices
+from benchmarks.run import bench_ingest, configure_environment, pad_index, synthetic_queries
+
+
+def timed(label: str, fn):
+    print(label, file=sys.stderr)
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def summary(seconds: float, n: int, requests: int | None = None) -> dict:
+    result = {"seconds": round(seconds, 3), "queries_per_sec": round(n / seconds, 1)}
+    if requests is not None:
+        result["embedding_requests"] = requests
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, default=5000, help="Chunks embedded through add_texts")
+    parser.add_argument("--index-chunks", type=int, default=0, help="Pad the index with synthetic vectors up to this size")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--embedding-latency-ms", type=float, default=FakeConfig.embedding_latency_ms)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    services = FakeServices(FakeConfig(embedding_latency_ms=args.embedding_latency_ms)).start()
+    configure_environment(services, tempfile.mkdtemp(prefix="rag-batch-"))
+    from src.services.vector_store import VectorStore
+
+    print(f"building store: {args.chunks} chunks", file=sys.stderr)
+    bench_ingest(args.chunks)
+    if args.index_chunks:
+        pad_index(args.index_chunks)
+    store = VectorStore()
+    queries = synthetic_queries(args.queries)
+    n = len(queries)
+
+    def requests_during(fn):
+        before = services.requests("embeddings")
+        result, seconds = fn()
+        return result, seconds, services.requests("embeddings") - before
+
+    looped, loop_seconds, loop_requests = requests_during(
+        lambda: timed("single-query loop", lambda: [store.similarity_search(q, k=args.k) for q in queries])
+    )
+    batched, batch_seconds, batch_requests = requests_during(
+        lambda: timed("batch", lambda: store.batch_similarity_search(queries, k=args.k))
+    )
+
+    embeddings = store.embed_queries(queries)
+    _, index_loop_seconds = timed("index.search loop", lambda: [store.index.search(row[None, :], args.k) for row in embeddings])
+    _, index_batch_seconds = timed("index.search matrix", lambda: store.index.search(embeddings, args.k))
+    services.stop()
+
+    same_ranking = sum(
+        [meta["text"] for _, meta, _ in a] == [meta["text"] for _, meta, _ in b] for a, b in zip(looped, batched)
+    )
+    score_diff = max(
+        (abs(x - y) for a, b in zip(looped, batched) for (_, _, x), (_, _, y) in zip(a, b)), default=0.0
+    )
+
+    report = {
+        "queries": n,
+        "index_size": len(store),
+        "k": args.k,
+        "embedding_latency_ms": args.embedding_latency_ms,
+        "results": {
+            "loop": summary(loop_seconds, n, loop_requests),
+            "batch": summary(batch_seconds, n, batch_requests),
+            "speedup": round(loop_seconds / batch_seconds, 1),
+            "index_search_loop": summary(index_loop_seconds, n),
+            "index_search_matrix": summary(index_batch_seconds, n),
+            "same_ranking_share": round(same_ranking / n, 4),
+            "max_score_diff": float(score_diff),
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
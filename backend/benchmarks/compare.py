@@ -0,0 +1,75 @@
+"""
+Compare two benchmark result files produced by benchmarks.run.
+
+Prints every numeric metric side by side with the relative change and flags
+regressions larger than --threshold (default 10%). Metrics named *_per_sec are
+higher-is-better; everything else (latencies, RSS, seconds) is lower-is-better.
+Exits non-zero when a regression is found, so it can gate CI.
+
+Usage:
+    python -m benchmarks.compare results/base.json results/new.json
+"""
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = ("_per_sec",)
+# Workload descriptors rather than performance measurements
+IGNORED = ("padded", "chunks", "turns", "index_size", "web_search_rate")
+
+
+def flatten(data: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def is_regression(name: str, base: float, new: float, threshold: float) -> bool:
+    if base == 0:
+        return False
+    change = (new - base) / base
+    if any(part in name for part in HIGHER_IS_BETTER):
+        return change < -threshold
+    return change > threshold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    base_metrics = flatten(base["metrics"])
+    new_metrics = flatten(new["metrics"])
+    print(f"base: {base.get('commit', '?')[:10]}  new: {new.get('commit', '?')[:10]}")
+
+    regressions = []
+    for name in sorted(set(base_metrics) & set(new_metrics)):
+        if name.split(".")[-1] in IGNORED:
+            continue
+        b, n = base_metrics[name], new_metrics[name]
+        change = (n - b) / b * 100 if b else 0.0
+        flag = ""
+        if is_regression(name, b, n, args.threshold):
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:40s} {b:12.3f} {n:12.3f} {change:+8.1f}%{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""
+Local, deterministic stand-ins for Azure OpenAI and the Brave Search API.
+
+Serves just enough of each API for the backend to run unmodified:
+
+- POST /openai/deployments/{deployment}/embeddings
+- POST /openai/deployments/{deployment}/chat/completions  (streaming and not; the
+  `fast_deployment` answers `fast_speedup` times quicker, to model routing)
+- GET  /res/v1/web/search
+
+Embeddings are hashed bag-of-words vectors, so the same text always gets the
+same vector and texts sharing words are close. Latency, time-to-first-token and
+token rate are configurable so benchmarks can model a realistic upstream.
+
+Run standalone (then point AZURE_OPENAI_ENDPOINT and BRAVE_SEARCH_URL at it):
+    python -m benchmarks.fake_services --port 8765 --ttft-ms 300 --tokens-per-second 60
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+WORD_RE = re.compile(r"\w+")
+FILLER = "The document indicates that the projected figures depend on the assumptions described in section".split()
+
+
+@dataclass
+class FakeConfig:
+    embedding_dim: int = 1536
+    embedding_latency_ms: float = 20.0
+    ttft_ms: float = 300.0
+    tokens_per_second: float = 60.0
+    completion_tokens: int = 200
+    # A cheaper deployment for model routing: this much lower TTFT and higher token rate
+    fast_deployment: str = "fake-chat-fast"
+    fast_speedup: float = 2.0
+    search_latency_ms: float = 400.0
+    search_results: int = 3
+
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    """Deterministic unit vector: each word adds +/-1 at a few hashed positions"""
+    vec = np.zeros(dim, dtype="float32")
+    for word in WORD_RE.findall(text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=16).digest()
+        for i in range(0, 16, 4):
+            h = int.from_bytes(digest[i:i + 4], "little")
+            vec[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        vec[0] = 1.0
+        return vec
+    return vec / norm
+
+
+class _Handler(BaseHTTPRequestHandler):
+    config: FakeConfig = FakeConfig()
+    counts: dict = {}
+    counts_lock = threading.Lock()
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, keep-alive clients hit Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith("/web/search"):
+            return self._web_search(parse_qs(url.query))
+        self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._read_json()
+        if path.endswith("/embeddings"):
+            return self._embeddings(body)
+        if path.endswith("/chat/completions"):
+            return self._chat(body, deployment=path.split("/deployments/")[-1].split("/")[0])
+        self._send_json({"error": "not found"}, 404)
+
+    def _count(self, name: str):
+        with self.counts_lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def _embeddings(self, body: dict):
+        self._count("embeddings")
+        time.sleep(self.config.embedding_latency_ms / 1000)
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dim = body.get("dimensions") or self.config.embedding_dim
+        as_base64 = body.get("encoding_format") == "base64"
+
+        data = []
+        for i, text in enumerate(inputs):
+            vec = fake_embedding(text, dim)
+            embedding = base64.b64encode(vec.astype("<f4").tobytes()).decode("ascii") if as_base64 else vec.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        tokens = sum(len(WORD_RE.findall(t)) for t in inputs)
+        self._send_json({
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _completion_tokens(self, body: dict) -> list[str]:
+        limit = body.get("max_tokens") or body.get("max_completion_tokens") or self.config.completion_tokens
+        count = min(limit, self.config.completion_tokens)
+        return [(" " if i else "") + FILLER[i % len(FILLER)] for i in range(count)]
+
+    def _usage(self, body: dict, completion_tokens: int) -> dict:
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _chat(self, body: dict, deployment: str = ""):
+        tokens = self._completion_tokens(body)
+        model = body.get("model", "fake-chat")
+        speedup = self.config.fast_speedup if deployment == self.config.fast_deployment else 1.0
+        tokens_per_second = self.config.tokens_per_second * speedup
+        time.sleep(self.config.ttft_ms / 1000 / speedup)
+
+        if not body.get("stream"):
+            time.sleep(len(tokens) / tokens_per_second)
+            return self._send_json({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": self._usage(body, len(tokens)),
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_event(payload):
+            data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        interval = 1 / tokens_per_second
+        try:
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(interval)
+                write_event({**base, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            write_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                write_event({**base, "choices": [], "usage": self._usage(body, len(tokens))})
+            write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _web_search(self, query: dict):
+        time.sleep(self.config.search_latency_ms / 1000)
+        q = (query.get("q") or [""])[0]
+        count = min(int((query.get("count") or [self.config.search_results])[0]), self.config.search_results)
+        results = [
+            {
+                "title": f"Result {i + 1} for {q}",
+                "url": f"https://example.com/{i + 1}",
+                "description": f"Synthetic web result {i + 1} about {q}.",
+                "age": "1 day ago",
+            }
+            for i in range(count)
+        ]
+        self._send_json({"web": {"results": results}})
+
+
+class FakeServices:
+    """Runs the fake APIs on a background thread"""
+    def __init__(self, config: FakeConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.counts = {}
+        handler = type("Handler", (_Handler,), {"config": config or FakeConfig(), "counts": self.counts})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def azure_endpoint(self) -> str:
+        return self.url + "/"
+
+    @property
+    def brave_search_url(self) -> str:
+        return self.url + "/res/v1/web/search"
+
+    def requests(self, endpoint: str) -> int:
+        """Requests served so far by one fake endpoint (e.g. "embeddings")"""
+        return self.counts.get(endpoint, 0)
+
+    def start(self) -> "FakeServices":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--embedding-dim", type=int, default=FakeConfig.embedding_dim)
+    parser.add_argument("--embedding-latency-ms", type=float, default=FakeConfig.embedding_latency_ms)
+    parser.add_argument("--ttft-ms", type=float, default=FakeConfig.ttft_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeConfig.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=FakeConfig.completion_tokens)
+    parser.add_argument("--search-latency-ms", type=float, default=FakeConfig.search_latency_ms)
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        embedding_dim=args.embedding_dim,
+        embedding_latency_ms=args.embedding_latency_ms,
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        search_latency_ms=args.search_latency_ms,
+    )
+    services = FakeServices(config, args.host, args.port)
+    print(f"Fake Azure OpenAI endpoint: {services.azure_endpoint}")
+    print(f"Fake Brave search URL:      {services.brave_search_url}")
+    try:
+        services.server.serve_forever()
+    except KeyboardInterrupt:
+        services.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
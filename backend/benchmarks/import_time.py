@@ -0,0 +1,92 @@
+"""
+Measure how long importing the app takes, from `python -X importtime`.
+
+Imports the module (default src.main) in fresh interpreters and reports the
+best total of --runs, the slowest packages by cumulative time, and
+any package from DEFERRED that was imported although the app should only load
+it at warm-up or on first use. Exits non-zero when the total exceeds
+--budget-ms or a deferred package was imported, so it can gate CI.
+benchmarks.run includes the same measurement as metrics.import.
+
+Usage (from the backend directory, with the app's environment variables set):
+    python -m benchmarks.import_time --budget-ms 1500
+    python -m benchmarks.import_time --module src.api.chat --top 20
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Packages the app must not import at start-up (see warm_up in src.main)
+DEFERRED = ("faiss", "openai", "pypdf", "pypdfium2", "pdfminer", "pyarrow")
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """(module, self us, cumulative us, nesting depth) per line of -X importtime output"""
+    modules = []
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return modules
+
+
+def measure_import(module: str = "src.main", runs: int = 3, top: int = 10) -> dict:
+    """Import time of a module in fresh interpreters (best of runs)"""
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, env=os.environ.copy()
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        modules = parse_importtime(result.stderr)
+        total = sum(cumulative for _, _, cumulative, depth in modules if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, modules)
+
+    total, modules = best
+    # Cumulative time of each package's own entry (its first import), apart from the app itself
+    packages = {name: cumulative for name, _, cumulative, _ in modules if "." not in name and name != "src"}
+    slowest = sorted(packages.items(), key=lambda item: -item[1])
+    loaded = {name.split(".")[0] for name, _, _, _ in modules}
+    return {
+        "module": module,
+        "total_ms": round(total / 1000, 1),
+        "modules": len(modules),
+        "slowest": {name: round(cumulative / 1000, 1) for name, cumulative in slowest[:top]},
+        "deferred_imported": sorted(loaded & set(DEFERRED)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to list")
+    parser.add_argument("--budget-ms", type=float, help="Fail when the import takes longer than this")
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = measure_import(args.module, args.runs, args.top)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if args.budget_ms and report["total_ms"] > args.budget_ms:
+        failures.append(f"import took {report['total_ms']} ms, budget {args.budget_ms} ms")
+    if report["deferred_imported"]:
+        failures.append(f"imported at start-up: {', '.join(report['deferred_imported'])}")
+    if failures:
+        sys.exit("; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
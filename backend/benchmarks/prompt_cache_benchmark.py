@@ -0,0 +1,111 @@
+"""
+Estimate how much of each chat prompt Azure OpenAI can serve from its prompt
+cache, for the legacy layout (retrieved context inside the leading system
+message) versus the current one (rag.layout_prompt: static instructions and
+history first, context just before the new question).
+
+A simulated conversation runs for --turns turns, each retrieving --chunks
+fresh chunks of --chunk-chars characters. The cache is modelled the way the
+provider documents it: a request reuses the longest prefix, in 128-token
+steps from 1024 tokens up, that an earlier request of the conversation
+already sent. Tokens are estimated at ~4 characters each. For each layout it
+reports prompt and cached tokens summed over all turns, the cached share, and
+the share on the last turn.
+
+Usage (from the backend directory):
+    python -m benchmarks.prompt_cache_benchmark --turns 10 --answer-chars 1500
+"""
+import argparse
+import hashlib
+import json
+import random
+
+from src.services.rag import SYSTEM_PROMPT, layout_prompt
+
+CHARS_PER_TOKEN = 4
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP_TOKENS = 128
+WORDS = "revenue forecast policy section clause contract employee pension growth market quarter report".split()
+
+
+def legacy_layout(messages: list[dict], context_text: str) -> list[dict]:
+    """The prompt as augment_messages built it before: context inside the first message"""
+    system = SYSTEM_PROMPT + (f"\n\nContext:\n{context_text}" if context_text else "")
+    return [{"role": "system", "content": system}] + messages
+
+
+def serialize(prompt: list[dict]) -> str:
+    return "".join(f"<|{m['role']}|>{m['content']}" for m in prompt)
+
+
+def text(rng: random.Random, chars: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)[:chars]
+
+
+class PromptCache:
+    """Prefix hashes at every cacheable boundary of the prompts sent so far"""
+    def __init__(self):
+        self.prefixes = set()
+
+    def request(self, prompt: str) -> int:
+        """Cached tokens for this prompt, then remember its prefixes"""
+        step = CACHE_STEP_TOKENS * CHARS_PER_TOKEN
+        boundaries = range(CACHE_MIN_TOKENS * CHARS_PER_TOKEN, len(prompt) + 1, step)
+        digests = {end: hashlib.sha1(prompt[:end].encode("utf-8")).digest() for end in boundaries}
+        cached = max((end for end, digest in digests.items() if digest in self.prefixes), default=0)
+        self.prefixes.update(digests.values())
+        return cached // CHARS_PER_TOKEN
+
+
+def simulate(layout, turns: int, chunks: int, chunk_chars: int, answer_chars: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    cache = PromptCache()
+    messages, prompt_tokens, cached_tokens = [], 0, 0
+    last_share = 0.0
+    for _ in range(turns):
+        messages.append({"role": "user", "content": text(rng, 120) + "?"})
+        context = "\n---\n".join(text(rng, chunk_chars) for _ in range(chunks))
+        prompt = serialize(layout(messages, context))
+        tokens = len(prompt) // CHARS_PER_TOKEN
+        cached = cache.request(prompt)
+        prompt_tokens += tokens
+        cached_tokens += cached
+        last_share = cached / tokens
+        messages.append({"role": "assistant", "content": text(rng, answer_chars)})
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "cached_share": round(cached_tokens / prompt_tokens, 3),
+        "last_turn_cached_share": round(last_share, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=4, help="Retrieved chunks per turn")
+    parser.add_argument("--chunk-chars", type=int, default=800)
+    parser.add_argument("--answer-chars", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    params = (args.turns, args.chunks, args.chunk_chars, args.answer_chars, args.seed)
+    report = {
+        "turns": args.turns,
+        "results": {
+            "legacy": simulate(legacy_layout, *params),
+            "stable_prefix": simulate(lambda messages, context: layout_prompt(messages, context), *params),
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
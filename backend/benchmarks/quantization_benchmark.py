@@ -0,0 +1,148 @@
+"""
+Memory saved vs recall lost for the vector index options.
+
+Builds every index configuration (flat / fp16 / sq8 / pq, at the full and at
+reduced embedding sizes) over the same corpus and reports, per configuration,
+the index size, bytes per vector, search latency and recall@k against exact
+search on the full-size float32 vectors.
+
+Vectors come from one of:
+- the configured vector store (--from-store); queries are stored vectors with a
+  little noise added, so recall reflects the real embedding distribution
+- .npy files (--vectors, --query-vectors), e.g. real text-embedding-3 output
+- a synthetic corpus (default): clustered unit vectors whose variance decays
+  along the dimensions, mimicking how text-embedding-3 front-loads information
+  so that truncation behaves similarly. Use real vectors for decisions.
+
+Usage (from the backend directory):
+    python -m benchmarks.quantization_benchmark --corpus 50000 --out results/quantization.json
+    python -m benchmarks.quantization_benchmark --from-store --dims 1536 768 512
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+INDEX_TYPES = ["flat", "fp16", "sq8", "pq"]
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    scale = 1 / np.sqrt(1 + np.arange(dim) / 64)
+    centers = rng.standard_normal((clusters, dim)) * scale
+    vecs = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)) * scale
+    vecs = vecs.astype("float32")
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+def load_store_vectors() -> np.ndarray:
+    import faiss
+    from src.services.index_factory import reconstruct_all
+    from src.settings import settings
+
+    index = faiss.read_index(os.path.join(settings.vector_store_path, settings.faiss_index_file))
+    return reconstruct_all(index)
+
+
+def noisy_queries(corpus: np.ndarray, n: int, noise: float = 0.3, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.choice(len(corpus), n, replace=False)]
+    queries = picks + noise * rng.standard_normal(picks.shape).astype("float32") / np.sqrt(corpus.shape[1])
+    return (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype("float32")
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def run_config(index_type: str, dim: int, corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    from src.services.index_factory import build_index, index_bytes, reduce_dimensions
+    from src.settings import settings
+
+    if index_type == "pq" and dim % settings.pq_m:
+        return {"index_type": index_type, "dimensions": dim, "skipped": f"pq_m={settings.pq_m} does not divide {dim}"}
+    docs = corpus if dim == corpus.shape[1] else reduce_dimensions(corpus, dim)
+    qs = queries if dim == queries.shape[1] else reduce_dimensions(queries, dim)
+
+    start = time.perf_counter()
+    index = build_index(index_type, docs)
+    build_s = time.perf_counter() - start
+
+    timings = []
+    found = np.empty((len(qs), k), dtype="int64")
+    for i, q in enumerate(qs):
+        start = time.perf_counter()
+        _, idx = index.search(q.reshape(1, -1), k)
+        timings.append((time.perf_counter() - start) * 1000)
+        found[i] = idx[0]
+
+    size = index_bytes(index)
+    return {
+        "index_type": index_type,
+        "dimensions": dim,
+        "index_mb": round(size / 2**20, 2),
+        "bytes_per_vector": round(size / len(docs), 1),
+        "recall_at_k": round(recall_at_k(found, truth), 4),
+        "search_ms_p50": round(float(np.percentile(timings, 50)), 3),
+        "build_seconds": round(build_s, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=1536, help="Synthetic embedding size")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--from-store", action="store_true", help="Use the vectors in the configured vector store")
+    parser.add_argument("--vectors", help=".npy file of corpus vectors")
+    parser.add_argument("--query-vectors", help=".npy file of query vectors (default: noisy corpus samples)")
+    parser.add_argument("--dims", type=int, nargs="*", default=[1536, 1024, 512, 256], help="Embedding sizes to try")
+    parser.add_argument("--index-types", nargs="*", default=INDEX_TYPES, choices=INDEX_TYPES)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.from_store:
+        corpus = load_store_vectors()
+    elif args.vectors:
+        corpus = np.load(args.vectors).astype("float32")
+    else:
+        corpus = synthetic_vectors(args.corpus, args.dim)
+    queries = np.load(args.query_vectors).astype("float32") if args.query_vectors else noisy_queries(corpus, min(args.queries, len(corpus)))
+
+    # Ground truth: exact search on the full-size float32 vectors
+    from src.services.index_factory import build_index
+    _, truth = build_index("flat", corpus).search(queries, args.k)
+
+    full_dim = corpus.shape[1]
+    results = []
+    for dim in sorted({d for d in args.dims if d <= full_dim}, reverse=True):
+        for index_type in args.index_types:
+            result = run_config(index_type, dim, corpus, queries, truth, args.k)
+            results.append(result)
+            if "skipped" in result:
+                print(f"{index_type:5s} {dim:5d}  skipped: {result['skipped']}")
+                continue
+            print(f"{index_type:5s} {dim:5d}  {result['index_mb']:9.2f} MiB  {result['bytes_per_vector']:8.1f} B/vec  "
+                  f"recall@{args.k} {result['recall_at_k']:.3f}  {result['search_ms_p50']:.3f} ms")
+
+    baseline = next((r for r in results if r.get("index_type") == "flat" and r.get("dimensions") == full_dim), None)
+    if baseline:
+        for r in results:
+            if "index_mb" in r:
+                r["memory_saved_pct"] = round(100 * (1 - r["index_mb"] / baseline["index_mb"]), 1)
+                r["recall_lost_pct"] = round(100 * (baseline["recall_at_k"] - r["recall_at_k"]), 2)
+
+    report = {"corpus": len(corpus), "queries": len(queries), "k": args.k, "results": results}
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Compare retrieval modes ("similarity" vs "mmr") on prompt size and latency.
+
+Runs every query through RAGEngine.document_only_search once per mode against the
+configured vector store and reports, per mode, the retrieval latency and the
+size of the augmented prompt. With --complete, a (non-streaming) completion is
+also requested so that real prompt token counts and completion latency are
+reported from the API usage data. Redundancy is the mean pairwise cosine
+similarity between the chunks passed as context (1.0 = duplicates).
+
+With --offline the backend runs against benchmarks.fake_services and a
+temporary store of synthetic documents chunked with overlap (like the PDF
+chunker), so neighbouring chunks are near-duplicates; queries are spans of
+chunk text, and source_in_context is the share of queries whose source chunk
+made it into the context. The fakes' embeddings score lower than text-embedding-3, so
+retrieval_min_score defaults to 0 there.
+
+Usage (from the backend directory, with a populated vector store and .env):
+    python -m benchmarks.retrieval_benchmark --queries queries.txt --out rerank.json
+    python -m benchmarks.retrieval_benchmark --offline --queries 200 --out rerank.json
+"""
+import argparse
+import itertools
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+MODES = ["similarity", "mmr"]
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Rough token estimate (~4 characters per token) when usage data isn't available"""
+    return sum(len(m["content"]) for m in messages) // 4
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def overlapping_corpus(n_docs: int, chunks_per_doc: int = 20, chunk_words: int = 120,
+                       overlap_words: int = 30, vocabulary: int = 5000,
+                       seed: int = 0) -> tuple[list[str], list[dict]]:
+    """Synthetic documents split into overlapping word windows, with chunk metadata"""
+    rng = np.random.default_rng(seed)
+    words = np.array([f"term{i}" for i in range(vocabulary)])
+    step = chunk_words - overlap_words
+    texts, metas = [], []
+    for d in range(n_docs):
+        doc = rng.choice(words, step * chunks_per_doc + overlap_words)
+        for c in range(chunks_per_doc):
+            text = " ".join(doc[c * step:c * step + chunk_words])
+            texts.append(text)
+            metas.append({"document_id": f"doc-{d}", "page": c // 4, "text": text, "filename": f"doc-{d}.pdf"})
+    return texts, metas
+
+
+def span_queries(texts: list[str], n: int, span_words: int = 20, seed: int = 1) -> tuple[list[str], list[str]]:
+    """Queries made of a span of words from a random chunk, and the chunk each came from"""
+    rng = np.random.default_rng(seed)
+    queries, sources = [], []
+    for i in rng.integers(0, len(texts), n):
+        words = texts[i].split()
+        start = int(rng.integers(0, len(words) - span_words))
+        queries.append(" ".join(words[start:start + span_words]))
+        sources.append(texts[i])
+    return queries, sources
+
+
+def redundancy(store, texts: list[str]) -> float:
+    """Mean pairwise cosine similarity between the given chunks"""
+    if len(texts) < 2:
+        return 0.0
+    vectors = store.embed_queries(texts)
+    return float(np.mean([a @ b for a, b in itertools.combinations(vectors, 2)]))
+
+
+def run_mode(mode: str, queries: list[str], complete: bool, sources: list[str] | None = None) -> dict:
+    from src.services.openai_client import get_openai
+    from src.services.rag import RAGEngine
+    from src.settings import settings
+
+    settings.retrieval_mode = mode
+    engine = RAGEngine()
+    openai = get_openai()
+
+    retrieval_ms, completion_ms, prompt_tokens, context_chunks, overlap, hits = [], [], [], [], [], []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        messages = engine.document_only_search([{"role": "user", "content": query}])
+        retrieval_ms.append((time.perf_counter() - start) * 1000)
+        context_chunks.append(len(engine.get_document_sources()))
+        context = [
+            text for text, _, score in engine._retrieve(query)
+            if score >= settings.retrieval_min_score
+        ]
+        overlap.append(redundancy(engine.store, context))
+        if sources:
+            hits.append(sources[i] in context)
+
+        if complete:
+            start = time.perf_counter()
+            completion = openai.chat.completions.create(
+                model=settings.azure_openai_deployment,
+                temperature=0,
+                messages=messages
+            )
+            completion_ms.append((time.perf_counter() - start) * 1000)
+            prompt_tokens.append(completion.usage.prompt_tokens)
+        else:
+            prompt_tokens.append(estimate_tokens(messages))
+
+    result = {
+        "mode": mode,
+        "queries": len(queries),
+        "context_chunks_mean": statistics.mean(context_chunks),
+        "redundancy_mean": round(statistics.mean(overlap), 3),
+        "source_in_context": round(statistics.mean(hits), 3) if hits else None,
+        "prompt_tokens_mean": statistics.mean(prompt_tokens),
+        "prompt_tokens_source": "usage" if complete else "estimate",
+        "retrieval_ms_p50": percentile(retrieval_ms, 50),
+        "retrieval_ms_p99": percentile(retrieval_ms, 99),
+    }
+    if complete:
+        result["completion_ms_p50"] = percentile(completion_ms, 50)
+        result["completion_ms_p99"] = percentile(completion_ms, 99)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", required=True,
+                        help="Text file with one query per line (with --offline: number of synthetic queries)")
+    parser.add_argument("--offline", action="store_true", help="Run against fake services and a synthetic store")
+    parser.add_argument("--documents", type=int, default=50, help="Synthetic documents in the offline store")
+    parser.add_argument("--k", type=int, default=None, help="Override settings.retrieval_k")
+    parser.add_argument("--mmr-k", type=int, default=None, help="Override settings.mmr_k")
+    parser.add_argument("--min-score", type=float, default=None, help="Override settings.retrieval_min_score")
+    parser.add_argument("--fetch-k", type=int, default=None, help="Override settings.retrieval_fetch_k")
+    parser.add_argument("--complete", action="store_true", help="Also run completions and use real token usage")
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    services, sources = None, None
+    if args.offline:
+        from benchmarks.fake_services import FakeServices
+        from benchmarks.run import configure_environment
+
+        services = FakeServices().start()
+        configure_environment(services, tempfile.mkdtemp(prefix="rag-retrieval-"))
+        from src.services.vector_store import VectorStore
+
+        print(f"building store: {args.documents} documents", file=sys.stderr)
+        texts, metas = overlapping_corpus(args.documents)
+        VectorStore().add_texts(texts, metas)
+        queries, sources = span_queries(texts, int(args.queries))
+        if args.min_score is None:
+            args.min_score = 0.0
+    else:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    from src.settings import settings
+    if args.k is not None:
+        settings.retrieval_k = args.k
+    if args.mmr_k is not None:
+        settings.mmr_k = args.mmr_k
+    if args.fetch_k is not None:
+        settings.retrieval_fetch_k = args.fetch_k
+    if args.min_score is not None:
+        settings.retrieval_min_score = args.min_score
+
+    results = [run_mode(mode, queries, args.complete, sources) for mode in MODES]
+    if services:
+        services.stop()
+    report = {
+        "retrieval_k": settings.retrieval_k,
+        "mmr_k": settings.mmr_k,
+        "retrieval_fetch_k": settings.retrieval_fetch_k,
+        "mmr_lambda": settings.mmr_lambda,
+        "retrieval_min_score": settings.retrieval_min_score,
+        "results": results,
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Offline benchmark suite for the RAG backend.
+
+Starts the fake Azure OpenAI / Brave services, points the backend at them and a
+throwaway data directory, then measures:
+
+- ingest:  VectorStore.add_texts over a synthetic corpus (chunks/sec)
+- search:  VectorStore.similarity_search end-to-end and raw FAISS search (p50/p99),
+           batch_similarity_search over all queries (queries/sec)
+- rag:     RAGEngine.augment_messages, including web search gating (p50/p99)
+- chat:    POST /chat/message over a real HTTP server (time-to-first-token, tokens/sec);
+           --route sends simple turns to the fake fast deployment
+- import:  cold `import src.main` in a fresh interpreter (benchmarks.import_time)
+- memory:  current and peak RSS of the benchmark process
+
+The store can be padded with synthetic vectors (--index-chunks) to measure
+search at scale (10k - 10M chunks) without embedding every chunk through HTTP.
+Results are written as JSON, tagged with the current commit, so runs can be
+compared with benchmarks.compare.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --ingest-chunks 10000 --index-chunks 1000000 --out results/base.json
+"""
+import argparse
+import http.client
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.fake_services import FakeConfig, FakeServices
+from benchmarks.import_time import measure_import
+
+VOCABULARY = (
+    "revenue margin forecast growth market strategy client portfolio risk capital "
+    "operations supply chain pricing cost analysis quarter board merger acquisition "
+    "regulation compliance talent digital transformation customer retention churn "
+    "benchmark efficiency procurement logistics inventory valuation synergy"
+).split()
+
+
+def configure_environment(services: FakeServices, data_dir: str, fast_deployment: str | None = None,
+                          index_type: str = "flat", embedding_dimensions: int | None = None):
+    """Point Settings and the database at the fakes. Must run before importing src."""
+    if fast_deployment:
+        os.environ["AZURE_OPENAI_FAST_DEPLOYMENT"] = fast_deployment
+    if embedding_dimensions:
+        os.environ["EMBEDDING_DIMENSIONS"] = str(embedding_dimensions)
+    os.environ["VECTOR_INDEX_TYPE"] = index_type
+    os.environ.update({
+        "AZURE_OPENAI_ENDPOINT": services.azure_endpoint,
+        "AZURE_OPENAI_KEY": "benchmark",
+        "AZURE_OPENAI_DEPLOYMENT": "fake-chat",
+        "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "fake-embedding",
+        "BRAVE_API_KEY": "benchmark",
+        "BRAVE_SEARCH_URL": services.brave_search_url,
+        "VECTOR_STORE_PATH": os.path.join(data_dir, "vector_store"),
+        "UPLOAD_DIR": os.path.join(data_dir, "uploads"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(data_dir, 'chat_history.db')}",
+    })
+
+
+def synthetic_corpus(n: int, chunk_words: int = 120, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    words = np.array(VOCABULARY)
+    return [" ".join(rng.choice(words, chunk_words)) for _ in range(n)]
+
+
+def synthetic_queries(n: int, seed: int = 1) -> list[str]:
+    rng = np.random.default_rng(seed)
+    words = np.array(VOCABULARY)
+    return [f"What does the report say about {' '.join(rng.choice(words, 3))}?" for _ in range(n)]
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": 0.0, "p99": 0.0, "mean": 0.0}
+    arr = np.asarray(values)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "mean": round(float(arr.mean()), 3),
+    }
+
+
+def rss_mb() -> dict:
+    current = 0.0
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    return {"rss_mb": round(current, 1), "peak_rss_mb": round(peak, 1)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def bench_ingest(n_chunks: int) -> dict:
+    from src.services.vector_store import VectorStore
+
+    store = VectorStore()
+    texts = synthetic_corpus(n_chunks)
+    metas = [
+        {"document_id": f"doc-{i // 100}", "page": (i % 100) // 5, "text": t, "filename": f"doc-{i // 100}.pdf"}
+        for i, t in enumerate(texts)
+    ]
+    start = time.perf_counter()
+    store.add_texts(texts, metas)
+    elapsed = time.perf_counter() - start
+    return {"chunks": n_chunks, "seconds": round(elapsed, 3), "chunks_per_sec": round(n_chunks / elapsed, 1)}
+
+
+def pad_index(total_chunks: int, batch: int = 100_000) -> dict:
+    """Top the store up to total_chunks with random unit vectors (no embedding calls)"""
+    from src.services.vector_store import VectorStore
+
+    store = VectorStore()
+    missing = total_chunks - len(store)
+    if missing <= 0:
+        return {"padded": 0}
+    rng = np.random.default_rng(2)
+    start = time.perf_counter()
+    # One write session, so the batches go into a single copy of the index
+    with store.write_lock():
+        for offset in range(0, missing, batch):
+            n = min(batch, missing - offset)
+            vecs = rng.standard_normal((n, store.index.d)).astype("float32")
+            vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+            store.add_embeddings(
+                vecs, [{"document_id": "synthetic", "page": 0, "text": "", "filename": "synthetic.pdf"} for _ in range(n)], save=False
+            )
+        store.save()
+    return {"padded": missing, "seconds": round(time.perf_counter() - start, 3)}
+
+
+def bench_search(queries: list[str], k: int) -> dict:
+    from src.services.index_factory import index_bytes
+    from src.services.vector_store import VectorStore
+
+    store = VectorStore()
+    end_to_end, raw = [], []
+    for query in queries:
+        start = time.perf_counter()
+        store.similarity_search(query, k=k)
+        end_to_end.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    store.batch_similarity_search(queries, k=k)
+    batch_seconds = time.perf_counter() - start
+
+    query_vecs = np.vstack([store.embed_query(q) for q in queries])
+    for vec in query_vecs:
+        start = time.perf_counter()
+        store.index.search(vec.reshape(1, -1), k)
+        raw.append((time.perf_counter() - start) * 1000)
+    return {
+        "index_size": len(store),
+        "index_mb": round(index_bytes(store.index) / 2**20, 1),
+        "search_ms": percentiles(end_to_end),
+        "index_search_ms": percentiles(raw),
+        "batch_queries_per_sec": round(len(queries) / batch_seconds, 1),
+    }
+
+
+def bench_rag(queries: list[str]) -> dict:
+    from src.services.rag import RAGEngine
+
+    latencies, web_searches = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        engine = RAGEngine()
+        engine.augment_messages([{"role": "user", "content": query}])
+        latencies.append((time.perf_counter() - start) * 1000)
+        web_searches += bool(engine.get_web_sources())
+    return {"augment_ms": percentiles(latencies), "web_search_rate": round(web_searches / len(queries), 3)}
+
+
+def _serve_app() -> tuple:
+    import uvicorn
+    from src.main import app
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, thread, port
+
+
+def bench_chat(queries: list[str]) -> dict:
+    server, thread, port = _serve_app()
+    ttft, total, rates = [], [], []
+    try:
+        for i, query in enumerate(queries):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            start = time.perf_counter()
+            conn.request(
+                "POST", f"/chat/message?session_id=bench-{i}&stream_format=events",
+                body=json.dumps({"message": query}), headers={"Content-Type": "application/json"}
+            )
+            resp = conn.getresponse()
+            first_token, chars, event = None, 0, None
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8").rstrip("\n")
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event == "token":
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    chars += len(json.loads(line[6:])["text"])
+                elif line.startswith("data: ") and event == "done":
+                    break
+            end = time.perf_counter()
+            conn.close()
+
+            if first_token is None:
+                continue
+            ttft.append((first_token - start) * 1000)
+            total.append((end - start) * 1000)
+            # ~4 characters per token
+            if end > first_token:
+                rates.append(chars / 4 / (end - first_token))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+    return {
+        "turns": len(ttft),
+        "ttft_ms": percentiles(ttft),
+        "total_ms": percentiles(total),
+        "tokens_per_sec": round(statistics.mean(rates), 1) if rates else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ingest-chunks", type=int, default=10_000, help="Chunks embedded through add_texts")
+    parser.add_argument("--index-chunks", type=int, default=0, help="Pad the index with synthetic vectors up to this size")
+    parser.add_argument("--queries", type=int, default=200, help="Queries for the search and rag scenarios")
+    parser.add_argument("--chat-turns", type=int, default=20)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--embedding-latency-ms", type=float, default=FakeConfig.embedding_latency_ms)
+    parser.add_argument("--ttft-ms", type=float, default=FakeConfig.ttft_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeConfig.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=FakeConfig.completion_tokens)
+    parser.add_argument("--search-latency-ms", type=float, default=FakeConfig.search_latency_ms)
+    parser.add_argument("--route", action="store_true", help="Enable model routing to the fake fast deployment")
+    parser.add_argument("--index-type", default="flat", choices=["flat", "fp16", "sq8", "pq"])
+    parser.add_argument("--embedding-dimensions", type=int, help="Request shortened embeddings")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["import", "ingest", "search", "rag", "chat"])
+    parser.add_argument("--data-dir", help="Working directory for the store and database (default: a temp dir)")
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    fake_config = FakeConfig(
+        embedding_latency_ms=args.embedding_latency_ms,
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        search_latency_ms=args.search_latency_ms,
+    )
+    services = FakeServices(fake_config).start()
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="rag-bench-")
+    configure_environment(
+        services, data_dir, fake_config.fast_deployment if args.route else None, args.index_type, args.embedding_dimensions
+    )
+
+    metrics = {}
+    queries = synthetic_queries(args.queries)
+    if "import" not in args.skip:
+        print("import", file=sys.stderr)
+        measured = measure_import()
+        metrics["import"] = {"total_ms": measured["total_ms"], "deferred_imported": measured["deferred_imported"]}
+    if "ingest" not in args.skip:
+        print(f"ingest: {args.ingest_chunks} chunks", file=sys.stderr)
+        metrics["ingest"] = bench_ingest(args.ingest_chunks)
+    if args.index_chunks:
+        print(f"padding index to {args.index_chunks} chunks", file=sys.stderr)
+        metrics["pad"] = pad_index(args.index_chunks)
+    if "search" not in args.skip:
+        print("search", file=sys.stderr)
+        metrics["search"] = bench_search(queries, args.k)
+    if "rag" not in args.skip:
+        print("rag", file=sys.stderr)
+        metrics["rag"] = bench_rag(queries[:50])
+    if "chat" not in args.skip:
+        print("chat", file=sys.stderr)
+        metrics["chat"] = bench_chat(queries[:args.chat_turns])
+    metrics["memory"] = rss_mb()
+    services.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "data_dir")},
+        "metrics": metrics,
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
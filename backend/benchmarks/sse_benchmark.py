@@ -0,0 +1,116 @@
+"""
+Measure the effect of SSE delta coalescing on writes and client work.
+
+Simulates a model producing --tokens deltas at --token-interval-ms apart and
+streams them with both the legacy framing (one `data:` frame per delta) and the
+coalesced JSON event framing used by `stream_format=events`. For each it
+reports:
+
+- frames: body chunks handed to the ASGI server, i.e. socket writes/syscalls
+- bytes: total bytes on the wire
+- client_renders: frames carrying text, i.e. setMessages calls in the UI
+- client_parse_ms: CPU time to split and decode the frames as the client does
+
+Usage (from the backend directory):
+    python -m benchmarks.sse_benchmark --tokens 1000 --token-interval-ms 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from src.services.streaming import StreamBuffer, event_frames
+
+DELTA = " token"
+
+
+def parse_legacy(frames: list[str]) -> int:
+    text = ""
+    renders = 0
+    for line in "".join(frames).split("\n"):
+        if line.startswith("data: ") and line[6:].strip() and line[6:] != "[DONE]":
+            text += line[6:]
+            renders += 1
+    return renders
+
+
+def parse_events(frames: list[str]) -> int:
+    text = ""
+    renders = 0
+    for block in "".join(frames).split("\n\n"):
+        event, data = None, None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = line[6:]
+        if event == "token" and data:
+            text += json.loads(data)["text"]
+            renders += 1
+    return renders
+
+
+async def produce(buffer: StreamBuffer, tokens: int, interval: float):
+    for _ in range(tokens):
+        await asyncio.sleep(interval)
+        buffer.append(DELTA)
+    buffer.finish()
+
+
+async def run_legacy(tokens: int, interval: float) -> list[str]:
+    frames = []
+    for _ in range(tokens):
+        await asyncio.sleep(interval)
+        frames.append(f"data: {DELTA}\n\n")
+    frames.append("data: [DONE]\n\n")
+    return frames
+
+
+async def run_events(tokens: int, interval: float) -> list[str]:
+    buffer = StreamBuffer("bench")
+    producer = asyncio.create_task(produce(buffer, tokens, interval))
+    frames = [frame async for frame in event_frames(buffer)]
+    await producer
+    return frames
+
+
+def summarize(name: str, frames: list[str], parser) -> dict:
+    start = time.perf_counter()
+    renders = parser(frames)
+    parse_ms = (time.perf_counter() - start) * 1000
+    return {
+        "format": name,
+        "frames": len(frames),
+        "bytes": sum(len(f.encode("utf-8")) for f in frames),
+        "client_renders": renders,
+        "client_parse_ms": round(parse_ms, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--token-interval-ms", type=float, default=5.0)
+    parser.add_argument("--out", help="Write results as JSON to this path")
+    args = parser.parse_args()
+    interval = args.token_interval_ms / 1000
+
+    legacy = asyncio.run(run_legacy(args.tokens, interval))
+    events = asyncio.run(run_events(args.tokens, interval))
+    report = {
+        "tokens": args.tokens,
+        "token_interval_ms": args.token_interval_ms,
+        "results": [
+            summarize("legacy", legacy, parse_legacy),
+            summarize("events", events, parse_events),
+        ],
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
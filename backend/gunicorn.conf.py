@@ -0,0 +1,44 @@
+"""
+Production server profile: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py src.main:app
+
+The app is imported once in the master (preload_app) and the FAISS index is
+loaded there before forking, so workers share its pages copy-on-write instead
+of each reading it from disk. Per-worker state (OpenAI client, DB connections)
+is created in the app's lifespan handler after the fork. Tune with env vars:
+WEB_CONCURRENCY (workers), PORT, GUNICORN_TIMEOUT, GUNICORN_KEEPALIVE.
+
+One worker by default: re-attaching to an in-flight stream only works in the
+worker generating it, and gunicorn workers share one listening socket, so no
+proxy can route a re-attach to the right one. A single worker still uses every
+core for retrieval: FAISS releases the GIL, searches run in parallel on the
+threadpool, and FAISS_OMP_THREADS (unset = all cores) parallelises each one.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# Streams can stay open for the length of a completion
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers now and then to bound memory growth
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    """Load the vector index in the master so forked workers share it"""
+    from src.services.vector_store import get_vector_store
+
+    store = get_vector_store()
+    server.log.info(f"Preloaded vector store: {len(store)} chunks")
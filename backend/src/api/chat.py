@@ -1,17 +1,51 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
 from fastapi.responses import StreamingResponse
-from typing import Iterator, Dict, List
-import json
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List, Literal, Optional
+import asyncio
+import time
+import httpx
 from sqlalchemy.orm import Session
-from src.models.chat import SimpleChatRequest, Message, StreamingChatMetadata, ChatResponse, ChatSessionCreate, ChatSessionsResponse, ChatHistoryResponse
-from src.models.database import get_db
+from src.models.chat import SimpleChatRequest, ChatResponse, ChatSessionCreate, ChatSessionsResponse, ChatHistoryResponse, SourceReference, ChatSearchResponse
+from src.models.database import get_db, SessionLocal
+from src.services.admission import get_admission_controller
+from src.services.chat_search import search_messages
 from src.services.chat_service import ChatService
-from src.services.openai_client import get_openai
+from src.services.generation_registry import GenerationRegistry, record_finished
+from src.services.metrics import STAGE_SECONDS, COMPLETION_SECONDS, COMPLETION_ROUTES, COMPLETIONS_STOPPED
+from src.services.model_router import route_completion
+from src.services.openai_client import get_openai, get_async_openai, record_usage, COMPLETION_TIMEOUT
 from src.services.rag import RAGEngine
+from src.services.semantic_cache import get_semantic_cache
+from src.services.store_generation import store_generation
+from src.services.streaming import StreamBuffer, event_frames, legacy_frames, get_stream_registry
 from src.settings import settings
+import numpy as np
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+def _cache_query_embedding(rag_engine: RAGEngine, conversation: List[Dict]) -> np.ndarray | None:
+    """
+    Embed the question for a semantic cache lookup, or return None when the cache
+    doesn't apply. Only standalone questions (the first turn of a session) are
+    cached, since follow-ups depend on the preceding conversation.
+    """
+    if not settings.semantic_cache_enabled or len(conversation) != 1:
+        return None
+    return rag_engine.store.embed_query(conversation[0]["content"].strip())
+
+def _cache_answer(query: str, query_embedding: np.ndarray | None, answer: str, rag_engine: RAGEngine, generation: int):
+    """
+    Store a completed answer unless it relied on (time-sensitive) web results
+    or had no document context. `generation` is the vector store generation
+    read before retrieval.
+    """
+    if query_embedding is None or not answer or rag_engine.get_web_sources():
+        return
+    if not rag_engine.get_document_sources():
+        return
+    get_semantic_cache().store(query, query_embedding, answer, rag_engine.get_last_sources(), generation)
+
 @router.post("/sessions")
 async def create_session(req: ChatSessionCreate, db: Session = Depends(get_db)):
     """Create a new chat session"""
@@ -49,13 +83,140 @@ async def delete_session(session_id: str, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting session: {str(e)}")
 
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def _save_assistant_message(session_id: str, content: str, sources: List[SourceReference]):
+    """Persist a generated answer using a session of its own, independent of any request"""
+    db = SessionLocal()
+    try:
+        ChatService.add_message(db, session_id, "assistant", content, sources)
+    finally:
+        db.close()
+
+async def _generate_into_buffer(buffer: StreamBuffer, openai, conversation: List[Dict], session_id: str, query: str):
+    """
+    Retrieve context and run the completion, writing progress, sources and
+    deltas into the stream buffer. This runs as a background task detached from
+    the HTTP connection: the stream can open immediately, and the answer is
+    generated and saved even if the client drops (clients can re-attach via
+    GET /chat/messages/{id}/stream).
+    
+    COMPLETION_TIME_BUDGET_SECONDS covers the whole turn: retrieval, the
+    completion request (with its retries) and streaming.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.completion_time_budget_seconds
+    
+    def report_progress(stage: str, data: Dict):
+        loop.call_soon_threadsafe(buffer.add_status, stage, data)
+    
+    assistant_response = ""
+    try:
+        try:
+            async with asyncio.timeout_at(deadline):
+                rag_engine = await run_in_threadpool(RAGEngine)
+                
+                # Replay a cached answer to a near-identical question if there is one
+                generation = store_generation()
+                query_embedding = await run_in_threadpool(_cache_query_embedding, rag_engine, conversation)
+                cached = get_semantic_cache().lookup(query_embedding) if query_embedding is not None else None
+                if not cached:
+                    augmented_messages = await run_in_threadpool(
+                        rag_engine.augment_messages, conversation.copy(), query_embedding=query_embedding,
+                        on_progress=report_progress
+                    )
+                    # Sources are known before generation starts, so send them up front
+                    sources = rag_engine.get_last_sources()
+                    buffer.set_sources([source.model_dump(mode="json") for source in sources])
+                    
+                    route = route_completion(query)
+                    COMPLETION_ROUTES.inc(tier=route.tier, reason=route.reason)
+                    started = time.perf_counter()
+                    stream = await openai.chat.completions.create(
+                        stream=True,
+                        # The final chunk then carries token usage, including cached prompt tokens
+                        stream_options={"include_usage": True},
+                        model=route.deployment,
+                        temperature=settings.openai_model_temperature,
+                        max_tokens=route.max_tokens,
+                        messages=augmented_messages,
+                        timeout=COMPLETION_TIMEOUT
+                    )
+        except TimeoutError:
+            # Out of time before the first token; there is nothing to save
+            COMPLETIONS_STOPPED.inc(reason="time_budget")
+            buffer.finish(error="Time budget exceeded before the answer started", finish_reason="time_budget")
+            return
+        
+        if cached:
+            buffer.set_sources([source.model_dump(mode="json") for source in cached.sources])
+            buffer.append(cached.answer)
+            await run_in_threadpool(_save_assistant_message, session_id, cached.answer, cached.sources)
+            buffer.finish()
+            return
+        
+        first_token_at = None
+        finish_reason = None
+        usage = None
+        try:
+            async with asyncio.timeout_at(deadline):
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
+                        choice = chunk.choices[0]
+                        if choice.finish_reason:
+                            finish_reason = choice.finish_reason
+                        delta = choice.delta
+                        if hasattr(delta, 'content') and delta.content:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                STAGE_SECONDS.observe(first_token_at - started, stage="time_to_first_token")
+                                COMPLETION_SECONDS.observe(first_token_at - started, deployment=route.deployment, stage="time_to_first_token")
+                            assistant_response += delta.content
+                            buffer.append(delta.content)
+        except TimeoutError:
+            finish_reason = "time_budget"
+        except asyncio.CancelledError:
+            # POST /chat/messages/{id}/cancel: stop here and keep what we have
+            asyncio.current_task().uncancel()
+            finish_reason = "cancelled"
+        finally:
+            # Closing the response aborts generation upstream
+            await stream.close()
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage="completion")
+        COMPLETION_SECONDS.observe(elapsed, deployment=route.deployment, stage="completion")
+        # A stream stopped before its final chunk has no usage; its tokens go uncounted
+        if usage:
+            record_usage(usage, route.deployment)
+        if finish_reason in ("cancelled", "time_budget", "length"):
+            COMPLETIONS_STOPPED.inc(reason=finish_reason)
+        
+        if assistant_response or finish_reason != "cancelled":
+            await run_in_threadpool(_save_assistant_message, session_id, assistant_response, sources)
+        if finish_reason == "stop":
+            _cache_answer(query, query_embedding, assistant_response, rag_engine, generation)
+        buffer.finish(finish_reason=finish_reason)
+    except asyncio.CancelledError:
+        # Cancelled before generation started (or at shutdown); nothing to save
+        buffer.finish(finish_reason="cancelled")
+        COMPLETIONS_STOPPED.inc(reason="cancelled")
+        raise
+    except Exception as e:
+        buffer.finish(error=str(e))
+    finally:
+        await record_finished(buffer.id, buffer.finish_reason, buffer.length)
+
 @router.post("/message", 
     responses={
         200: {
             "description": "Streaming chat response with source references",
             "content": {
                 "text/event-stream": {
-                    "example": """data: Hello
+                    "example": """data: [SOURCES]{"sources":[{"document_id":"abc123","filename":"example.pdf","page":1,"relevance_score":0.85}]}
+
+data: Hello
 
 data: !
 
@@ -75,8 +236,6 @@ data: ?
 
 data:  😊
 
-data: [SOURCES]{"sources":[{"document_id":"abc123","filename":"example.pdf","page":1,"relevance_score":0.85}]}
-
 data: [DONE]
 
 """
@@ -85,7 +244,7 @@ data: [DONE]
         }
     }
 )
-async def send_message(req: SimpleChatRequest, session_id: str = "default", db: Session = Depends(get_db)):
+async def send_message(req: SimpleChatRequest, session_id: str = "default", stream_format: Literal["legacy", "events"] = "legacy", db: Session = Depends(get_db)):
     """
     Send a message to the chatbot. The backend manages conversation history with persistent storage.
     Always streams responses and uses RAG for context.
@@ -93,73 +252,144 @@ async def send_message(req: SimpleChatRequest, session_id: str = "default", db:
     The response is streamed as Server-Sent Events (SSE) format where each chunk
     of the AI's response is sent as a separate 'data:' line.
     
-    After the response is complete, a 'data: [SOURCES]' line contains JSON metadata
-    about the documents used to generate the response, followed by 'data: [DONE]'.
+    Before the first chunk, a 'data: [SOURCES]' line contains JSON metadata
+    about the documents used to generate the response; 'data: [DONE]' ends the stream.
     
     Example flow:
-    1. data: Hello
-    2. data:  there!
-    3. data: [SOURCES]{"sources":[{"document_id":"abc","filename":"doc.pdf","page":1}]}
+    1. data: [SOURCES]{"sources":[{"document_id":"abc","filename":"doc.pdf","page":1}]}
+    2. data: Hello
+    3. data:  there!
     4. data: [DONE]
-    """
-    
-    # Ensure session exists
-    ChatService.get_or_create_session(db, session_id)
     
-    # Add user message to database
-    ChatService.add_message(db, session_id, "user", req.message)
+    With `stream_format=events`, the stream reports retrieval progress as
+    `status` events (vector search done, web search started/done), then
+    `sources`, then deltas coalesced into `token` frames, and finally `error`
+    (if any) and `done`. All payloads are JSON and each frame's id is the
+    character offset reached.
     
-    # Get conversation history from database
-    history = ChatService.get_session_history(db, session_id)
-    conversation = [{"role": msg.role, "content": msg.content} for msg in history.messages]
+    Generation runs in a background task, so the answer is saved even if the
+    client disconnects. The X-Message-Id response header identifies it for
+    GET /chat/messages/{message_id}/stream.
     
-    # Use RAG to augment messages with relevant context
-    rag_engine = RAGEngine()
-    augmented_messages = rag_engine.augment_messages(conversation.copy())
+    When the worker is at capacity the request queues briefly; it gets 429 if
+    the queue is full or 503 if no slot frees up in time (both with Retry-After).
+    """
     
-    # Get OpenAI client and stream response
-    openai = get_openai()
+    # Wait for a chat slot (429/503 with Retry-After when overloaded); it is held
+    # until the background generation finishes
+    admission = get_admission_controller()
+    await admission.acquire("chat")
+    try:
+        # Ensure session exists
+        ChatService.get_or_create_session(db, session_id)
+        
+        # Add user message to database
+        ChatService.add_message(db, session_id, "user", req.message)
+        
+        # Get conversation history from database
+        with STAGE_SECONDS.time(stage="history_load"):
+            history = ChatService.get_session_history(db, session_id)
+        conversation = [{"role": msg.role, "content": msg.content} for msg in history.messages]
+        
+        # Start generating in the background and stream from its buffer
+        openai = get_async_openai()
+        buffer = get_stream_registry().create()
+        GenerationRegistry.start(db, buffer.id, session_id)
+        buffer.task = asyncio.create_task(_generate_into_buffer(buffer, openai, conversation, session_id, req.message))
+    except BaseException:
+        admission.release("chat")
+        raise
+    buffer.task.add_done_callback(lambda _: admission.release("chat"))
     
-    def generate_response():
-        assistant_response = ""
+    frames = event_frames(buffer) if stream_format == "events" else legacy_frames(buffer)
+    headers = {**_SSE_HEADERS, "X-Message-Id": buffer.id}
+    return StreamingResponse(frames, media_type="text/event-stream", headers=headers)
+
+@router.get("/messages/{message_id}/stream")
+async def stream_message(message_id: str, offset: Optional[int] = None, stream_format: Literal["legacy", "events"] = "events",
+                         last_event_id: Optional[str] = Header(None)):
+    """
+    Attach (or re-attach) to a response being generated by POST /chat/message.
+    With the events format, streaming continues after the character offset given
+    by `offset` or the Last-Event-ID header (default: from the start). Finished
+    responses stay available for a few minutes; after that, use the session history.
+    """
+    buffer = get_stream_registry().get(message_id)
+    if not buffer:
+        raise HTTPException(status_code=404, detail="Message stream not found or expired")
+    if offset is None:
         try:
-            for chunk in openai.chat.completions.create(
-                stream=True,
-                model=settings.azure_openai_deployment,
-                temperature=settings.openai_model_temperature,
-                messages=augmented_messages
-            ):
-                # Check if chunk has choices and the first choice has content
-                if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    if hasattr(delta, 'content') and delta.content:
-                        content = delta.content
-                        assistant_response += content
-                        yield f"data: {content}\n\n"
-            
-            # Send source metadata as a special message
-            sources = rag_engine.get_last_sources()
-            if sources:
-                metadata = StreamingChatMetadata(sources=sources)
-                yield f"data: [SOURCES]{metadata.model_dump_json()}\n\n"
-            
-            # Add assistant response to database with sources
-            ChatService.add_message(db, session_id, "assistant", assistant_response, sources)
-            yield "data: [DONE]\n\n"
-            
-        except Exception as e:
-            yield f"data: Error: {str(e)}\n\n"
-            yield "data: [DONE]\n\n"
-    
-    return StreamingResponse(generate_response(), media_type="text/event-stream")
+            offset = int(last_event_id) if last_event_id else 0
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    if offset < buffer.base_offset:
+        raise HTTPException(status_code=410, detail="Offset is no longer buffered; load the session history instead")
+    
+    frames = event_frames(buffer, offset) if stream_format == "events" else legacy_frames(buffer)
+    return StreamingResponse(frames, media_type="text/event-stream", headers=_SSE_HEADERS)
+
+_REMOTE_CANCEL_WAIT_SECONDS = 10.0
+
+def _generation_state(message_id: str, request_cancel: bool = False) -> Optional[Dict]:
+    """Where a generation stands according to the database, optionally flagging it to stop first"""
+    db = SessionLocal()
+    try:
+        lookup = GenerationRegistry.request_cancel if request_cancel else GenerationRegistry.get
+        generation = lookup(db, message_id)
+        if not generation:
+            return None
+        return {"finished": generation.finished_at is not None, "finish_reason": generation.finish_reason,
+                "characters": generation.characters}
+    finally:
+        db.close()
+
+@router.post("/messages/{message_id}/cancel")
+async def cancel_message(message_id: str):
+    """
+    Stop generating a response started by POST /chat/message. The upstream
+    completion is aborted and the partial answer is saved to the session; readers
+    receive a `done` event with finish_reason "cancelled".
+    
+    Works from any worker: if another worker is generating the response, it is
+    flagged in the database and that worker stops it within
+    GENERATION_CANCEL_POLL_SECONDS. If it hasn't stopped within a few seconds the
+    status is "cancelling".
+    """
+    buffer = get_stream_registry().get(message_id)
+    if buffer:
+        if buffer.done or not buffer.task:
+            return {"status": "finished", "finish_reason": buffer.finish_reason}
+        buffer.task.cancel()
+        await asyncio.wait([buffer.task])
+        return {"status": "cancelled", "finish_reason": buffer.finish_reason, "characters": buffer.length}
+    
+    state = await run_in_threadpool(_generation_state, message_id, True)
+    if not state:
+        raise HTTPException(status_code=404, detail="Message stream not found or expired")
+    if state["finished"]:
+        return {"status": "finished", "finish_reason": state["finish_reason"]}
+    deadline = time.monotonic() + _REMOTE_CANCEL_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(min(0.2, settings.generation_cancel_poll_seconds))
+        state = await run_in_threadpool(_generation_state, message_id)
+        if not state:
+            break
+        if state["finished"]:
+            return {"status": "cancelled", "finish_reason": state["finish_reason"], "characters": state["characters"]}
+    return {"status": "cancelling"}
 
 @router.post("/message-sync", response_model=ChatResponse)
 async def send_message_sync(req: SimpleChatRequest, session_id: str = "default", db: Session = Depends(get_db)):
     """
     Send a message to the chatbot with a synchronous, structured response.
     Includes source references in the response metadata.
+    Shares the chat admission limits with POST /chat/message.
     """
-    
+    async with get_admission_controller().slot("chat"):
+        return await run_in_threadpool(_answer_sync, req, session_id, db)
+
+def _answer_sync(req: SimpleChatRequest, session_id: str, db: Session) -> ChatResponse:
+    """Blocking body of send_message_sync, run off the event loop"""
     # Ensure session exists
     ChatService.get_or_create_session(db, session_id)
     
@@ -167,22 +397,46 @@ async def send_message_sync(req: SimpleChatRequest, session_id: str = "default",
     ChatService.add_message(db, session_id, "user", req.message)
     
     # Get conversation history from database
-    history = ChatService.get_session_history(db, session_id)
+    with STAGE_SECONDS.time(stage="history_load"):
+        history = ChatService.get_session_history(db, session_id)
     conversation = [{"role": msg.role, "content": msg.content} for msg in history.messages]
     
-    # Use RAG to augment messages with relevant context
+    # The time budget covers retrieval as well as the completion request
+    deadline = time.monotonic() + settings.completion_time_budget_seconds
     rag_engine = RAGEngine()
-    augmented_messages = rag_engine.augment_messages(conversation.copy())
+    generation = store_generation()
+    query_embedding = _cache_query_embedding(rag_engine, conversation)
+    cached = get_semantic_cache().lookup(query_embedding) if query_embedding is not None else None
+    if cached:
+        ChatService.add_message(db, session_id, "assistant", cached.answer, cached.sources)
+        return ChatResponse(response=cached.answer, sources=cached.sources)
+    
+    # Use RAG to augment messages with relevant context
+    augmented_messages = rag_engine.augment_messages(conversation.copy(), query_embedding=query_embedding)
     
     # Get OpenAI client and generate response
     openai = get_openai()
+    route = route_completion(req.message)
+    COMPLETION_ROUTES.inc(tier=route.tier, reason=route.reason)
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        COMPLETIONS_STOPPED.inc(reason="time_budget")
+        raise HTTPException(status_code=504, detail="Time budget exceeded before the answer started")
     
     try:
-        completion = openai.chat.completions.create(
-            model=settings.azure_openai_deployment,
-            temperature=settings.openai_model_temperature,
-            messages=augmented_messages
-        )
+        started = time.perf_counter()
+        with STAGE_SECONDS.time(stage="completion"):
+            completion = openai.chat.completions.create(
+                model=route.deployment,
+                temperature=settings.openai_model_temperature,
+                max_tokens=route.max_tokens,
+                messages=augmented_messages,
+                timeout=httpx.Timeout(remaining, connect=min(remaining, settings.openai_connect_timeout))
+            )
+        COMPLETION_SECONDS.observe(time.perf_counter() - started, deployment=route.deployment, stage="completion")
+        record_usage(completion.usage, route.deployment)
+        if completion.choices[0].finish_reason == "length":
+            COMPLETIONS_STOPPED.inc(reason="length")
         
         assistant_response = completion.choices[0].message.content
         
@@ -191,12 +445,32 @@ async def send_message_sync(req: SimpleChatRequest, session_id: str = "default",
         
         # Add assistant response to database with sources
         ChatService.add_message(db, session_id, "assistant", assistant_response, sources)
+        _cache_answer(req.message, query_embedding, assistant_response, rag_engine, generation)
         
         return ChatResponse(response=assistant_response, sources=sources)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
+@router.get("/search", response_model=ChatSearchResponse)
+def search_chat_history(q: str = Query(..., min_length=1, max_length=500),
+                        limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0, le=10_000),
+                        session_id: Optional[str] = None, role: Optional[Literal["user", "assistant"]] = None,
+                        db: Session = Depends(get_db)):
+    """
+    Full-text search across all chat messages (SQLite FTS5 / Postgres tsvector),
+    best matches first, with highlighted snippets. Optionally limited to one
+    session or role. Page through results with offset while has_more is true.
+    Snippets are HTML-escaped apart from the <mark> tags. On SQLite, a search
+    across all sessions ranks only the newest CHAT_SEARCH_MAX_CANDIDATES
+    matches; truncated is true when older matches were left out.
+    """
+    try:
+        results, has_more, truncated = search_messages(db, q, limit=limit, offset=offset, session_id=session_id, role=role)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return ChatSearchResponse(query=q, results=results, offset=offset, limit=limit, has_more=has_more, truncated=truncated)
+
 # Legacy endpoints for backward compatibility
 @router.get("/history")
 async def get_conversation_history(session_id: str = "default", db: Session = Depends(get_db)):
@@ -1,37 +1,64 @@
 import uuid
 import os
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from src.services.pdf_loader import load_pdf, chunk_text
-from src.services.vector_store import VectorStore
-from src.models.documents import DocumentUploadResponse
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response, Query, Depends
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from src.services.admission import get_admission_controller
+from src.services.document_registry import DocumentRegistry
+from src.services.page_preview import get_thumbnail_cache, page_text
+from src.services.pdf_loader import load_pdf, chunk_text, file_sha256
+from src.settings import settings
+from src.models.database import DocumentStatus, SessionLocal, get_db
+from src.models.documents import (
+    DocumentUploadResponse, DocumentListResponse, DocumentDetailResponse, DocumentChunk, DocumentPageResponse,
+    BatchSearchRequest, BatchSearchResponse, BatchSearchResult, SearchHit
+)
 
 router = APIRouter(prefix="/documents", tags=["documents"])
-store = VectorStore()
 
 # Get upload directory from environment or use default
 UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "/app/data/uploads")
+# A document id always refers to the same bytes (re-uploads get a new id), so the
+# file and its previews can be cached by the browser without revalidation
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
 
-@router.post("", response_model=DocumentUploadResponse)
-async def upload_pdf(file: UploadFile = File(...)):
-    if not file.filename.endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF files are supported.")
-    
-    # Generate unique document ID
-    doc_id = str(uuid.uuid4())
-    
+def _vector_store():
+    """The shared store, imported on first use so importing the router doesn't load FAISS"""
+    from src.services.vector_store import get_vector_store
+    return get_vector_store()
+
+def _ingest_pdf(doc_id: str, filename: str, file_content: bytes) -> int:
+    """Save, parse, chunk and embed an uploaded PDF. Returns the number of chunks."""
     # Ensure upload directory exists
     os.makedirs(UPLOAD_DIR, exist_ok=True)
     
     # Save original file persistently
-    persistent_path = os.path.join(UPLOAD_DIR, f"{doc_id}_{file.filename}")
-    
-    # Read and save the uploaded file
-    file_content = await file.read()
+    persistent_path = os.path.join(UPLOAD_DIR, f"{doc_id}_{filename}")
     with open(persistent_path, "wb") as f:
         f.write(file_content)
-    
-    # Process the PDF for embedding
-    pages = load_pdf(persistent_path)
+    file_hash = hashlib.sha256(file_content).hexdigest()
+
+    db = SessionLocal()
+    try:
+        DocumentRegistry.register(db, doc_id, filename, persistent_path, len(file_content), file_hash)
+        try:
+            pages, chunks = _index_pdf(doc_id, filename, persistent_path, file_hash)
+        except Exception as e:
+            DocumentRegistry.mark_failed(db, doc_id, str(e))
+            raise
+        DocumentRegistry.mark_ready(db, doc_id, pages=pages, chunks=chunks)
+    finally:
+        db.close()
+    return chunks
+
+def _index_pdf(doc_id: str, filename: str, persistent_path: str, file_hash: str) -> tuple[int, int]:
+    """Parse, chunk and embed a saved PDF. Returns (pages, chunks)."""
+    store = _vector_store()
+    pages = load_pdf(persistent_path, file_hash=file_hash)
 
     chunks = []
     metas = []
@@ -42,99 +69,224 @@ async def upload_pdf(file: UploadFile = File(...)):
                 "document_id": doc_id, 
                 "page": page_num, 
                 "text": chunk,
-                "filename": file.filename,
+                "filename": filename,
                 "file_path": persistent_path
             })
     
     store.add_texts(chunks, metas)
-    return DocumentUploadResponse(id=doc_id, chunks=len(chunks))
+    return len(pages), len(chunks)
 
-@router.delete("/{doc_id}")
-async def delete_document(doc_id: str):
-    # Find and delete the original file
-    files_to_delete = []
-    for meta in store.metadata:
-        if meta.get("document_id") == doc_id and meta.get("file_path"):
-            files_to_delete.append(meta["file_path"])
+@router.post("", response_model=DocumentUploadResponse)
+async def upload_pdf(file: UploadFile = File(...)):
+    """
+    Upload and index a PDF. Ingestion is admission-controlled: only a few run
+    at once per worker and queued chat requests go first (429/503 with
+    Retry-After when the ingestion queue is full or the wait is too long).
+    """
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported.")
     
-    # Delete the physical files
-    for file_path in set(files_to_delete):  # Use set to avoid duplicates
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except OSError as e:
-            print(f"Warning: Could not delete file {file_path}: {e}")
+    # Generate unique document ID
+    doc_id = str(uuid.uuid4())
+    
+    # Read the uploaded file
+    file_content = await file.read()
     
-    # Very naive delete: rebuild store without vectors matching doc_id
-    new_texts, new_meta = [], []
-    for meta in store.metadata:
-        if meta.get("document_id") != doc_id:
-            new_texts.append(meta["text"])
-            new_meta.append(meta)
-    # Recreate store
-    store.index.reset()
-    store.metadata = []
-    store.save()
-    store.add_texts(new_texts, new_meta)
+    async with get_admission_controller().slot("ingest"):
+        chunks = await run_in_threadpool(_ingest_pdf, doc_id, file.filename, file_content)
+    return DocumentUploadResponse(id=doc_id, chunks=chunks)
+
+def _batch_search(queries: list[str], k: int) -> list[BatchSearchResult]:
+    results = _vector_store().batch_similarity_search(queries, k=k)
+    return [
+        BatchSearchResult(query=query, hits=[
+            SearchHit(document_id=meta.get("document_id", ""), filename=meta.get("filename", ""),
+                      page=meta.get("page", 0), text=text, score=score)
+            for text, meta, score in hits
+        ])
+        for query, hits in zip(queries, results)
+    ]
+
+@router.post("/search:batch", response_model=BatchSearchResponse)
+async def batch_search(request: BatchSearchRequest):
+    """
+    Top-k chunks for many queries (evaluation runs, bulk QA): all queries are
+    embedded in one request and searched with one matrix index.search. Bulk
+    work, so it is admitted through the ingestion lane behind chat turns.
+    """
+    if len(request.queries) > settings.batch_search_max_queries:
+        raise HTTPException(status_code=400, detail=f"At most {settings.batch_search_max_queries} queries per request.")
+    if any(not query.strip() for query in request.queries):
+        raise HTTPException(status_code=400, detail="Queries must not be empty.")
+    async with get_admission_controller().slot("ingest"):
+        results = await run_in_threadpool(_batch_search, request.queries, request.k)
+    return BatchSearchResponse(results=results)
+
+def _delete_document(doc_id: str):
+    db = SessionLocal()
+    try:
+        doc = DocumentRegistry.get(db, doc_id)
+        # Drop its chunks first so no search result points at a missing file
+        _vector_store().delete_document(doc_id)
+        if doc and doc.file_path:
+            try:
+                if os.path.exists(doc.file_path):
+                    os.remove(doc.file_path)
+            except OSError as e:
+                print(f"Warning: Could not delete file {doc.file_path}: {e}")
+        DocumentRegistry.mark_deleted(db, doc_id)
+    finally:
+        db.close()
+
+@router.delete("/{doc_id}")
+async def delete_document(doc_id: str):
+    # Deleting rewrites the index, so it goes through the ingestion lane
+    async with get_admission_controller().slot("ingest"):
+        await run_in_threadpool(_delete_document, doc_id)
     return {"status": "deleted"}
 
-@router.get("")
-async def list_documents():
-    """Get a list of all uploaded documents with metadata"""
-    documents = {}
-    
-    # Group metadata by document_id
-    for meta in store.metadata:
-        doc_id = meta.get("document_id")
-        if doc_id and doc_id not in documents:
-            documents[doc_id] = {
-                "document_id": doc_id,
-                "filename": meta.get("filename", "unknown.pdf"),
-                "file_path": meta.get("file_path"),
-                "chunks": 0,
-                "pages": set()
-            }
-        
-        if doc_id:
-            documents[doc_id]["chunks"] += 1
-            if "page" in meta:
-                documents[doc_id]["pages"].add(meta["page"])
-    
-    # Convert pages set to sorted list and count
-    result = []
-    for doc_info in documents.values():
-        doc_info["pages"] = len(doc_info["pages"]) if doc_info["pages"] else 0
-        result.append(doc_info)
-    
-    return {"documents": result}
+def _http_date(dt: datetime) -> str:
+    return format_datetime(dt.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
 
-@router.get("/{doc_id}")
-async def get_document(doc_id: str):
-    """Get detailed information about a specific document"""
-    chunks = []
-    document_info = None
-    
-    for meta in store.metadata:
-        if meta.get("document_id") == doc_id:
-            if not document_info:
-                document_info = {
-                    "document_id": doc_id,
-                    "filename": meta.get("filename", "unknown.pdf"),
-                    "file_path": meta.get("file_path")
-                }
-            
-            chunks.append({
-                "page": meta.get("page", 0),
-                "text": meta.get("text", ""),
-                "chunk_id": len(chunks)
-            })
-    
-    if not document_info:
+def _not_modified(request: Request, etag: str, last_modified: datetime | None) -> bool:
+    """Evaluate If-None-Match (preferred) or If-Modified-Since against the current version"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+def _validators(version: str, last_modified: datetime | None) -> dict:
+    headers = {"ETag": f'W/"{hashlib.sha1(version.encode()).hexdigest()[:16]}"', "Cache-Control": "no-cache"}
+    if last_modified:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+@router.get("", response_model=DocumentListResponse)
+def list_documents(request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    List uploaded documents from the document registry. Responses carry an
+    ETag and Last-Modified; pollers that send If-None-Match get a bodyless
+    304 until a document is added, changes status or is deleted.
+    """
+    count, latest = DocumentRegistry.listing_version(db)
+    headers = _validators(f"{count}:{latest.isoformat() if latest else ''}", latest)
+    if _not_modified(request, headers["ETag"], latest):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return DocumentListResponse(documents=[DocumentRegistry.to_info(doc) for doc in DocumentRegistry.list_documents(db)])
+
+@router.get("/{doc_id}", response_model=DocumentDetailResponse)
+def get_document(request: Request, response: Response, doc_id: str,
+                 offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500),
+                 db: Session = Depends(get_db)):
+    """Get a document's registry entry and one page (offset/limit) of its chunks"""
+    doc = DocumentRegistry.get(db, doc_id)
+    if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    
-    return {
-        "document": document_info,
-        "chunks": chunks,
-        "total_chunks": len(chunks)
-    }
 
+    # A document's chunks only change with its registry entry
+    headers = _validators(f"{doc_id}:{doc.updated_at.isoformat()}:{offset}:{limit}", doc.updated_at)
+    if _not_modified(request, headers["ETag"], doc.updated_at):
+        return Response(status_code=304, headers=headers)
+
+    # Only the requested slice of chunk text is copied into the response
+    snapshot = _vector_store().snapshot
+    metadata = snapshot.metadata
+    positions = snapshot.chunk_positions(doc_id)[offset:offset + limit]
+    chunks = [
+        DocumentChunk(chunk_id=offset + i, page=metadata[pos].get("page", 0), text=metadata[pos].get("text", ""))
+        for i, pos in enumerate(positions)
+    ]
+
+    response.headers.update(headers)
+    return DocumentDetailResponse(
+        document=DocumentRegistry.to_info(doc),
+        chunks=chunks,
+        total_chunks=doc.chunks,
+        offset=offset,
+        limit=limit
+    )
+
+def _stored_file(db: Session, doc_id: str):
+    """The registry entry and stat of a document's original PDF, or 404"""
+    doc = DocumentRegistry.get(db, doc_id)
+    if not doc or doc.status == DocumentStatus.DELETED or not doc.file_path:
+        raise HTTPException(status_code=404, detail="Document not found")
+    try:
+        stat_result = os.stat(doc.file_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Document file not found")
+    return doc, stat_result
+
+@router.api_route("/{doc_id}/file", methods=["GET", "HEAD"])
+def get_document_file(request: Request, doc_id: str, db: Session = Depends(get_db)):
+    """
+    Download the original PDF, for opening a cited page (append #page=N+1 for
+    source page N). Supports Range / If-Range so PDF viewers can fetch pages
+    on demand, and If-None-Match / If-Modified-Since (304). The body is sent
+    with zero-copy pathsend on servers that support it, else streamed in chunks.
+    """
+    doc, stat_result = _stored_file(db, doc_id)
+    last_modified = datetime.fromtimestamp(stat_result.st_mtime, timezone.utc)
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if doc.sha256:
+        # Strong validator, so If-Range requests resume against the same bytes
+        headers["ETag"] = f'"{doc.sha256[:32]}"'
+    response = FileResponse(
+        doc.file_path, headers=headers, media_type="application/pdf", filename=doc.filename,
+        stat_result=stat_result, content_disposition_type="inline"
+    )
+    if _not_modified(request, response.headers["etag"], last_modified):
+        return Response(status_code=304, headers={
+            "ETag": response.headers["etag"], "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            "Last-Modified": response.headers["last-modified"]
+        })
+    return response
+
+@router.get("/{doc_id}/pages/{page}", response_model=DocumentPageResponse)
+def get_document_page(request: Request, response: Response, doc_id: str, page: int, db: Session = Depends(get_db)):
+    """
+    Extracted text of one page (0-based, as in source references) for citation
+    previews. Served from the page text cache written at ingest.
+    """
+    doc, _ = _stored_file(db, doc_id)
+    etag = f'"{hashlib.sha1(f"{doc_id}:{page}:{settings.pdf_extractor}".encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if _not_modified(request, etag, None):
+        return Response(status_code=304, headers=headers)
+    try:
+        text, pages = page_text(doc.file_path, doc.sha256, page)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    response.headers.update(headers)
+    return DocumentPageResponse(document_id=doc_id, page=page, pages=pages, text=text)
+
+@router.get("/{doc_id}/pages/{page}/thumbnail")
+def get_document_page_thumbnail(request: Request, doc_id: str, page: int,
+                                width: int = Query(None, ge=32), db: Session = Depends(get_db)):
+    """
+    One page rendered as a PNG (default THUMBNAIL_WIDTH pixels wide, at most
+    THUMBNAIL_MAX_WIDTH). Renders are kept in an LRU disk cache; needs the
+    pdfium extra (501 without it).
+    """
+    doc, _ = _stored_file(db, doc_id)
+    width = min(width or settings.thumbnail_width, settings.thumbnail_max_width)
+    file_hash = doc.sha256 or file_sha256(doc.file_path)
+    etag = f'"{file_hash[:16]}-{page}-{width}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if _not_modified(request, etag, None):
+        return Response(status_code=304, headers=headers)
+    try:
+        png = get_thumbnail_cache().thumbnail(doc.file_path, file_hash, page, width)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return Response(content=png, media_type="image/png", headers=headers)
@@ -1,8 +1,15 @@
-
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
 
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
 async def health():
+    """Liveness: the process is up and serving requests"""
     return {"status": "ok"}
+
+@router.get("/ready")
+async def ready(request: Request):
+    """Readiness: warm-up has finished and the worker can take traffic"""
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready"}
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+from src.services.profiler import list_profiles, profile_path
+from src.settings import settings
+
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+
+def _require_enabled():
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+
+
+@router.get("")
+def get_profiles(limit: int = Query(50, ge=1, le=1000)):
+    """Most recent request profiles first: id, method, path, status, duration and sample count"""
+    _require_enabled()
+    return {"profiles": list_profiles()[:limit]}
+
+
+@router.get("/{profile_id}")
+def get_profile(profile_id: str):
+    """A stored profile as a speedscope file; open it at https://www.speedscope.app"""
+    _require_enabled()
+    path = profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return FileResponse(path, media_type="application/json", filename=f"{profile_id}.speedscope.json")
@@ -0,0 +1,281 @@
+"""
+Index a directory of PDFs in bulk, e.g. to seed a new deployment.
+
+Pages are extracted and chunked across a process pool (load_pdf, chunk_text;
+page text already in the DOCUMENTS_DIR cache is not parsed again)
+while embedding requests run concurrently on a thread pool (embed_texts).
+Embedded chunks are appended to a staging directory next to the store, and a
+checkpoint manifest records every finished file, so an interrupted run picks
+up where it stopped. Once every file is staged, the chunks are added to the
+vector store in one pass with a single save; nothing touches the live store
+before then. Originals are copied to UPLOAD_DIR and documents are added to
+the document registry like API uploads. Files already ingested by a previous
+run (same path and content) are skipped.
+
+Usage (from the backend directory):
+    python -m src.cli.bulk_ingest /data/pdfs
+    python -m src.cli.bulk_ingest /data/pdfs --workers 8 --concurrency 8 --batch-size 128
+    python -m src.cli.bulk_ingest /data/pdfs --no-commit   # stage only, commit later
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Iterator
+
+import numpy as np
+
+from src.services.index_factory import embedding_dim
+from src.services.pdf_loader import chunk_text, file_sha256, load_pdf
+from src.services.store_backup import METADATA_LINES_FILE, VECTORS_FILE
+from src.settings import settings
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+
+def _extract(path: str, file_hash: str) -> tuple[int, list[tuple[int, str]]]:
+    """Page count and (page, chunk) pairs for one PDF; runs in a worker process"""
+    pages = load_pdf(path, file_hash=file_hash, parallel=False)
+    return len(pages), [(page_num, chunk) for page_num, page_text in enumerate(pages) for chunk in chunk_text(page_text)]
+
+
+class Checkpoint:
+    """
+    Staged chunks (vectors.f32 + metadata.jsonl, as in a store_backup export)
+    and the manifest saying which files they cover. The manifest is replaced
+    atomically after each file, and on resume the staging files are cut back
+    to the lengths it records, dropping any half-written file.
+    """
+    def __init__(self, work_dir: str, dim: int):
+        self.work_dir = work_dir
+        self.dim = dim
+        os.makedirs(work_dir, exist_ok=True)
+        self.path = os.path.join(work_dir, CHECKPOINT_FILE)
+        self.vectors_path = os.path.join(work_dir, VECTORS_FILE)
+        self.metadata_path = os.path.join(work_dir, METADATA_LINES_FILE)
+        self.state = {"dimensions": dim, "staged_vectors": 0, "staged_metadata_bytes": 0, "files": {}}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+            if self.state["dimensions"] != dim:
+                raise ValueError(f"{self.path} was staged with {self.state['dimensions']} dimensions, store uses {dim}")
+        for path, size in ((self.vectors_path, self.state["staged_vectors"] * dim * 4),
+                           (self.metadata_path, self.state["staged_metadata_bytes"])):
+            with open(path, "ab") as f:
+                f.truncate(size)
+
+    @property
+    def files(self) -> dict:
+        return self.state["files"]
+
+    def is_done(self, rel_path: str, sha256: str) -> bool:
+        entry = self.files.get(rel_path)
+        return bool(entry) and entry["sha256"] == sha256 and entry["state"] in ("staged", "committed")
+
+    def save(self):
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+    def stage(self, rel_path: str, entry: dict, vectors: np.ndarray, metas: list[dict]):
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype="<f4").tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.metadata_path, "ab") as f:
+            for m in metas:
+                f.write((json.dumps(m, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self.state["staged_vectors"] += len(metas)
+        self.state["staged_metadata_bytes"] = os.path.getsize(self.metadata_path)
+        self.files[rel_path] = {**entry, "state": "staged"}
+        self.save()
+
+    def fail(self, rel_path: str, sha256: str, error: str):
+        self.files[rel_path] = {"sha256": sha256, "state": "failed", "error": error}
+        self.save()
+
+    def iter_staged(self, batch_size: int) -> Iterator[tuple[np.ndarray, list[dict]]]:
+        count = self.state["staged_vectors"]
+        if not count:
+            return
+        vectors = np.memmap(self.vectors_path, dtype="<f4", mode="r", shape=(count, self.dim))
+        with open(self.metadata_path, "r", encoding="utf-8") as f:
+            for start in range(0, count, batch_size):
+                metas = [json.loads(line) for _, line in zip(range(batch_size), f)]
+                yield np.array(vectors[start:start + len(metas)]), metas
+
+    def mark_committed(self):
+        for entry in self.files.values():
+            if entry["state"] == "staged":
+                entry["state"] = "committed"
+        self.state.update(staged_vectors=0, staged_metadata_bytes=0)
+        self.state.pop("commit_base", None)
+        self.save()
+        for path in (self.vectors_path, self.metadata_path):
+            with open(path, "ab") as f:
+                f.truncate(0)
+
+
+def _extract_all(paths: list[str], hashes: dict[str, str], workers: int) -> Iterator[tuple[str, Future]]:
+    """Extraction futures in completion order, with a bounded number in flight"""
+    todo = deque(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running: dict[Future, str] = {}
+        while todo or running:
+            while todo and len(running) < workers * 2:
+                path = todo.popleft()
+                running[pool.submit(_extract, path, hashes[path])] = path
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield running.pop(future), future
+
+
+def _register_staged(checkpoint: Checkpoint):
+    """Add the staged files to the document registry (skipping any already there)"""
+    from src.models.database import Document, DocumentStatus, SessionLocal, create_tables
+    from src.services.document_registry import DocumentRegistry
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        for entry in checkpoint.files.values():
+            if entry["state"] != "staged" or db.get(Document, entry["document_id"]):
+                continue
+            DocumentRegistry.register(
+                db, entry["document_id"], entry["filename"], entry["file_path"], entry["size_bytes"], entry["sha256"],
+                status=DocumentStatus.READY, pages=entry["pages"], chunks=entry["chunks"]
+            )
+    finally:
+        db.close()
+
+
+def commit(checkpoint: Checkpoint, batch_size: int) -> int:
+    """Add everything staged to the vector store with a single save. Returns chunks added."""
+    from src.services.vector_store import VectorStore
+
+    store = VectorStore()
+    staged = checkpoint.state["staged_vectors"]
+    with store.write_lock():
+        base = checkpoint.state.get("commit_base")
+        if base is not None and len(store) == base + staged:
+            # Interrupted after the store was saved but before the manifest was updated
+            _register_staged(checkpoint)
+            checkpoint.mark_committed()
+            return staged
+        checkpoint.state["commit_base"] = len(store)
+        checkpoint.save()
+        for vectors, metas in checkpoint.iter_staged(batch_size):
+            store.add_embeddings(vectors, metas, save=False)
+        store.save()
+    _register_staged(checkpoint)
+    checkpoint.mark_committed()
+    return staged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directory searched recursively for *.pdf")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes extracting PDF text")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding request")
+    parser.add_argument("--work-dir", help="Staging directory (default: <VECTOR_STORE_PATH>/bulk-ingest)")
+    parser.add_argument("--no-commit", action="store_true", help="Stage only; a later run without it commits")
+    args = parser.parse_args()
+
+    from src.api.documents import UPLOAD_DIR
+    from src.services.vector_store import embed_texts
+
+    root = os.path.abspath(args.directory)
+    if not os.path.isdir(root):
+        sys.exit(f"Not a directory: {root}")
+    checkpoint = Checkpoint(args.work_dir or os.path.join(settings.vector_store_path, "bulk-ingest"), embedding_dim())
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    paths, hashes = [], {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if not name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(path, root)
+            hashes[path] = file_sha256(path)
+            if not checkpoint.is_done(rel_path, hashes[path]):
+                paths.append(path)
+    print(f"{len(paths)} PDFs to ingest ({len(hashes) - len(paths)} already done)")
+
+    start = time.perf_counter()
+    chunks_total = failed = 0
+    pending = deque()  # (path, page count, chunks, embedding futures), staged in extraction order
+    max_pending = max(2, args.concurrency)
+
+    def finish(path: str, page_count: int, chunks: list[tuple[int, str]], futures: list[Future]):
+        nonlocal chunks_total, failed
+        rel_path = os.path.relpath(path, root)
+        try:
+            vectors = np.vstack([f.result() for f in futures]) if futures else np.zeros((0, checkpoint.dim), dtype="float32")
+        except Exception as e:
+            failed += 1
+            checkpoint.fail(rel_path, hashes[path], f"embedding failed: {e}")
+            print(f"  failed {rel_path}: {e}")
+            return
+        doc_id = str(uuid.uuid4())
+        filename = os.path.basename(path)
+        persistent_path = os.path.join(UPLOAD_DIR, f"{doc_id}_{filename}")
+        shutil.copy2(path, persistent_path)
+        metas = [
+            {"document_id": doc_id, "page": page_num, "text": chunk, "filename": filename, "file_path": persistent_path}
+            for page_num, chunk in chunks
+        ]
+        entry = {
+            "sha256": hashes[path], "document_id": doc_id, "filename": filename, "file_path": persistent_path,
+            "size_bytes": os.path.getsize(path), "pages": page_count, "chunks": len(chunks)
+        }
+        checkpoint.stage(rel_path, entry, vectors, metas)
+        chunks_total += len(chunks)
+        done = sum(1 for e in checkpoint.files.values() if e["state"] != "failed")
+        print(f"  {rel_path}: {len(chunks)} chunks ({done}/{len(hashes)} files, "
+              f"{chunks_total / (time.perf_counter() - start):.0f} chunks/s)")
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as embed_pool:
+        for path, extraction in _extract_all(paths, hashes, args.workers):
+            try:
+                page_count, chunks = extraction.result()
+            except Exception as e:
+                failed += 1
+                checkpoint.fail(os.path.relpath(path, root), hashes[path], f"extraction failed: {e}")
+                print(f"  failed {os.path.relpath(path, root)}: {e}")
+                continue
+            texts = [chunk for _, chunk in chunks]
+            futures = [
+                embed_pool.submit(embed_texts, texts[i:i + args.batch_size], args.batch_size)
+                for i in range(0, len(texts), args.batch_size)
+            ]
+            pending.append((path, page_count, chunks, futures))
+            # Stage finished files promptly; wait on the oldest only when too many are buffered
+            while pending and (len(pending) > max_pending or all(f.done() for f in pending[0][3])):
+                finish(*pending.popleft())
+        while pending:
+            finish(*pending.popleft())
+
+    elapsed = time.perf_counter() - start
+    print(f"Staged {chunks_total} chunks in {elapsed:.1f}s ({failed} files failed; rerun to retry them)")
+    if not checkpoint.state["staged_vectors"]:
+        return
+    if args.no_commit:
+        print(f"{checkpoint.state['staged_vectors']} chunks staged in {checkpoint.work_dir}; run again without --no-commit to add them")
+        return
+
+    commit_start = time.perf_counter()
+    added = commit(checkpoint, batch_size=10_000)
+    print(f"Added {added} chunks to the vector store in {time.perf_counter() - commit_start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
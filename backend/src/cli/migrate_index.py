@@ -0,0 +1,84 @@
+"""
+Convert the vector store to another index type and/or embedding size.
+
+Vectors are taken from the existing index; when --dimensions is smaller than
+the current size they are truncated and re-normalised, which matches what
+text-embedding-3 models return for the `dimensions` parameter. Use --reembed to
+embed every chunk again instead (required to grow dimensions, and more accurate
+when the current index is already quantised). The old files are kept with a
+.bak suffix. Afterwards set VECTOR_INDEX_TYPE / EMBEDDING_DIMENSIONS to match.
+Indexes from before the switch to cosine scoring (L2 distance) are rewritten
+as normalised inner-product indexes.
+
+Usage (from the backend directory):
+    python -m src.cli.migrate_index --index-type sq8
+    python -m src.cli.migrate_index --index-type flat --dimensions 512
+"""
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import sys
+import time
+
+import faiss
+
+from src.services.index_factory import build_index, index_bytes, index_type_of, reconstruct_all, reduce_dimensions
+from src.services.store_generation import bump_store_generation
+from src.settings import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-type", choices=["flat", "fp16", "sq8", "pq"], default=settings.vector_index_type)
+    parser.add_argument("--dimensions", type=int, help="Target embedding size (default: keep the current size)")
+    parser.add_argument("--reembed", action="store_true", help="Embed all chunks again instead of converting stored vectors")
+    parser.add_argument("--dry-run", action="store_true", help="Build the new index and report sizes without writing it")
+    args = parser.parse_args()
+
+    index_path = os.path.join(settings.vector_store_path, settings.faiss_index_file)
+    meta_path = os.path.join(settings.vector_store_path, settings.metadata_file)
+    if not os.path.exists(index_path):
+        sys.exit(f"No vector index at {index_path}")
+
+    # Same lock the running app takes for writes, so no upload lands mid-migration
+    with open(os.path.join(settings.vector_store_path, ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        old = faiss.read_index(index_path)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        dim = args.dimensions or old.d
+        print(f"current: {index_type_of(old)}, {old.d} dims, {old.ntotal} vectors, {index_bytes(old) / 2**20:.1f} MiB")
+
+        start = time.perf_counter()
+        if args.reembed:
+            from src.services.vector_store import embed_texts
+            settings.embedding_dimensions = dim
+            vectors = embed_texts([m["text"] for m in metadata])
+        else:
+            if dim > old.d:
+                sys.exit(f"Cannot grow {old.d} -> {dim} dimensions from stored vectors; use --reembed")
+            if index_type_of(old) != "flat":
+                print("warning: the current index is quantised, so converted vectors carry its error; --reembed avoids this")
+            vectors = reconstruct_all(old)
+            if dim < old.d:
+                vectors = reduce_dimensions(vectors, dim)
+        new = build_index(args.index_type, vectors)
+        print(f"new:     {args.index_type}, {new.d} dims, {new.ntotal} vectors, {index_bytes(new) / 2**20:.1f} MiB "
+              f"({time.perf_counter() - start:.1f}s)")
+        if args.dry_run:
+            return
+
+        shutil.copy2(index_path, index_path + ".bak")
+        faiss.write_index(new, index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+        # Touch the metadata so running workers reload the store
+        os.utime(meta_path)
+        bump_store_generation()
+    print(f"Wrote {index_path} (previous index kept as {index_path}.bak)")
+    print(f"Set VECTOR_INDEX_TYPE={args.index_type} EMBEDDING_DIMENSIONS={dim} before restarting")
+
+
+if __name__ == "__main__":
+    main()
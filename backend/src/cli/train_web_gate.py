@@ -0,0 +1,110 @@
+"""
+Train the web search gate's classifier from logged chat traffic.
+
+Input is the JSON-lines log written with WEB_SEARCH_DECISION_LOG set. A turn
+that searched is labelled by its outcome: positive if any web result was
+relevant enough to reach the prompt, negative if none was. Turns that didn't
+search carry no outcome and are skipped unless a "label" field (0/1) was added
+by hand, which always takes precedence. Every fifth example is held out, and
+precision, recall and search rate are reported for the classifier and for the
+keyword rules on the same examples, so the two can be compared before
+switching. Set WEB_SEARCH_CLASSIFIER_PATH to the output file to use it.
+
+Usage (from the backend directory):
+    python -m src.cli.train_web_gate /app/data/logs/web_search_decisions.jsonl --out web_gate.json
+    python -m src.cli.train_web_gate decisions.jsonl labelled.jsonl --threshold 0.4 --out web_gate.json
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from src.services.web_search_gate import WebSearchClassifier, WebSearchGate
+from src.settings import settings
+
+
+def load_examples(paths: list[str]) -> list[tuple[str, float, int]]:
+    """(query, best document score, label) for every labelled line"""
+    examples = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "label" in entry:
+                    label = int(bool(entry["label"]))
+                elif entry.get("search"):
+                    label = int(entry.get("relevant", 0) > 0)
+                else:
+                    continue
+                examples.append((entry["query"], float(entry.get("best_score", 0.0)), label))
+    return examples
+
+
+def train(examples: list[tuple[str, float, int]], buckets: int, epochs: int, learning_rate: float, l2: float) -> WebSearchClassifier:
+    """Full-batch gradient descent on the logistic loss over sparse hashed features"""
+    features = [WebSearchClassifier.features(query, buckets) for query, _, _ in examples]
+    lengths = np.array([len(f) for f in features])
+    flat = np.concatenate(features) if features else np.zeros(0, dtype="int64")
+    rows = np.repeat(np.arange(len(examples)), lengths)
+    scores = np.array([score for _, score, _ in examples], dtype="float64")
+    labels = np.array([label for _, _, label in examples], dtype="float64")
+
+    weights = np.zeros(buckets)
+    bias = score_weight = 0.0
+    n = len(examples)
+    for _ in range(epochs):
+        z = bias + score_weight * scores + np.bincount(rows, weights=weights[flat], minlength=n)
+        error = 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30))) - labels
+        weights -= learning_rate * (np.bincount(flat, weights=error[rows], minlength=buckets) / n + l2 * weights)
+        bias -= learning_rate * error.mean()
+        score_weight -= learning_rate * (error * scores).mean()
+    return WebSearchClassifier(buckets, weights.tolist(), float(bias), float(score_weight))
+
+
+def report(name: str, predictions: list[bool], labels: list[int]):
+    true_positives = sum(1 for p, y in zip(predictions, labels) if p and y)
+    searched = sum(predictions)
+    positives = sum(labels)
+    precision = true_positives / searched if searched else 0.0
+    recall = true_positives / positives if positives else 0.0
+    print(f"  {name:<10} precision {precision:.2f}  recall {recall:.2f}  search rate {searched / len(labels):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="Decision log(s) / labelled JSON-lines files")
+    parser.add_argument("--out", required=True, help="Where to write the classifier (JSON)")
+    parser.add_argument("--buckets", type=int, default=4096, help="Hashed feature space size")
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--learning-rate", type=float, default=1.0)
+    parser.add_argument("--l2", type=float, default=1e-4)
+    parser.add_argument("--threshold", type=float, default=0.5, help="Search when the probability reaches this")
+    args = parser.parse_args()
+
+    examples = load_examples(args.logs)
+    if len(examples) < 20:
+        sys.exit(f"Only {len(examples)} labelled examples; log more traffic first")
+    held_out = examples[::5]
+    training = [e for i, e in enumerate(examples) if i % 5]
+    print(f"{len(examples)} examples ({sum(label for _, _, label in examples)} positive), {len(held_out)} held out")
+
+    classifier = train(training, args.buckets, args.epochs, args.learning_rate, args.l2)
+    classifier.threshold = args.threshold
+    rules = WebSearchGate(settings.web_search_min_score, settings.web_search_keyword_max_score)
+    labels = [label for _, _, label in held_out]
+    print("Held-out examples:")
+    report("classifier", [classifier.probability(q, s) >= args.threshold for q, s, _ in held_out], labels)
+    report("keywords", [rules.evaluate(q, s).search for q, s, _ in held_out], labels)
+
+    # Final model uses every example
+    classifier = train(examples, args.buckets, args.epochs, args.learning_rate, args.l2)
+    classifier.threshold = args.threshold
+    classifier.save(args.out)
+    print(f"Wrote {args.out}; set WEB_SEARCH_CLASSIFIER_PATH={args.out}")
+
+
+if __name__ == "__main__":
+    main()
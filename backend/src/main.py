@@ -1,15 +1,76 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from src.api import chat, documents, health
-from src.models.database import create_tables
+from sqlalchemy import text
+from src.api import chat, documents, health, metrics, profiles
+from src.models.database import create_tables, engine, SessionLocal
+from src.services.chat_search import ensure_search_index
+from src.services.document_registry import DocumentRegistry
+from src.services.generation_registry import watch_cancellations
+from src.services.openai_client import get_openai, get_async_openai
+from src.services.profiler import ProfilingMiddleware
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """
+    Load everything the first request would otherwise pay for. Heavy packages
+    (faiss, openai) are first imported here rather than when the app module is
+    imported. Runs in the background once startup has finished, so the server
+    is already listening (and /ready answering 503) while it loads.
+    """
+    from src.services.vector_store import get_vector_store
+    if settings.faiss_omp_threads:
+        import faiss
+        faiss.omp_set_num_threads(settings.faiss_omp_threads)
+    store = get_vector_store()
+    get_openai()
+    get_async_openai()
+    # Open the first pooled connection
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    # Register documents ingested before the registry existed
+    db = SessionLocal()
+    try:
+        DocumentRegistry.backfill(db, store.metadata)
+    finally:
+        db.close()
+    logger.info(f"Warm-up complete: {len(store)} chunks loaded")
+
+
+async def _warm_up_in_background(app: FastAPI):
+    try:
+        await run_in_threadpool(warm_up)
+    except Exception:
+        # Stay unready; requests still load what they need on first use
+        logger.exception("Warm-up failed")
+        return
+    app.state.ready = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The server only starts listening once this yields, so warm up in a task:
+    # /ready reports 503 until it has finished
+    app.state.ready = False
+    create_tables()
+    ensure_search_index(engine)
+    warm_up_task = asyncio.create_task(_warm_up_in_background(app))
+    # Stops local generations cancelled through another worker
+    cancel_watcher = asyncio.create_task(watch_cancellations())
+    yield
+    app.state.ready = False
+    warm_up_task.cancel()
+    cancel_watcher.cancel()
+
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="RAG Chat Backend", version="0.1.0")
-    
-    # Initialize database tables
-    @app.on_event("startup")
-    async def startup_event():
-        create_tables()
+    app = FastAPI(title="RAG Chat Backend", version="0.1.0", lifespan=lifespan)
     
     @app.get("/")
     def read_root():
@@ -19,6 +80,8 @@ def create_app() -> FastAPI:
     def health_check():
         return {"status": "ok"}
 
+    if settings.profiling_enabled:
+        app.add_middleware(ProfilingMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -29,6 +92,8 @@ def create_app() -> FastAPI:
     app.include_router(chat.router)
     app.include_router(documents.router)
     app.include_router(health.router)
+    app.include_router(metrics.router)
+    app.include_router(profiles.router)
     return app
 
 app = create_app()
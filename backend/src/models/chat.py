@@ -69,3 +69,20 @@ class ChatHistoryResponse(BaseModel):
 
 class ChatSessionsResponse(BaseModel):
     sessions: List[ChatSessionResponse]
+
+class ChatSearchHit(BaseModel):
+    message_id: int
+    session_id: str
+    session_title: str
+    role: str
+    created_at: datetime
+    snippet: str   # HTML-escaped message text with matched terms wrapped in <mark></mark>
+    score: float   # higher is more relevant
+
+class ChatSearchResponse(BaseModel):
+    query: str
+    results: List[ChatSearchHit]
+    offset: int
+    limit: int
+    has_more: bool
+    truncated: bool = False   # only the newest CHAT_SEARCH_MAX_CANDIDATES matches were ranked (SQLite)
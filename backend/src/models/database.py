@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, create_engine, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, ForeignKey, create_engine, Enum
 from sqlalchemy.orm import DeclarativeBase, relationship, sessionmaker
 from datetime import datetime
 import os
@@ -11,6 +11,12 @@ class SourceType(enum.Enum):
     DOCUMENT = "document"
     WEB = "web"
 
+class DocumentStatus(enum.Enum):
+    PROCESSING = "processing"
+    READY = "ready"
+    FAILED = "failed"
+    DELETED = "deleted"
+
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
     
@@ -98,6 +104,43 @@ class MessageSource(Base):
             published_date=getattr(source_ref, 'published_date', None)
         )
 
+class Document(Base):
+    """
+    Registry of ingested documents with stats precomputed at ingest time.
+    Deleted documents are kept with status DELETED so every change moves
+    max(updated_at) forward, which is what the listing's ETag is built from.
+    """
+    __tablename__ = "documents"
+
+    id = Column(String, primary_key=True)
+    filename = Column(String, nullable=False, index=True)
+    file_path = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=False, default=0)
+    pages = Column(Integer, nullable=False, default=0)
+    chunks = Column(Integer, nullable=False, default=0)
+    sha256 = Column(String(64), nullable=True, index=True)
+    status = Column(Enum(DocumentStatus), nullable=False, default=DocumentStatus.PROCESSING)
+    error = Column(Text, nullable=True)
+    version = Column(Integer, nullable=False, default=1)  # 1 + uploads of the same filename before it
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class ChatGeneration(Base):
+    """
+    A response being generated by POST /chat/message, keyed by its message id.
+    Lets any worker ask the one running it to stop: the cancel endpoint sets
+    cancel_requested and the generating worker polls for it.
+    """
+    __tablename__ = "chat_generations"
+
+    id = Column(String, primary_key=True)
+    session_id = Column(String, nullable=False)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    finish_reason = Column(String, nullable=True)
+    characters = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    finished_at = Column(DateTime, nullable=True)
+
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/database/chat_history.db")
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
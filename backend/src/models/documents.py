@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
 
 class DocumentMetadata(BaseModel):
     id: str
@@ -7,3 +9,56 @@ class DocumentMetadata(BaseModel):
 class DocumentUploadResponse(BaseModel):
     id: str
     chunks: int
+
+class DocumentInfo(BaseModel):
+    document_id: str
+    filename: str
+    file_path: Optional[str] = None
+    size_bytes: int
+    pages: int
+    chunks: int
+    sha256: Optional[str] = None
+    status: Literal["processing", "ready", "failed", "deleted"]
+    error: Optional[str] = None
+    version: int
+    created_at: datetime
+    updated_at: datetime
+
+class DocumentListResponse(BaseModel):
+    documents: List[DocumentInfo]
+
+class DocumentChunk(BaseModel):
+    chunk_id: int
+    page: int
+    text: str
+
+class DocumentDetailResponse(BaseModel):
+    document: DocumentInfo
+    chunks: List[DocumentChunk]
+    total_chunks: int
+    offset: int
+    limit: int
+
+class DocumentPageResponse(BaseModel):
+    document_id: str
+    page: int
+    pages: int
+    text: str
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    k: int = Field(4, ge=1, le=100)
+
+class SearchHit(BaseModel):
+    document_id: str
+    filename: str
+    page: int
+    text: str
+    score: float
+
+class BatchSearchResult(BaseModel):
+    query: str
+    hits: List[SearchHit]
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchResult]
@@ -0,0 +1,145 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Tuple
+from fastapi import HTTPException
+from src.services.metrics import ADMISSION_ACTIVE, ADMISSION_QUEUED, ADMISSION_WAIT_SECONDS, ADMISSION_REJECTED
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Lane:
+    name: str
+    priority: int      # lower is admitted first
+    max_active: int
+    max_queued: int
+    max_wait: float    # seconds a request may wait for a slot
+
+
+class AdmissionRejected(HTTPException):
+    """Raised when a request can't be admitted; FastAPI turns it into a 429/503 response"""
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+class AdmissionController:
+    """
+    Bounded admission for expensive endpoints, per worker. Lanes (e.g. chat and
+    ingestion) each have their own concurrency limit and share `capacity` slots.
+    Requests beyond that wait in a priority queue: when a slot frees up, waiting
+    chat requests are admitted before waiting uploads. A full queue is rejected
+    straight away with 429; a request that waits longer than its lane's
+    max_wait gets 503. Both carry Retry-After.
+    """
+    def __init__(self, capacity: int, lanes: List[Lane], retry_after: int = 5):
+        self.capacity = capacity
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.retry_after = retry_after
+        self._active = {name: 0 for name in self.lanes}
+        self._queued = {name: 0 for name in self.lanes}
+        self._waiters: List[Tuple[int, int, str, asyncio.Future, float]] = []
+        self._seq = itertools.count()
+
+    def active(self, lane: str) -> int:
+        return self._active[lane]
+
+    def queued(self, lane: str) -> int:
+        return self._queued[lane]
+
+    def _has_room(self, lane: Lane) -> bool:
+        return sum(self._active.values()) < self.capacity and self._active[lane.name] < lane.max_active
+
+    def _admit(self, lane: Lane):
+        self._active[lane.name] += 1
+        ADMISSION_ACTIVE.set(self._active[lane.name], lane=lane.name)
+
+    def _set_queued(self, lane: str, delta: int):
+        self._queued[lane] += delta
+        ADMISSION_QUEUED.set(self._queued[lane], lane=lane)
+
+    async def acquire(self, lane_name: str):
+        """Wait for a slot in the lane. Every successful acquire must be paired with release()."""
+        lane = self.lanes[lane_name]
+        # Don't overtake requests already queued at the same or a higher priority
+        queued_ahead = any(self._queued[n] for n, other in self.lanes.items() if other.priority <= lane.priority)
+        if not queued_ahead and self._has_room(lane):
+            self._admit(lane)
+            ADMISSION_WAIT_SECONDS.observe(0.0, lane=lane.name)
+            return
+
+        if self._queued[lane.name] >= lane.max_queued:
+            ADMISSION_REJECTED.inc(lane=lane.name, reason="queue_full")
+            raise AdmissionRejected(429, f"Too many {lane.name} requests queued, please retry shortly", self.retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (lane.priority, next(self._seq), lane.name, future, time.monotonic()))
+        self._set_queued(lane.name, 1)
+        try:
+            await asyncio.wait_for(future, lane.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Granted just as we gave up: hand the slot on
+                self.release(lane.name)
+            else:
+                # Still queued; the heap entry is skipped once its future is cancelled
+                self._set_queued(lane.name, -1)
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION_REJECTED.inc(lane=lane.name, reason="timeout")
+                raise AdmissionRejected(503, f"Server busy: no {lane.name} capacity within {lane.max_wait:g}s", self.retry_after)
+            raise
+
+    def release(self, lane_name: str):
+        self._active[lane_name] -= 1
+        ADMISSION_ACTIVE.set(self._active[lane_name], lane=lane_name)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit queued requests in priority order while there is room"""
+        skipped = []
+        while self._waiters and sum(self._active.values()) < self.capacity:
+            entry = heapq.heappop(self._waiters)
+            _, _, name, future, queued_at = entry
+            if future.done():
+                continue
+            lane = self.lanes[name]
+            if not self._has_room(lane):
+                # This lane is at its own limit; let lower-priority lanes use the slot
+                skipped.append(entry)
+                continue
+            self._set_queued(name, -1)
+            self._admit(lane)
+            ADMISSION_WAIT_SECONDS.observe(time.monotonic() - queued_at, lane=name)
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+    @asynccontextmanager
+    async def slot(self, lane_name: str):
+        """Hold a slot in the lane for the duration of the block"""
+        await self.acquire(lane_name)
+        try:
+            yield
+        finally:
+            self.release(lane_name)
+
+
+@lru_cache(maxsize=1)
+def get_admission_controller() -> AdmissionController:
+    """Process-wide admission controller (acts like a singleton)."""
+    return AdmissionController(
+        capacity=settings.admission_max_active,
+        lanes=[
+            Lane("chat", priority=0, max_active=settings.max_concurrent_generations,
+                 max_queued=settings.chat_queue_max, max_wait=settings.chat_queue_timeout_seconds),
+            Lane("ingest", priority=1, max_active=settings.max_concurrent_ingestions,
+                 max_queued=settings.ingest_queue_max, max_wait=settings.ingest_queue_timeout_seconds),
+        ],
+        retry_after=settings.admission_retry_after_seconds,
+    )
@@ -0,0 +1,193 @@
+import html
+import logging
+import re
+from typing import List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from src.models.chat import ChatSearchHit
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+MARK_START, MARK_END = "<mark>", "</mark>"
+# The database marks matches with private-use characters; snippets are escaped
+# before those become <mark> tags, so message text can never inject markup
+_SENTINEL_START, _SENTINEL_END = "\ue000", "\ue001"
+
+# SQLite: an external-content FTS5 table over chat_messages.content kept in
+# sync by triggers, so the index is maintained row by row as messages change.
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts USING fts5(
+        content, content='chat_messages', content_rowid='id',
+        tokenize='porter unicode61', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS chat_messages_fts_ai AFTER INSERT ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chat_messages_fts_ad AFTER DELETE ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chat_messages_fts_au AFTER UPDATE OF content ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO chat_messages_fts(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+# Postgres: a GIN expression index, which Postgres maintains on every write.
+# Queries must use the identical to_tsvector expression to hit it.
+_PG_TSVECTOR = "to_tsvector('english', m.content)"
+_PG_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_chat_messages_content_fts ON chat_messages USING GIN (to_tsvector('english', content))",
+]
+
+_SQLITE_SEARCH = f"""
+    SELECT m.id, m.session_id, s.title, m.role, m.created_at,
+           snippet(chat_messages_fts, 0, '{_SENTINEL_START}', '{_SENTINEL_END}', '…', 16) AS snippet,
+           bm25(chat_messages_fts) AS rank
+    FROM chat_messages_fts
+    JOIN chat_messages m ON m.id = chat_messages_fts.rowid
+    JOIN chat_sessions s ON s.id = m.session_id
+    WHERE chat_messages_fts MATCH :query AND chat_messages_fts.rowid >= :floor {{filters}}
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+"""
+
+# bm25 is computed for every match, so a word in most messages would rank
+# them all; only matches from the newest max_candidates rowids are ranked.
+_SQLITE_CANDIDATE_FLOOR = """
+    SELECT rowid FROM chat_messages_fts WHERE chat_messages_fts MATCH :query
+    ORDER BY rowid DESC LIMIT 1 OFFSET :max_candidates
+"""
+
+# ts_headline is costly, so it only runs on the page of rows that survives ranking
+_PG_SEARCH = f"""
+    SELECT hit.id, hit.session_id, s.title, hit.role, hit.created_at,
+           ts_headline('english', hit.content, websearch_to_tsquery('english', :query),
+                       'StartSel={_SENTINEL_START}, StopSel={_SENTINEL_END}, MaxWords=24, MinWords=8, MaxFragments=1') AS snippet,
+           hit.rank
+    FROM (
+        SELECT m.id, m.session_id, m.role, m.created_at, m.content,
+               -ts_rank_cd({_PG_TSVECTOR}, websearch_to_tsquery('english', :query)) AS rank
+        FROM chat_messages m
+        WHERE {_PG_TSVECTOR} @@ websearch_to_tsquery('english', :query) {{filters}}
+        ORDER BY rank
+        LIMIT :limit OFFSET :offset
+    ) hit
+    JOIN chat_sessions s ON s.id = hit.session_id
+    ORDER BY hit.rank
+"""
+
+_TOKENS = re.compile(r"\w+", re.UNICODE)
+# SQLite databases found at startup to lack FTS5 (by URL); searching them is a 501, not a 500
+_NO_FTS5 = set()
+
+
+def _sqlite_fts5_available(conn) -> bool:
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)"))
+        conn.execute(text("DROP TABLE temp.fts5_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def ensure_search_index(engine: Engine):
+    """
+    Create the full-text index for chat messages if it doesn't exist yet.
+    On SQLite an index created over an existing table is backfilled once.
+    """
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            if not _sqlite_fts5_available(conn):
+                logger.warning("SQLite was built without FTS5; chat search is unavailable")
+                _NO_FTS5.add(str(engine.url))
+                return
+            _NO_FTS5.discard(str(engine.url))
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_messages_fts'"
+            )).first()
+            for statement in _SQLITE_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text("INSERT INTO chat_messages_fts(chat_messages_fts) VALUES ('rebuild')"))
+                logger.info("Chat search: indexed existing messages")
+        elif dialect == "postgresql":
+            for statement in _PG_DDL:
+                conn.execute(text(statement))
+        else:
+            logger.warning(f"Chat search is not supported on {dialect}")
+
+
+def _highlight(snippet: str) -> str:
+    """HTML-escape a snippet, then turn the database's match sentinels into <mark> tags"""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_SENTINEL_START, MARK_START).replace(_SENTINEL_END, MARK_END)
+
+
+def _fts5_query(query: str) -> Optional[str]:
+    """
+    User input as an FTS5 query that can't be a syntax error: every word is
+    quoted and required, and the last one matches as a prefix (search as you type).
+    """
+    words = _TOKENS.findall(query)
+    if not words:
+        return None
+    quoted = [f'"{word}"' for word in words]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_messages(db: Session, query: str, limit: int = 20, offset: int = 0,
+                    session_id: str = None, role: str = None) -> Tuple[List[ChatSearchHit], bool, bool]:
+    """
+    Ranked full-text search over chat messages. Returns one page of hits
+    (best first), whether more follow (one extra row is fetched for that
+    instead of counting every match), and whether only the newest
+    chat_search_max_candidates matches were ranked.
+    """
+    bind = db.get_bind()
+    dialect = bind.dialect.name
+    if str(bind.url) in _NO_FTS5:
+        raise NotImplementedError("Chat search is unavailable: SQLite was built without FTS5")
+    params = {"limit": limit + 1, "offset": offset, "query": query}
+    filters = ""
+    if session_id:
+        filters += " AND m.session_id = :session_id"
+        params["session_id"] = session_id
+    if role:
+        filters += " AND m.role = :role"
+        params["role"] = role
+
+    if dialect == "sqlite":
+        params["query"] = _fts5_query(query)
+        if params["query"] is None:
+            return [], False, False
+        params["floor"] = 0
+        if not session_id:  # one session's matches are few enough to rank them all
+            floor = db.execute(text(_SQLITE_CANDIDATE_FLOOR), {
+                "query": params["query"], "max_candidates": settings.chat_search_max_candidates
+            }).scalar()
+            params["floor"] = floor + 1 if floor is not None else 0
+        sql = _SQLITE_SEARCH.format(filters=filters)
+    elif dialect == "postgresql":
+        sql = _PG_SEARCH.format(filters=filters)
+    else:
+        raise NotImplementedError(f"Chat search is not supported on {dialect}")
+
+    truncated = bool(params.get("floor"))
+    rows = db.execute(text(sql), params).all()
+    hits = [
+        ChatSearchHit(
+            message_id=row.id,
+            session_id=row.session_id,
+            session_title=row.title,
+            role=row.role,
+            created_at=row.created_at,
+            snippet=_highlight(row.snippet),
+            score=round(-float(row.rank), 4)
+        )
+        for row in rows[:limit]
+    ]
+    return hits, len(rows) > limit, truncated
@@ -0,0 +1,146 @@
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from src.models.database import Document, DocumentStatus
+from src.models.documents import DocumentInfo
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentRegistry:
+    """
+    Persisted per-document stats (pages, chunks, size, hash, status), written
+    at ingest and delete time so listings never have to scan the vector store.
+    """
+
+    @staticmethod
+    def to_info(doc: Document) -> DocumentInfo:
+        return DocumentInfo(
+            document_id=doc.id,
+            filename=doc.filename,
+            file_path=doc.file_path,
+            size_bytes=doc.size_bytes,
+            pages=doc.pages,
+            chunks=doc.chunks,
+            sha256=doc.sha256,
+            status=doc.status.value,
+            error=doc.error,
+            version=doc.version,
+            created_at=doc.created_at,
+            updated_at=doc.updated_at
+        )
+
+    @staticmethod
+    def register(db: Session, doc_id: str, filename: str, file_path: str, size_bytes: int, sha256: str,
+                 status: DocumentStatus = DocumentStatus.PROCESSING, pages: int = 0, chunks: int = 0) -> Document:
+        """Add a document; re-uploads of a filename get the next version number"""
+        previous = db.query(func.max(Document.version)).filter(Document.filename == filename).scalar() or 0
+        doc = Document(
+            id=doc_id,
+            filename=filename,
+            file_path=file_path,
+            size_bytes=size_bytes,
+            sha256=sha256,
+            status=status,
+            pages=pages,
+            chunks=chunks,
+            version=previous + 1
+        )
+        db.add(doc)
+        db.commit()
+        return doc
+
+    @staticmethod
+    def _update(db: Session, doc_id: str, **fields) -> Optional[Document]:
+        doc = db.get(Document, doc_id)
+        if not doc:
+            return None
+        for name, value in fields.items():
+            setattr(doc, name, value)
+        doc.updated_at = datetime.utcnow()
+        db.commit()
+        return doc
+
+    @staticmethod
+    def mark_ready(db: Session, doc_id: str, pages: int, chunks: int) -> Optional[Document]:
+        return DocumentRegistry._update(db, doc_id, status=DocumentStatus.READY, pages=pages, chunks=chunks, error=None)
+
+    @staticmethod
+    def mark_failed(db: Session, doc_id: str, error: str) -> Optional[Document]:
+        return DocumentRegistry._update(db, doc_id, status=DocumentStatus.FAILED, error=error)
+
+    @staticmethod
+    def mark_deleted(db: Session, doc_id: str) -> Optional[Document]:
+        return DocumentRegistry._update(db, doc_id, status=DocumentStatus.DELETED, chunks=0)
+
+    @staticmethod
+    def get(db: Session, doc_id: str) -> Optional[Document]:
+        doc = db.get(Document, doc_id)
+        return doc if doc and doc.status != DocumentStatus.DELETED else None
+
+    @staticmethod
+    def list_documents(db: Session) -> List[Document]:
+        """All documents except deleted ones, oldest first"""
+        return (
+            db.query(Document)
+            .filter(Document.status != DocumentStatus.DELETED)
+            .order_by(Document.created_at, Document.id)
+            .all()
+        )
+
+    @staticmethod
+    def listing_version(db: Session) -> Tuple[int, Optional[datetime]]:
+        """
+        (row count, latest update) over every row including deleted ones. Any
+        registration or status change alters it, so it identifies a listing.
+        """
+        count, latest = db.query(func.count(Document.id), func.max(Document.updated_at)).one()
+        return count, latest
+
+    @staticmethod
+    def backfill(db: Session, metadata: List[dict]) -> int:
+        """
+        Register documents that are in the vector store but not the registry
+        (stores created before the registry existed). Returns how many were added.
+        """
+        stats = {}
+        for meta in metadata:
+            doc_id = meta.get("document_id")
+            if not doc_id:
+                continue
+            entry = stats.setdefault(doc_id, {"filename": meta.get("filename", "unknown.pdf"),
+                                              "file_path": meta.get("file_path"), "chunks": 0, "pages": set()})
+            entry["chunks"] += 1
+            if "page" in meta:
+                entry["pages"].add(meta["page"])
+        if not stats:
+            return 0
+
+        known = {doc_id for (doc_id,) in db.query(Document.id)}
+        added = 0
+        for doc_id, entry in stats.items():
+            if doc_id in known:
+                continue
+            db.add(Document(
+                id=doc_id,
+                filename=entry["filename"],
+                file_path=entry["file_path"],
+                size_bytes=os.path.getsize(entry["file_path"]) if entry["file_path"] and os.path.exists(entry["file_path"]) else 0,
+                pages=len(entry["pages"]),
+                chunks=entry["chunks"],
+                status=DocumentStatus.READY
+            ))
+            added += 1
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker backfilled concurrently
+            db.rollback()
+            return 0
+        if added:
+            logger.info(f"Document registry: backfilled {added} documents from the vector store")
+        return added
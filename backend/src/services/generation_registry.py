@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from src.models.database import ChatGeneration, SessionLocal
+from src.services.streaming import get_stream_registry
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationRegistry:
+    """
+    Persisted state of streamed responses, shared by all workers. Stream buffers
+    live only in the worker generating them; this table is how a cancel that
+    reaches another worker gets to the right one.
+    """
+
+    @staticmethod
+    def start(db: Session, message_id: str, session_id: str) -> ChatGeneration:
+        GenerationRegistry._prune(db)
+        generation = ChatGeneration(id=message_id, session_id=session_id)
+        db.add(generation)
+        db.commit()
+        return generation
+
+    @staticmethod
+    def get(db: Session, message_id: str) -> Optional[ChatGeneration]:
+        return db.get(ChatGeneration, message_id)
+
+    @staticmethod
+    def finish(db: Session, message_id: str, finish_reason: Optional[str], characters: int):
+        generation = db.get(ChatGeneration, message_id)
+        if not generation:
+            return
+        generation.finish_reason = finish_reason
+        generation.characters = characters
+        generation.finished_at = datetime.utcnow()
+        db.commit()
+
+    @staticmethod
+    def request_cancel(db: Session, message_id: str) -> Optional[ChatGeneration]:
+        """Flag a running generation for its worker to stop; returns None if unknown"""
+        generation = db.get(ChatGeneration, message_id)
+        if generation and generation.finished_at is None and not generation.cancel_requested:
+            generation.cancel_requested = True
+            db.commit()
+        return generation
+
+    @staticmethod
+    def cancel_requested(db: Session, message_ids: List[str]) -> Set[str]:
+        """Which of these generations have been asked to stop"""
+        rows = db.query(ChatGeneration.id).filter(
+            ChatGeneration.id.in_(message_ids), ChatGeneration.cancel_requested.is_(True)
+        )
+        return {row.id for row in rows}
+
+    @staticmethod
+    def _prune(db: Session):
+        # Finished rows are kept as long as their streams stay resumable; rows a
+        # crashed worker never finished are dropped once no answer can still be running
+        now = datetime.utcnow()
+        finished_before = now - timedelta(seconds=settings.sse_stream_retention_seconds)
+        started_before = finished_before - timedelta(seconds=settings.completion_time_budget_seconds)
+        db.query(ChatGeneration).filter(
+            (ChatGeneration.finished_at < finished_before) | (ChatGeneration.created_at < started_before)
+        ).delete(synchronize_session=False)
+
+
+def _record_finished(message_id: str, finish_reason: Optional[str], characters: int):
+    db = SessionLocal()
+    try:
+        GenerationRegistry.finish(db, message_id, finish_reason, characters)
+    except Exception as e:
+        logger.warning(f"Could not record end of generation {message_id}: {e}")
+    finally:
+        db.close()
+
+
+async def record_finished(message_id: str, finish_reason: Optional[str], characters: int):
+    """Mark a generation finished, so cancels for it stop waiting"""
+    await run_in_threadpool(_record_finished, message_id, finish_reason, characters)
+
+
+def _cancelled_ids(message_ids: List[str]) -> Set[str]:
+    db = SessionLocal()
+    try:
+        return GenerationRegistry.cancel_requested(db, message_ids)
+    finally:
+        db.close()
+
+
+async def watch_cancellations():
+    """
+    Runs for the life of a worker: every generation_cancel_poll_seconds, cancel
+    the task of any local generation that another worker has flagged.
+    """
+    signalled: Set[str] = set()
+    while True:
+        await asyncio.sleep(settings.generation_cancel_poll_seconds)
+        running = {buf.id: buf for buf in get_stream_registry().active() if buf.task and not buf.task.done()}
+        signalled &= running.keys()
+        if not running:
+            continue
+        try:
+            cancelled = await run_in_threadpool(_cancelled_ids, list(running))
+        except Exception as e:
+            logger.warning(f"Could not check for cancelled generations: {e}")
+            continue
+        # Cancel each task once, so it can still save its partial answer
+        for message_id in cancelled - signalled:
+            logger.info(f"Cancelling generation {message_id} on request from another worker")
+            running[message_id].task.cancel()
+            signalled.add(message_id)
@@ -0,0 +1,108 @@
+import faiss
+import numpy as np
+from typing import Literal
+from src.settings import settings
+
+IndexType = Literal["flat", "fp16", "sq8", "pq"]
+
+# text-embedding-3-small / ada-002 output size when no `dimensions` is requested
+DEFAULT_EMBEDDING_DIM = 1536
+
+
+def embedding_dim() -> int:
+    return settings.embedding_dimensions or DEFAULT_EMBEDDING_DIM
+
+
+def index_spec(index_type: IndexType, dim: int) -> str:
+    """
+    faiss.index_factory description for an index type. Bytes per vector:
+    flat 4*dim, fp16 2*dim, sq8 dim, pq pq_m (pq_nbits=8).
+    """
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "fp16":
+        return "SQfp16"
+    if index_type == "sq8":
+        return "SQ8"
+    if index_type == "pq":
+        if dim % settings.pq_m:
+            raise ValueError(f"PQ_M={settings.pq_m} must divide the embedding dimension {dim}")
+        return f"PQ{settings.pq_m}x{settings.pq_nbits}"
+    raise ValueError(f"Unknown index type: {index_type}")
+
+
+def new_index(index_type: IndexType, dim: int) -> faiss.Index:
+    """
+    Empty index of the given type. Indexes score by inner product over
+    normalised vectors, i.e. cosine similarity (higher is more similar).
+    """
+    return faiss.index_factory(dim, index_spec(index_type, dim), faiss.METRIC_INNER_PRODUCT)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length so inner product equals cosine similarity"""
+    vectors = np.array(vectors, dtype="float32", ndmin=2)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def uses_inner_product(index: faiss.Index) -> bool:
+    """False for indexes written before the store switched from L2 distance"""
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def needs_training(index_type: IndexType) -> bool:
+    return index_type in ("sq8", "pq")
+
+
+def min_training_vectors(index_type: IndexType) -> int:
+    """Fewest vectors an index type can be trained on (PQ needs one per centroid)"""
+    return 2 ** settings.pq_nbits if index_type == "pq" else 1
+
+
+def index_type_of(index: faiss.Index) -> IndexType:
+    """Inverse of new_index for the index types we create"""
+    if isinstance(index, faiss.IndexPQ):
+        return "pq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "fp16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def build_index(index_type: IndexType, vectors: np.ndarray, max_training_vectors: int = 100_000) -> faiss.Index:
+    """Create an index of the given type, train it on (a sample of) vectors and add them all (normalised)"""
+    vectors = normalize(vectors)
+    index = new_index(index_type, vectors.shape[1])
+    if not index.is_trained:
+        if len(vectors) < min_training_vectors(index_type):
+            raise ValueError(f"{index_type} needs at least {min_training_vectors(index_type)} vectors to train, got {len(vectors)}")
+        sample = vectors
+        if len(vectors) > max_training_vectors:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), max_training_vectors, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    return index
+
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """Stored vectors as float32 (decoded, so lossy for quantised indexes)"""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def reduce_dimensions(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Shorten embeddings to `dim` by truncating and re-normalising, which is what
+    the `dimensions` parameter of text-embedding-3 models does server-side.
+    """
+    short = np.ascontiguousarray(vectors[:, :dim], dtype="float32")
+    norms = np.linalg.norm(short, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return short / norms
+
+
+def index_bytes(index: faiss.Index) -> int:
+    """Serialized size, a close proxy for the index's memory footprint"""
+    return int(faiss.serialize_index(index).size)
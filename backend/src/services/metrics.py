@@ -0,0 +1,202 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Sequence, Tuple
+from src.settings import settings
+
+# Latency buckets (seconds) covering sub-millisecond index searches up to long completions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus-style metrics registry rendered in the text exposition format.
+    When disabled, every update returns immediately so instrumentation stays in place
+    at negligible cost.
+    """
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric") -> "_Metric":
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _label_str(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        if not registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        if not registry.enabled:
+            return
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[idx] += 1
+            total[0] += value
+
+    def time(self, **labels):
+        """Context manager observing the duration of the block in seconds"""
+        if not registry.enabled:
+            return nullcontext()
+        return self._timer(labels)
+
+    @contextmanager
+    def _timer(self, labels: Dict[str, str]):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_labels = _label_str(self.labelnames, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {total[0]}")
+                lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+registry = MetricsRegistry(enabled=settings.metrics_enabled)
+
+# Stages of a chat turn: history_load, store_load, query_embedding, vector_search,
+# query_condensation, web_search, web_scoring, time_to_first_token, completion (plus pdf_extract and index_quantize on ingest)
+STAGE_SECONDS = registry.register(Histogram(
+    "rag_stage_duration_seconds", "Time spent in each stage of a chat turn", ["stage"]
+))
+EMBEDDING_REQUESTS = registry.register(Counter(
+    "embedding_requests_total", "Embedding API calls", ["operation"]
+))
+EMBEDDED_TEXTS = registry.register(Counter(
+    "embedded_texts_total", "Texts sent to the embedding API", ["operation"]
+))
+SEMANTIC_CACHE_LOOKUPS = registry.register(Counter(
+    "semantic_cache_lookups_total", "Semantic cache lookups", ["result"]
+))
+QUERY_CONDENSATIONS = registry.register(Counter(
+    "query_condensations_total", "Retrieval queries by condensation mode: standalone, condensed, cached or fallback", ["mode", "result"]
+))
+WEB_SEARCH_DECISIONS = registry.register(Counter(
+    "web_search_decisions_total", "Chat turns that did or didn't search the web, by gate rule", ["decision", "reason"]
+))
+WEB_SEARCH_SECONDS = registry.register(Counter(
+    "web_search_added_seconds_total", "Turn time spent searching and scoring web results, by gate rule", ["reason"]
+))
+WEB_SEARCHES = registry.register(Counter(
+    "web_search_requests_total", "Brave search API calls", ["outcome"]
+))
+LLM_TOKENS = registry.register(Counter(
+    "llm_tokens_total", "Chat completion tokens: input, cached_input (prompt cache hits) and output (streamed deltas when usage is unavailable)", ["direction", "deployment"]
+))
+COMPLETION_SECONDS = registry.register(Histogram(
+    "llm_completion_duration_seconds", "Chat completion latency per deployment", ["deployment", "stage"]
+))
+COMPLETION_ROUTES = registry.register(Counter(
+    "llm_routes_total", "Chat turns routed to each deployment tier", ["tier", "reason"]
+))
+COMPLETIONS_STOPPED = registry.register(Counter(
+    "llm_completions_stopped_total", "Completions ended early: cancelled, time_budget or length (max_tokens)", ["reason"]
+))
+ADMISSION_ACTIVE = registry.register(Gauge(
+    "admission_active_requests", "Requests holding an admission slot", ["lane"]
+))
+ADMISSION_QUEUED = registry.register(Gauge(
+    "admission_queue_depth", "Requests waiting for an admission slot", ["lane"]
+))
+ADMISSION_WAIT_SECONDS = registry.register(Histogram(
+    "admission_wait_seconds", "Time spent queued before admission", ["lane"]
+))
+ADMISSION_REJECTED = registry.register(Counter(
+    "admission_rejected_total", "Requests turned away: queue_full (429) or timeout (503)", ["lane", "reason"]
+))
+THUMBNAIL_CACHE = registry.register(Counter(
+    "thumbnail_cache_lookups_total", "Page thumbnail disk cache lookups", ["result"]
+))
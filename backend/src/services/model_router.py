@@ -0,0 +1,42 @@
+import re
+from dataclasses import dataclass
+from typing import Literal
+from src.settings import settings
+
+# Requests for reasoning or long-form output stay on the main deployment
+COMPLEX_QUERY = re.compile(
+    r"\b(compar(e|ison)|analy[sz](e|is)|evaluat(e|ion)|assess|recommend|strateg(y|ies)|"
+    r"explain why|step[- ]by[- ]step|pros and cons|trade-?offs?|calculat(e|ion)|"
+    r"summari[sz]e|in detail|implications?)\b",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class CompletionRoute:
+    tier: Literal["fast", "default"]
+    deployment: str
+    max_tokens: int
+    reason: str
+
+
+def _default(reason: str) -> CompletionRoute:
+    return CompletionRoute("default", settings.azure_openai_deployment, settings.completion_max_tokens, reason)
+
+
+def route_completion(query: str) -> CompletionRoute:
+    """
+    Pick the deployment for a chat turn. Short, simple questions go to the fast
+    deployment (when one is configured); long or multi-part questions and ones
+    asking for analysis stay on the main deployment.
+    """
+    if not settings.azure_openai_fast_deployment:
+        return _default("no_fast_deployment")
+    query = query.strip()
+    if len(query) > settings.routing_fast_max_chars:
+        return _default("long_query")
+    if query.count("?") > 1:
+        return _default("multi_part")
+    if COMPLEX_QUERY.search(query):
+        return _default("complex_query")
+    return CompletionRoute("fast", settings.azure_openai_fast_deployment, settings.fast_completion_max_tokens, "simple_query")
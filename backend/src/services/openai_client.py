@@ -1,12 +1,81 @@
-
-import openai
+import importlib.util
+import logging
+import httpx
 from functools import lru_cache
+from typing import TYPE_CHECKING
+from src.services.metrics import LLM_TOKENS
 from src.settings import settings
 
+if TYPE_CHECKING:
+    import openai
+
+logger = logging.getLogger(__name__)
+
+# Per-operation timeouts; the read timeout also bounds the gap between streamed chunks
+EMBEDDING_TIMEOUT = httpx.Timeout(settings.openai_embedding_timeout, connect=settings.openai_connect_timeout)
+COMPLETION_TIMEOUT = httpx.Timeout(settings.openai_completion_timeout, connect=settings.openai_connect_timeout)
+
+
+def _http_options() -> dict:
+    """Connection pool settings shared by the sync and async clients"""
+    http2 = settings.openai_http2
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("OPENAI_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+        http2 = False
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.openai_max_connections,
+            max_keepalive_connections=settings.openai_max_keepalive_connections,
+            keepalive_expiry=settings.openai_keepalive_expiry,
+        ),
+        "timeout": COMPLETION_TIMEOUT,
+        "http2": http2,
+    }
+
+
+def _client_options() -> dict:
+    return {
+        "api_key": settings.azure_openai_key,
+        "azure_endpoint": settings.azure_openai_endpoint,
+        "api_version": settings.openai_api_version,
+        "max_retries": settings.openai_max_retries,
+        "timeout": COMPLETION_TIMEOUT,
+    }
+
+
+# The openai package takes ~0.5 s to import, so it is imported when the first
+# client is built (warm-up or first use) rather than with the app.
 @lru_cache(maxsize=1)
-def get_openai():
-    """Configure the OpenAI client for Azure and return the module (acts like a singleton)."""
-    openai.api_key = settings.azure_openai_key
-    openai.azure_endpoint = settings.azure_openai_endpoint
-    openai.api_version = "2024-05-01-preview"
-    return openai
+def get_openai() -> "openai.AzureOpenAI":
+    """Shared Azure OpenAI client (acts like a singleton) reusing pooled keep-alive connections."""
+    import openai
+    return openai.AzureOpenAI(**_client_options(), http_client=httpx.Client(**_http_options()))
+
+
+@lru_cache(maxsize=1)
+def get_async_openai() -> "openai.AsyncAzureOpenAI":
+    """
+    Async counterpart of get_openai for code running on the event loop. Its pool
+    is tied to the loop that first uses it, i.e. the worker's serving loop.
+    """
+    import openai
+    return openai.AsyncAzureOpenAI(**_client_options(), http_client=httpx.AsyncClient(**_http_options()))
+
+
+def record_usage(usage, deployment: str, operation: str = "chat"):
+    """
+    Count the tokens of a completion from its usage data, including the prompt
+    tokens served from the provider's prompt cache (billed at a discount and
+    skipped when computing the first token), and log them.
+    """
+    if not usage:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    LLM_TOKENS.inc(usage.prompt_tokens, direction="input", deployment=deployment)
+    LLM_TOKENS.inc(cached, direction="cached_input", deployment=deployment)
+    LLM_TOKENS.inc(usage.completion_tokens, direction="output", deployment=deployment)
+    logger.info(
+        f"{operation} usage ({deployment}): {usage.prompt_tokens} prompt tokens, {cached} cached "
+        f"({cached / usage.prompt_tokens if usage.prompt_tokens else 0:.0%}), {usage.completion_tokens} completion tokens"
+    )
@@ -0,0 +1,161 @@
+import logging
+import os
+import struct
+import threading
+import zlib
+from functools import lru_cache
+from typing import Optional, Tuple
+from src.services.metrics import THUMBNAIL_CACHE
+from src.services.pdf_loader import load_pdf
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SUFFIX = ".png"
+
+
+@lru_cache(maxsize=32)
+def _document_pages(file_path: str, file_hash: Optional[str], extractor: str) -> Tuple[str, ...]:
+    """Page text of recently previewed documents, from load_pdf's per-file-hash cache"""
+    return tuple(load_pdf(file_path, file_hash=file_hash))
+
+
+def page_text(file_path: str, file_hash: Optional[str], page: int) -> Tuple[str, int]:
+    """Text of one page (0-based, as in source references) and the document's page count"""
+    pages = _document_pages(file_path, file_hash, settings.pdf_extractor)
+    if not 0 <= page < len(pages):
+        raise IndexError(f"Page {page} out of range (document has {len(pages)} pages)")
+    return pages[page], len(pages)
+
+
+def _pdfium():
+    try:
+        import pypdfium2
+    except ImportError as e:
+        raise RuntimeError('Page thumbnails need pypdfium2: pip install ".[pdfium]"') from e
+    return pypdfium2
+
+
+def encode_png(width: int, height: int, stride: int, channels: int, buffer: bytes) -> bytes:
+    """Minimal PNG encoder for 8-bit gray / RGB / RGBA rows, so previews don't need Pillow"""
+    row = width * channels
+    raw = b"".join(b"\x00" + buffer[y * stride:y * stride + row] for y in range(height))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    color_type = {1: 0, 3: 2, 4: 6}[channels]
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def render_thumbnail(file_path: str, page: int, width: int) -> bytes:
+    """Render one page as a PNG `width` pixels wide"""
+    pdf = _pdfium().PdfDocument(file_path)
+    try:
+        if not 0 <= page < len(pdf):
+            raise IndexError(f"Page {page} out of range (document has {len(pdf)} pages)")
+        pdf_page = pdf[page]
+        # RGB byte order, white background, no alpha
+        bitmap = pdf_page.render(scale=width / pdf_page.get_width(), rev_byteorder=True)
+        try:
+            return encode_png(bitmap.width, bitmap.height, bitmap.stride, bitmap.n_channels, bytes(bitmap.buffer))
+        finally:
+            bitmap.close()
+            pdf_page.close()
+    finally:
+        pdf.close()
+
+
+class ThumbnailCache:
+    """
+    LRU disk cache of rendered pages, keyed by file hash, page and width. A hit
+    touches the file's mtime; once the directory grows past max_bytes the least
+    recently used files are removed until it is back under 90% of the limit.
+    The size is tracked per process and re-measured on every trim, so several
+    workers sharing the directory stay close to the limit.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def path(self, file_hash: str, page: int, width: int) -> str:
+        return os.path.join(self.directory, file_hash[:2], f"{file_hash}.p{page}.w{width}{THUMBNAIL_SUFFIX}")
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(THUMBNAIL_SUFFIX):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def get(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def put(self, path: str, data: bytes):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache thumbnail {path}: {e}")
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._files())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._trim()
+
+    def _trim(self):
+        files = sorted(self._files(), key=lambda f: f[2])
+        size = sum(s for _, s, _ in files)
+        target = self.max_bytes * 0.9
+        removed = 0
+        for path, file_size, _ in files:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            removed += 1
+        self._size = size
+        logger.info(f"Thumbnail cache trimmed: removed {removed} files, {size / 2**20:.1f} MB left")
+
+    def thumbnail(self, file_path: str, file_hash: str, page: int, width: int) -> bytes:
+        path = self.path(file_hash, page, width)
+        data = self.get(path)
+        if data is not None:
+            THUMBNAIL_CACHE.inc(result="hit")
+            return data
+        THUMBNAIL_CACHE.inc(result="miss")
+        data = render_thumbnail(file_path, page, width)
+        self.put(path, data)
+        return data
+
+
+@lru_cache(maxsize=1)
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Process-wide thumbnail cache (acts like a singleton)."""
+    return ThumbnailCache(os.path.join(settings.documents_dir, "thumbnails"), settings.preview_cache_max_mb * 2**20)
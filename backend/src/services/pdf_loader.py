@@ -1,14 +1,154 @@
-
-from typing import List
-from pypdf import PdfReader
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, List, NamedTuple
+from src.services.metrics import STAGE_SECONDS
 from src.settings import settings
 
-def load_pdf(file_path: str) -> List[str]:
+logger = logging.getLogger(__name__)
+
+
+class PdfExtractor(NamedTuple):
+    page_count: Callable[[str], int]
+    # (path, first page, stop page) -> text of pages[first:stop]
+    extract_pages: Callable[[str, int, int], List[str]]
+
+
+# Extractor packages are imported on first use, keeping them out of app start-up
+def _pypdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _pypdf_extract(path: str, start: int, stop: int) -> List[str]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _pdfium():
+    try:
+        import pypdfium2
+    except ImportError as e:
+        raise RuntimeError('PDF_EXTRACTOR=pypdfium2 needs pypdfium2: pip install ".[pdfium]"') from e
+    return pypdfium2
+
+
+def _pdfium_page_count(path: str) -> int:
+    pdf = _pdfium().PdfDocument(path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _pdfium_extract(path: str, start: int, stop: int) -> List[str]:
+    pdf = _pdfium().PdfDocument(path)
+    pages = []
+    try:
+        for i in range(start, stop):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            pages.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+    return pages
+
+
+def _pdfminer_extract(path: str, start: int, stop: int) -> List[str]:
+    try:
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+    except ImportError as e:
+        raise RuntimeError('PDF_EXTRACTOR=pdfminer needs pdfminer.six: pip install ".[pdfminer]"') from e
+    return [
+        "".join(element.get_text() for element in layout if isinstance(element, LTTextContainer))
+        for layout in extract_pages(path, page_numbers=range(start, stop))
+    ]
+
+
+EXTRACTORS = {
+    "pypdf": PdfExtractor(_pypdf_page_count, _pypdf_extract),
+    "pypdfium2": PdfExtractor(_pdfium_page_count, _pdfium_extract),
+    "pdfminer": PdfExtractor(_pypdf_page_count, _pdfminer_extract),
+}
+
+
+@lru_cache(maxsize=1)
+def _extract_pool() -> ProcessPoolExecutor:
+    """
+    Process-wide pool for extracting large PDFs (acts like a singleton). Uses
+    forkserver so workers aren't forked from a process running server threads.
+    """
+    return ProcessPoolExecutor(
+        max_workers=settings.pdf_extract_workers,
+        mp_context=multiprocessing.get_context("forkserver")
+    )
+
+
+def _extract(path: str, extractor_name: str, parallel: bool) -> List[str]:
+    extractor = EXTRACTORS[extractor_name]
+    workers = settings.pdf_extract_workers if parallel else 1
+    count = extractor.page_count(path)
+    if workers <= 1 or count < settings.pdf_parallel_min_pages:
+        return extractor.extract_pages(path, 0, count)
+
+    # Contiguous page ranges, a few per worker so one slow range doesn't hold up the rest
+    step = max(1, -(-count // (workers * 4)))
+    starts = list(range(0, count, step))
+    futures = [
+        _extract_pool().submit(extractor.extract_pages, path, start, min(start + step, count))
+        for start in starts
+    ]
+    return [text for future in futures for text in future.result()]
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(file_hash: str, extractor_name: str) -> str:
+    return os.path.join(settings.documents_dir, "pages", file_hash[:2], f"{file_hash}.{extractor_name}.json")
+
+
+def load_pdf(file_path: str, file_hash: str = None, parallel: bool = True) -> List[str]:
     """
-    Extract text per page from a PDF file.
+    Extract text per page from a PDF file with the configured extractor.
+    Results are cached under DOCUMENTS_DIR keyed by the file's SHA-256, so a
+    file is parsed once however often it is re-chunked or re-ingested. Pass
+    file_hash if already known, and parallel=False when the caller is itself
+    running in a worker process.
     """
-    reader = PdfReader(file_path)
-    pages_text = [p.extract_text() or "" for p in reader.pages]
+    extractor_name = settings.pdf_extractor
+    file_hash = file_hash or file_sha256(file_path)
+    cache_path = _cache_path(file_hash, extractor_name)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)["pages"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with STAGE_SECONDS.time(stage="pdf_extract"):
+        pages_text = _extract(file_path, extractor_name, parallel)
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"extractor": extractor_name, "pages": pages_text}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not cache page text for {file_path}: {e}")
     return pages_text
 
 def chunk_text(text: str) -> List[str]:
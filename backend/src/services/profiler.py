@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = ".speedscope.json"
+INFO_SUFFIX = ".info.json"
+# Never profiled: probes, scrapes and the profile endpoints themselves
+_EXCLUDED_PATHS = ("/profiles", "/metrics", "/health", "/ready")
+# Leaf frames of a thread with nothing to do (idle pool workers, the sampler)
+_IDLE_LEAVES = {("threading.py", "wait"), ("queue.py", "get"), ("thread.py", "_worker"), ("selectors.py", "select")}
+
+FrameKey = Tuple[str, str, int]
+
+
+def profiles_dir() -> str:
+    return os.path.join(settings.logs_dir, "profiles")
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over every thread of the process: a daemon
+    thread snapshots all Python stacks (sys._current_frames) every interval.
+    Unlike a profiler bound to the calling thread it sees work handed to the
+    threadpool (sync endpoints, run_in_threadpool) and to background tasks,
+    at the price of also seeing whatever else the worker runs concurrently.
+    """
+    def __init__(self, interval: float, max_seconds: float):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.frames: Dict[FrameKey, int] = {}
+        # thread id -> (name, [(stack of frame indices, weight seconds)])
+        self.samples: Dict[int, Tuple[str, List[Tuple[Tuple[int, ...], float]]]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+        self.elapsed = 0.0
+
+    def _frame_index(self, code) -> int:
+        key = (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frames)
+        return index
+
+    def _sample(self, weight: float, names: Dict[int, str]):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            entry = self.samples.setdefault(thread_id, (names.get(thread_id, str(thread_id)), []))
+            entry[1].append((tuple(stack), weight))
+
+    def _run(self):
+        deadline = self.started_at + self.max_seconds
+        last = self.started_at
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            if now > deadline:
+                break
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            self._sample(now - last, names)
+            last = now
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def _is_idle(self, stack: Tuple[int, ...], keys: List[FrameKey]) -> bool:
+        name, filename, _ = keys[stack[-1]] if stack else ("", "", 0)
+        return (os.path.basename(filename), name.rsplit(".", 1)[-1]) in _IDLE_LEAVES
+
+    def to_speedscope(self, name: str) -> dict:
+        """
+        The samples as a speedscope file (https://www.speedscope.app), one
+        profile per thread that did any work; open it there for a flame graph.
+        """
+        keys = list(self.frames)
+        profiles = []
+        for thread_id, (thread_name, samples) in sorted(self.samples.items(), key=lambda item: item[1][0]):
+            if all(self._is_idle(stack, keys) for stack, _ in samples):
+                continue
+            weights = [round(weight * 1000, 3) for _, weight in samples]
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": [list(stack) for stack, _ in samples],
+                "weights": weights,
+            })
+        # Busiest thread first, so it is the one speedscope opens
+        profiles.sort(key=lambda profile: -sum(
+            weight for stack, weight in zip(profile["samples"], profile["weights"]) if not self._is_idle(tuple(stack), keys)
+        ))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "rag-backend",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": n, "file": f, "line": line} for n, f, line in keys]},
+            "profiles": profiles,
+        }
+
+
+def save_profile(profiler: SamplingProfiler, profile_id: str, info: dict):
+    """Write a profile and its summary, keeping only the newest profiling_max_files"""
+    directory = profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = f"{info['method']} {info['path']} {info['status']} {info['duration_ms']:.0f} ms"
+    with open(os.path.join(directory, profile_id + PROFILE_SUFFIX), "w", encoding="utf-8") as f:
+        json.dump(profiler.to_speedscope(name), f, separators=(",", ":"))
+    with open(os.path.join(directory, profile_id + INFO_SUFFIX), "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    for old in list_profiles()[settings.profiling_max_files:]:
+        for suffix in (PROFILE_SUFFIX, INFO_SUFFIX):
+            try:
+                os.remove(os.path.join(directory, old["profile_id"] + suffix))
+            except OSError:
+                pass
+
+
+def list_profiles() -> List[dict]:
+    """Summaries of the stored profiles, newest first"""
+    directory = profiles_dir()
+    try:
+        names = [n for n in os.listdir(directory) if n.endswith(INFO_SUFFIX)]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda p: p["profile_id"], reverse=True)
+    return profiles
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    path = os.path.join(profiles_dir(), os.path.basename(profile_id) + PROFILE_SUFFIX)
+    return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request when it carries the profiling header (PROFILING_HEADER,
+    whose value must equal PROFILING_TOKEN if one is set) or is picked by
+    PROFILING_SAMPLE_RATE. Profiling runs until the response body is fully
+    sent, so a streamed chat answer is covered to its last token. One request
+    per worker is profiled at a time; the profile id is returned in the
+    X-Profile-Id response header.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.profiling_header.lower().encode("latin-1")
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope) -> bool:
+        if scope["path"].startswith(_EXCLUDED_PATHS):
+            return False
+        value = dict(scope["headers"]).get(self.header)
+        if value is not None:
+            token = settings.profiling_token
+            return value.decode("latin-1") == token if token else value not in (b"", b"0", b"false")
+        return settings.profiling_sample_rate > 0 and random.random() < settings.profiling_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        # Sortable by time; the random part keeps workers from colliding
+        profile_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        status = 0
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        profiler = SamplingProfiler(settings.profiling_interval_ms / 1000, settings.profiling_max_seconds)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            self._busy.release()
+            info = {
+                "profile_id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round(profiler.elapsed * 1000, 1),
+                "samples": sum(len(samples) for _, samples in profiler.samples.values()),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
+            try:
+                await run_in_threadpool(save_profile, profiler, profile_id, info)
+                logger.info(f"Profiled {info['method']} {info['path']} ({info['duration_ms']:.0f} ms): {profile_id}")
+            except OSError as e:
+                logger.warning(f"Could not save profile {profile_id}: {e}")
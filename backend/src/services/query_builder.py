@@ -0,0 +1,168 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Tuple
+import httpx
+from src.services.metrics import QUERY_CONDENSATIONS, STAGE_SECONDS
+from src.services.openai_client import get_openai, record_usage
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Messages that lean on the conversation for their meaning: continuations
+# ("and for 2023?") or a pronoun as the first word ("it says what about fees?")
+FOLLOW_UP = re.compile(
+    r"^\s*(and|but|also|so|then|ok(ay)?|what about|how about|what if|same for|why( not)?|how come|"
+    r"it|its|this|that|these|those|they|them|their|there)\b",
+    re.IGNORECASE,
+)
+# Pronouns and bare references to parts of a document ("is it renewable?",
+# "what does section 3 say?"). Only short messages count: longer ones that use
+# them usually name their own subject ("Who signed the Globex agreement and when
+# did it start?").
+REFERENCE = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|he|she|his|her|above|previous|earlier|former|latter|"
+    r"same|there|the (first|second|last|other) one)\b|"
+    r"\b(section|chapter|page|part|table|figure|step|point|item)\s+[\w.]+",
+    re.IGNORECASE,
+)
+REFERENCE_MAX_WORDS = 8
+_WORDS = re.compile(r"\w+")
+_QUESTIONS = re.compile(r"[^?]+\?")
+_LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+_CONDENSE_PROMPT = (
+    "You write search queries for a document retrieval system. Given a conversation "
+    "and the user's latest message, rewrite the latest message as one standalone search "
+    "query that can be understood without the conversation: resolve pronouns and "
+    "references, keep names, numbers and terms exactly as written. If the message asks "
+    "about several distinct things, add up to {extra} more focused queries, one per line. "
+    "Output only the queries, one per line, most important first, with no numbering."
+)
+
+
+@dataclass
+class RetrievalQuery:
+    """What to search for on a chat turn; queries[0] is the standalone query"""
+    message: str
+    queries: List[str] = field(default_factory=list)
+    mode: str = "off"
+
+    @property
+    def standalone(self) -> str:
+        return self.queries[0]
+
+    @property
+    def condensed(self) -> bool:
+        return self.queries != [self.message]
+
+    @property
+    def web_query(self) -> str:
+        """
+        What to search the web for: the model's rewrite when there is one, else
+        the message itself (the heuristic's joined questions search poorly)
+        """
+        return self.standalone if self.mode == "llm" and self.condensed else self.message
+
+
+def is_follow_up(message: str) -> bool:
+    """Whether a message probably needs earlier turns to be understood"""
+    words = len(_WORDS.findall(message))
+    if words <= 3 or FOLLOW_UP.search(message):
+        return True
+    return words <= REFERENCE_MAX_WORDS and bool(REFERENCE.search(message))
+
+
+def _dedupe(queries: List[str]) -> List[str]:
+    seen, unique = set(), []
+    for query in queries:
+        key = " ".join(query.lower().split())
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(query)
+    return unique[:max(1, settings.query_max_subqueries)]
+
+
+def _heuristic(message: str, earlier_questions: List[str]) -> List[str]:
+    """
+    Prefix a follow-up with the earlier questions it continues (back to the
+    last self-contained one), and search each part of a multi-part question.
+    The raw message is kept as a sub-query in case the topic changed.
+    """
+    context = []
+    for question in reversed(earlier_questions):
+        context.insert(0, question)
+        if not is_follow_up(question):
+            break
+    standalone = " ".join(context + [message]) if context else message
+    parts = [part.strip() for part in _QUESTIONS.findall(message)]
+    if len(parts) < 2:
+        parts = []
+    return _dedupe([standalone] + [" ".join(context + [part]) for part in parts] + [message])
+
+
+@lru_cache(maxsize=settings.query_condensation_cache_size)
+def _condense_with_model(turns: Tuple[Tuple[str, str], ...], message: str) -> Tuple[str, ...]:
+    """
+    Standalone query plus sub-queries from a small model call. Cached on the
+    exact turns, so regenerating or re-attaching to a turn doesn't call again.
+    """
+    deployment = settings.query_condensation_deployment or settings.azure_openai_fast_deployment or settings.azure_openai_deployment
+    transcript = "\n".join(f"{role}: {content}" for role, content in turns)
+    response = get_openai().chat.completions.create(
+        model=deployment,
+        temperature=0,
+        max_tokens=120,
+        messages=[
+            {"role": "system", "content": _CONDENSE_PROMPT.format(extra=max(0, settings.query_max_subqueries - 1))},
+            {"role": "user", "content": f"Conversation:\n{transcript}\n\nLatest message: {message}"},
+        ],
+        timeout=httpx.Timeout(settings.query_condensation_timeout_seconds, connect=settings.openai_connect_timeout),
+    )
+    record_usage(response.usage, deployment, operation="query condensation")
+    lines = (response.choices[0].message.content or "").splitlines()
+    return tuple(_LIST_MARKER.sub("", line).strip() for line in lines if line.strip())
+
+
+def build_retrieval_query(messages: List[dict]) -> RetrievalQuery:
+    """
+    Turn the last user message into the queries to retrieve with.
+
+    A message that stands on its own, or the first one of a conversation, is
+    used as is. A follow-up ("what about section 3?") is condensed with the
+    turns before it, either locally (QUERY_CONDENSATION=heuristic) or by a small
+    model call (llm, cached, falling back to the heuristic on errors) into a
+    standalone query, optionally with sub-queries for multi-part questions.
+    """
+    last_index = next((i for i in range(len(messages) - 1, -1, -1) if messages[i]["role"] == "user"), None)
+    if last_index is None:
+        return RetrievalQuery(message="", queries=[""])
+    message = messages[last_index]["content"].strip()
+    mode = settings.query_condensation
+    earlier = [m for m in messages[:last_index] if m["role"] in ("user", "assistant")]
+    earlier = earlier[-settings.query_condensation_history_turns:] if settings.query_condensation_history_turns > 0 else []
+    needs_context = bool(earlier) and is_follow_up(message)
+    multi_part = len(_QUESTIONS.findall(message)) > 1
+    if mode == "off" or not (needs_context or multi_part):
+        QUERY_CONDENSATIONS.inc(mode=mode, result="standalone")
+        return RetrievalQuery(message=message, queries=[message], mode=mode)
+
+    earlier_questions = [m["content"].strip() for m in earlier if m["role"] == "user"] if needs_context else []
+    if mode == "llm":
+        # Long answers add little for rewriting and would make every call expensive
+        turns = tuple((m["role"], m["content"].strip()[:500]) for m in earlier)
+        cached = _condense_with_model.cache_info().hits
+        try:
+            with STAGE_SECONDS.time(stage="query_condensation"):
+                queries = _dedupe(list(_condense_with_model(turns, message)))
+            if queries:
+                result = "cached" if _condense_with_model.cache_info().hits > cached else "condensed"
+                QUERY_CONDENSATIONS.inc(mode=mode, result=result)
+                return RetrievalQuery(message=message, queries=queries, mode=mode)
+        except Exception as e:
+            logger.warning(f"Query condensation failed, using the heuristic: {e}")
+        QUERY_CONDENSATIONS.inc(mode=mode, result="fallback")
+
+    QUERY_CONDENSATIONS.inc(mode="heuristic", result="condensed")
+    return RetrievalQuery(message=message, queries=_heuristic(message, earlier_questions), mode="heuristic")
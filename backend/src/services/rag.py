@@ -1,21 +1,65 @@
-from src.services.vector_store import VectorStore
 from src.models.chat import SourceReference
 from src.services.web_search import BraveSearchService, SearchResult
-from typing import List, Tuple
+from src.services.query_builder import build_retrieval_query
+from src.services.web_search_gate import get_web_search_gate
+from src.services.metrics import STAGE_SECONDS
+from src.settings import settings
+from typing import Callable, List, Tuple
+import time
+import numpy as np
+
+# Identical on every turn of every conversation. Azure OpenAI caches prompt
+# prefixes (1024+ tokens, in 128-token steps), so nothing that changes per
+# turn may appear before or inside it.
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. "
+    "You have access to web search functionality through an external API. "
+    "When users ask questions that require current information or web searches, "
+    "you should use the available search tools rather than saying you cannot search the web. "
+    "Before the user's latest message you may be given context from uploaded documents "
+    "and recent web search results; use it to answer that message. "
+    "When referencing information, please indicate whether it comes from "
+    "uploaded documents or web sources."
+)
+
+
+def layout_prompt(messages: list[dict], context_text: str = "", has_web: bool = False) -> list[dict]:
+    """
+    Order the prompt for provider-side prompt caching: the static instructions
+    and the earlier turns (append-only, so byte-identical to the previous
+    turn's prompt) form a stable prefix, and this turn's retrieved context is
+    placed just before the latest user message instead of at the top.
+    """
+    last_user = max((i for i, m in enumerate(messages) if m["role"] == "user"), default=len(messages))
+    prompt = [{"role": "system", "content": SYSTEM_PROMPT}] + messages[:last_user]
+    if context_text:
+        sources = "uploaded documents and recent web search results" if has_web else "uploaded documents"
+        prompt.append({"role": "system", "content": f"Context for the next message, from {sources}:\n\n{context_text}"})
+    return prompt + messages[last_user:]
 
 
 class RAGEngine:
     def __init__(self):
-        self.store = VectorStore()
+        # Imported here so importing the app doesn't load FAISS; the store itself is built at warm-up
+        from src.services.vector_store import get_vector_store
+        self.store = get_vector_store()
         self.last_used_sources: List[SourceReference] = []
         self.search_service = BraveSearchService()
+        self.web_search_gate = get_web_search_gate()
 
-    def augment_messages(self, messages: list[dict], include_web_search:bool=True) -> list[dict]:
+    def augment_messages(self, messages: list[dict], include_web_search:bool=True, query_embedding: np.ndarray=None,
+                         on_progress: Callable[[str, dict], None]=None) -> list[dict]:
         """
         Given chat history, pull relevant context for the last user message
-        and prepend a system message with the context.
+        and lay out the prompt with it (see layout_prompt).
         Also tracks the sources used for later reference.
+        Follow-ups are condensed with earlier turns into a standalone query
+        (and sub-queries for multi-part questions, see query_builder).
+        A precomputed query_embedding for the last user message can be passed
+        to avoid embedding it twice. If given, on_progress(stage, data) is called
+        as each retrieval stage (vector_search, web_search) progresses.
         """
+        report = on_progress or (lambda stage, data: None)
         # Clear previous sources
         self.last_used_sources = []
         
@@ -24,13 +68,28 @@ class RAGEngine:
         if not last_user:
             return messages
         
-        user_query = last_user["content"].strip()
-        
-        docs = self.store.similarity_search(user_query, k=4)
+        retrieval = build_retrieval_query(messages)
+        user_query = retrieval.message
+        if query_embedding is None or retrieval.condensed:
+            # All queries in one embedding request
+            query_embeddings = self.store.embed_queries(retrieval.queries)
+        else:
+            query_embeddings = query_embedding
+        # Web results are searched for and scored against retrieval.web_query
+        web_query = retrieval.web_query
+        if web_query in retrieval.queries:
+            query_embedding = query_embeddings[retrieval.queries.index(web_query)][None, :]
+        else:
+            query_embedding = None
+
+        docs = self._retrieve_merged(retrieval.queries, query_embeddings)
+        # Chunks below the relevance threshold would only cost prompt tokens
+        relevant_docs = [doc for doc in docs if doc[2] >= settings.retrieval_min_score]
+        report("vector_search", {"state": "done", "results": len(relevant_docs)})
         context_snippets = []
         
         # Process retrieved documents and track sources
-        for text, metadata, distance in docs:
+        for text, metadata, score in relevant_docs:
             context_snippets.append(text)
             
             # Create source reference
@@ -38,30 +97,45 @@ class RAGEngine:
                 document_id=metadata.get("document_id", "unknown"),
                 filename=metadata.get("filename", "unknown.pdf"),
                 page=metadata.get("page", 0),
-                relevance_score=float(distance)
+                relevance_score=score
             )
             self.last_used_sources.append(source)
 
-        # first condition is whether web search is enabled. second condition is subjective based on query.
-        search_web = include_web_search and self._should_search_web(user_query, docs)
+        # first condition is whether web search is enabled. second is the gate's call on this query.
+        decision = self.web_search_gate.decide(user_query, docs) if include_web_search else None
 
         # Add web search if needed
-        if search_web:
-            web_results = self.search_service.search(user_query, count=3)
-            web_context = self._format_web_results(web_results)
+        web_context = ""
+        if decision and decision.search:
+            report("web_search", {"state": "started"})
+            web_started = time.perf_counter()
+            web_results = self.search_service.search(web_query, count=3)
+            fetched = len(web_results)
+            if query_embedding is None:
+                query_embedding = self.store.embed_query(web_query)
+
+            # Score web results on the same scale as documents and keep the relevant ones
+            with STAGE_SECONDS.time(stage="web_scoring"):
+                scores = self.store.score_texts(
+                    query_embedding, [f"{result.title}\n{result.description}" for result in web_results]
+                )
+            web_results = [
+                (result, score) for result, score in zip(web_results, scores)
+                if score >= settings.retrieval_min_score
+            ]
+            report("web_search", {"state": "done", "results": len(web_results)})
+            self.web_search_gate.record(user_query, decision, time.perf_counter() - web_started, fetched, len(web_results))
+            web_context = self._format_web_results([result for result, _ in web_results])
             if web_context:
                 context_snippets.append(f"Recent Web Information:\n{web_context}")
                 
                 # Track web sources
-                for result in web_results:
-                    web_content = result.title + result.description
-                    relevance_score = self.store.compute_text_similarity(user_query, web_content)
-
+                for result, score in web_results:
                     web_source = SourceReference(
                         document_id=f"web_{result.url}",
                         filename=result.title,
                         page=0,
-                        relevance_score=relevance_score + 1,  # Ensure web sources have higher relevance. This is a temporary hack.
+                        relevance_score=score,
                         url=result.url,
                         source_type="web",
                         domain=result.domain,
@@ -69,58 +143,45 @@ class RAGEngine:
                         published_date=result.published_date
                     )
                     self.last_used_sources.append(web_source)
-        
-        if not context_snippets:
-            return messages
+        elif decision:
+            self.web_search_gate.record(user_query, decision)
         
         context_text = "\n---\n".join(context_snippets)
-        sys_prompt = {
-            "role": "system",
-            "content": (
-                "You are a helpful assistant. "
-                "You have access to web search functionality through an external API. "
-                "When users ask questions that require current information or web searches, "
-                "you should use the available search tools rather than saying you cannot search the web."
-                "Use the following context to answer the user's question. "
-                "The context is from uploaded documents.\n\n"
-                + (" and recent web search results" if search_web else "") + ".\n\n"
-                f"Context:\n{context_text}\n\n"
-                "When referencing information, please indicate whether it comes from "
-                "uploaded documents or web sources."
+        return layout_prompt(messages, context_text, bool(web_context))
+
+    def _retrieve(self, query: str, query_embedding: np.ndarray=None) -> List[Tuple[str, dict, float]]:
+        """Fetch document chunks for the query using the configured retrieval mode"""
+        if settings.retrieval_mode == "mmr":
+            return self.store.max_marginal_relevance_search(
+                query,
+                k=settings.mmr_k,
+                fetch_k=settings.retrieval_fetch_k,
+                lambda_mult=settings.mmr_lambda,
+                query_embedding=query_embedding
             )
-        }
-        return [sys_prompt] + messages
+        return self.store.similarity_search(query, k=settings.retrieval_k, query_embedding=query_embedding)
 
-    def _should_search_web(self, query: str, existing_docs: List[Tuple]=None) -> bool:
+    def _retrieve_merged(self, queries: List[str], query_embeddings: np.ndarray) -> List[Tuple[str, dict, float]]:
         """
-        Decide whether to include web search based on query and existing results. 
-        There are three main conditions:
-        1. Query contains temporal keywords indicating need for recent information.
-        2. Existing document results are insufficient (e.g., low confidence).
-        3. Query relates to topics that typically require web search.
+        Retrieve for each query and merge the results: a chunk found by several
+        queries keeps its best score, and the top retrieval_k (mmr_k in mmr
+        mode) overall are kept.
         """
-        # Check for temporal keywords indicating need for recent info
-        temporal_keywords = [
-            'latest', 'recent', 'current', 'today', 'now', 'this year', 
-            '2024', '2025', 'update', 'new', 'breaking', 'recently'
-        ]
-        
-        has_temporal = any(keyword in query.lower() for keyword in temporal_keywords)
-        
-        # Check if existing document results seem insufficient
-        low_document_confidence = not existing_docs or (
-            len(existing_docs) > 0 and 
-            all(distance > 0.8 for _, _, distance in existing_docs)  # High distance = low similarity
-        )
-        
-        # Check for topics that typically need web search
-        web_topics = [
-            'news', 'weather', 'stock', 'price', 'market', 'election', 
-            'policy', 'law', 'AI', 'web', 'internet'
-        ]
-        has_web_topic = any(topic in query.lower() for topic in web_topics)
-        
-        return has_temporal or low_document_confidence or has_web_topic
+        if len(queries) == 1:
+            return self._retrieve(queries[0], query_embeddings[:1])
+        if settings.retrieval_mode == "mmr":
+            per_query = [self._retrieve(query, embedding[None, :]) for query, embedding in zip(queries, query_embeddings)]
+        else:
+            # One index.search over all sub-queries
+            per_query = self.store.batch_similarity_search(queries, k=settings.retrieval_k, query_embeddings=query_embeddings)
+        best = {}
+        for results in per_query:
+            for text, metadata, score in results:
+                key = (metadata.get("document_id"), metadata.get("page"), text)
+                if key not in best or score > best[key][2]:
+                    best[key] = (text, metadata, score)
+        k = settings.mmr_k if settings.retrieval_mode == "mmr" else settings.retrieval_k
+        return sorted(best.values(), key=lambda doc: doc[2], reverse=True)[:k]
 
     def _format_web_results(self, results: List[SearchResult]) -> str:
         """Format web search results for context inclusion"""
@@ -144,8 +205,8 @@ class RAGEngine:
         return self.augment_messages(messages, include_web_search=False)
 
     def get_last_sources(self) -> List[SourceReference]:
-        """Return the sources used in the last augment_messages call"""
-        lus = self.last_used_sources.copy()
+        """Return the most relevant sources used in the last augment_messages call"""
+        lus = [s for s in self.last_used_sources if s.relevance_score >= settings.retrieval_min_score]
         lus.sort(key=lambda x: x.relevance_score, reverse=True)
         lus = lus[:4]
         return lus
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr_select(query_vec: np.ndarray, candidate_vecs: np.ndarray, k: int, lambda_mult: float = 0.7) -> list[int]:
+    """
+    Maximal Marginal Relevance selection over a candidate set.
+
+    Greedily picks the candidate that maximises
+    lambda * sim(query, c) - (1 - lambda) * max(sim(c, already_selected)),
+    using cosine similarity. All similarities are computed up front with two
+    matrix products, so the loop itself is O(k * n).
+
+    Returns the indices of the selected candidates, best first.
+    """
+    n = len(candidate_vecs)
+    if n == 0 or k <= 0:
+        return []
+
+    query = _normalize(np.asarray(query_vec, dtype="float32").reshape(1, -1))
+    cands = _normalize(np.asarray(candidate_vecs, dtype="float32"))
+
+    query_sim = (cands @ query.T).ravel()
+    pair_sim = cands @ cands.T
+
+    selected = [int(np.argmax(query_sim))]
+    # Highest similarity of each candidate to anything already selected
+    redundancy = pair_sim[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, n):
+        scores = lambda_mult * query_sim - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pair_sim[best], out=redundancy)
+
+    return selected
@@ -0,0 +1,112 @@
+import threading
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+import numpy as np
+from src.models.chat import SourceReference
+from src.services.metrics import SEMANTIC_CACHE_LOOKUPS
+from src.services.store_generation import store_generation
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    sources: List[SourceReference]
+
+
+class SemanticCache:
+    """
+    In-memory cache of answers keyed on the query embedding.
+
+    A lookup is a hit when the cosine similarity between the new query and a
+    cached query is at least `threshold`. Entries belong to the vector store
+    generation their context was retrieved from: any store write (upload,
+    delete, import, bulk ingest, index migration) by any process bumps the
+    generation, and the next lookup in every worker drops all older entries,
+    including answers that cite none of the changed documents.
+    Entries are evicted oldest-first once `max_entries` is reached.
+
+    The cache lives in the worker process; with several workers each keeps its own.
+    """
+    def __init__(self, threshold: float, max_entries: int):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries: List[CachedAnswer] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._generation = store_generation()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vec = np.asarray(embedding, dtype="float32").reshape(-1)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _sync_generation(self, generation: int):
+        """Drop every entry if the store changed since they were cached (lock held)"""
+        if generation == self._generation:
+            return
+        if self._entries:
+            logger.info(f"Semantic cache: vector store changed, dropped {len(self._entries)} entries")
+        self._entries = []
+        self._vectors = None
+        self._generation = generation
+
+    def lookup(self, embedding: np.ndarray) -> Optional[CachedAnswer]:
+        """Return the closest cached answer above the similarity threshold, if any"""
+        query = self._normalize(embedding)
+        generation = store_generation()
+        with self._lock:
+            self._sync_generation(generation)
+            if not self._entries:
+                SEMANTIC_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            sims = self._vectors @ query
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                SEMANTIC_CACHE_LOOKUPS.inc(result="miss")
+                return None
+            SEMANTIC_CACHE_LOOKUPS.inc(result="hit")
+            return self._entries[best]
+
+    def store(self, query: str, embedding: np.ndarray, answer: str, sources: List[SourceReference], generation: int):
+        """
+        Add an answer to the cache. `generation` is the store generation read
+        before retrieval; if the store has changed since, the answer may cite
+        removed content and is not cached.
+        """
+        vec = self._normalize(embedding).reshape(1, -1)
+        entry = CachedAnswer(query=query, answer=answer, sources=list(sources))
+        current = store_generation()
+        with self._lock:
+            self._sync_generation(current)
+            if generation != current:
+                return
+            self._entries.append(entry)
+            self._vectors = vec if self._vectors is None else np.vstack([self._vectors, vec])
+            overflow = len(self._entries) - self.max_entries
+            if overflow > 0:
+                self._entries = self._entries[overflow:]
+                self._vectors = self._vectors[overflow:]
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._vectors = None
+
+
+@lru_cache(maxsize=1)
+def get_semantic_cache() -> SemanticCache:
+    """Process-wide semantic cache (acts like a singleton)."""
+    return SemanticCache(
+        threshold=settings.semantic_cache_threshold,
+        max_entries=settings.semantic_cache_max_entries
+    )
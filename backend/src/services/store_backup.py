@@ -0,0 +1,332 @@
+"""
+Snapshots and streaming export/import of the vector store.
+
+Saves replace faiss.index and metadata.json atomically (os.replace), so hard
+links taken while holding the writers' lock are a consistent point-in-time
+copy that costs no I/O. Searches never take that lock, and writers wait only
+for the links to be made. Export and import work in batches: vectors are read
+from a memory-mapped index and metadata is parsed one record at a time, so
+neither side holds the whole corpus in memory.
+
+Export formats, chosen by the destination name:
+- *.parquet: one row per chunk with `vector` (fixed-size float32 list) and
+  `metadata` (JSON string) columns; needs pyarrow (pip install ".[export]")
+- anything else: a directory with vectors.f32 (raw little-endian float32,
+  row-major), metadata.jsonl and manifest.json
+"""
+import fcntl
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator
+
+import faiss
+import numpy as np
+
+from src.services.index_factory import IndexType, embedding_dim, index_type_of, needs_training, new_index, normalize
+from src.services.store_generation import bump_store_generation
+from src.settings import settings
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.f32"
+METADATA_LINES_FILE = "metadata.jsonl"
+
+Batch = tuple[np.ndarray, list[dict]]
+
+
+def _store_files(root: str) -> tuple[str, str]:
+    return os.path.join(root, settings.faiss_index_file), os.path.join(root, settings.metadata_file)
+
+
+@contextmanager
+def writer_lock():
+    """The lock VectorStore.write_lock takes across processes; holds off uploads and deletes"""
+    os.makedirs(settings.vector_store_path, exist_ok=True)
+    with open(os.path.join(settings.vector_store_path, ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _capture(dest: str):
+    """Point-in-time copy of the live index and metadata into dest"""
+    index_path, meta_path = _store_files(settings.vector_store_path)
+    if not os.path.exists(index_path) or not os.path.exists(meta_path):
+        raise FileNotFoundError(f"No vector store at {settings.vector_store_path}")
+    with writer_lock():
+        for src, dst in zip((index_path, meta_path), _store_files(dest)):
+            _link_or_copy(src, dst)
+
+
+def read_index_mmap(path: str) -> faiss.Index:
+    """Memory-map the index where faiss supports it, so reading it doesn't load every vector"""
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def iter_metadata(path: str, read_chars: int = 1 << 20) -> Iterator[dict]:
+    """Yield the records of a metadata.json array one at a time without loading the file"""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(read_chars).lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path} is not a JSON array")
+        pos = 1
+        while True:
+            pos = _SEPARATORS.match(buf, pos).end()
+            if buf.startswith("]", pos):
+                return
+            if pos < len(buf):
+                try:
+                    record, pos = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    pass  # record continues past the buffer
+                else:
+                    yield record
+                    continue
+            more = f.read(read_chars)
+            if not more:
+                raise ValueError(f"{path} ends mid-record")
+            buf, pos = buf[pos:] + more, 0
+
+
+def iter_store_batches(root: str, batch_size: int) -> Iterator[Batch]:
+    """(vectors, metadata) batches from a store directory (live, snapshot or staging)"""
+    index_path, meta_path = _store_files(root)
+    index = read_index_mmap(index_path)
+    records = iter_metadata(meta_path)
+    for start in range(0, index.ntotal, batch_size):
+        n = min(batch_size, index.ntotal - start)
+        metas = [record for _, record in zip(range(n), records)]
+        if len(metas) != n:
+            raise ValueError(f"{meta_path} has fewer records than the index ({index.ntotal} vectors)")
+        yield index.reconstruct_n(start, n), metas
+
+
+def _describe(index: faiss.Index) -> dict:
+    return {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "count": int(index.ntotal),
+        "dimensions": int(index.d),
+        "index_type": index_type_of(index),
+        "embedding_deployment": settings.azure_openai_embedding_deployment,
+    }
+
+
+# --------------------
+# Snapshots
+# --------------------
+def snapshot(dest: str) -> dict:
+    """
+    Consistent copy of the live store into the (new) directory dest. Hard links
+    are used where dest shares a filesystem with the store, so this is near
+    instant regardless of corpus size.
+    """
+    if os.path.exists(dest) and os.listdir(dest):
+        raise FileExistsError(f"{dest} is not empty")
+    os.makedirs(dest, exist_ok=True)
+    start = time.perf_counter()
+    staging = tempfile.mkdtemp(prefix=".snapshot-", dir=settings.vector_store_path)
+    try:
+        _capture(staging)
+        # Moving out of the lock: a rename on the same filesystem, a copy otherwise
+        for src, dst in zip(_store_files(staging), _store_files(dest)):
+            shutil.move(src, dst)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    index_path, _ = _store_files(dest)
+    manifest = _describe(read_index_mmap(index_path))
+    manifest["seconds"] = round(time.perf_counter() - start, 3)
+    with open(os.path.join(dest, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# --------------------
+# Export formats
+# --------------------
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError('Parquet export needs pyarrow: pip install ".[export]"') from e
+    return pa, pq
+
+
+def _is_parquet(path: str) -> bool:
+    return path.endswith(".parquet")
+
+
+class _ParquetWriter:
+    def __init__(self, path: str, manifest: dict):
+        self.pa, pq = _pyarrow()
+        self.dim = manifest["dimensions"]
+        self.schema = self.pa.schema(
+            [("vector", self.pa.list_(self.pa.float32(), self.dim)), ("metadata", self.pa.string())],
+            metadata={"vector_store": json.dumps(manifest)}
+        )
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    def write(self, vectors: np.ndarray, metas: list[dict]):
+        flat = self.pa.array(np.ascontiguousarray(vectors, dtype="float32").reshape(-1))
+        columns = [
+            self.pa.FixedSizeListArray.from_arrays(flat, self.dim),
+            self.pa.array([json.dumps(m, ensure_ascii=False) for m in metas], self.pa.string()),
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class _DirectoryWriter:
+    def __init__(self, path: str, manifest: dict):
+        if os.path.exists(path) and os.listdir(path):
+            raise FileExistsError(f"{path} is not empty")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.manifest = manifest
+        self.vectors = open(os.path.join(path, VECTORS_FILE), "wb")
+        self.metadata = open(os.path.join(path, METADATA_LINES_FILE), "w", encoding="utf-8")
+
+    def write(self, vectors: np.ndarray, metas: list[dict]):
+        self.vectors.write(np.ascontiguousarray(vectors, dtype="<f4").tobytes())
+        for m in metas:
+            self.metadata.write(json.dumps(m, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.vectors.close()
+        self.metadata.close()
+        with open(os.path.join(self.path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+
+
+def _read_manifest(path: str) -> dict:
+    """Manifest of an export (count and dimensions are all import relies on)"""
+    if _is_parquet(path):
+        _, pq = _pyarrow()
+        schema = pq.read_schema(path)
+        return json.loads(schema.metadata[b"vector_store"])
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _iter_export(path: str, batch_size: int) -> Iterator[Batch]:
+    manifest = _read_manifest(path)
+    dim = manifest["dimensions"]
+    if not manifest["count"]:
+        return
+    if _is_parquet(path):
+        _, pq = _pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            vectors = batch.column("vector").flatten().to_numpy().reshape(-1, dim)
+            yield vectors, [json.loads(m) for m in batch.column("metadata").to_pylist()]
+        return
+
+    vectors = np.memmap(os.path.join(path, VECTORS_FILE), dtype="<f4", mode="r").reshape(-1, dim)
+    with open(os.path.join(path, METADATA_LINES_FILE), "r", encoding="utf-8") as f:
+        for start in range(0, len(vectors), batch_size):
+            metas = [json.loads(line) for _, line in zip(range(batch_size), f)]
+            yield np.array(vectors[start:start + len(metas)]), metas
+
+
+# --------------------
+# Export / import
+# --------------------
+def export_store(dest: str, batch_size: int = 10_000) -> dict:
+    """Stream a consistent copy of the live store to dest (see module docstring for formats)"""
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix=".export-", dir=settings.vector_store_path) as staging:
+        _capture(staging)
+        index_path, _ = _store_files(staging)
+        manifest = _describe(read_index_mmap(index_path))
+        writer = _ParquetWriter(dest, manifest) if _is_parquet(dest) else _DirectoryWriter(dest, manifest)
+        try:
+            for vectors, metas in iter_store_batches(staging, batch_size):
+                writer.write(vectors, metas)
+        finally:
+            writer.close()
+    manifest["seconds"] = round(time.perf_counter() - start, 3)
+    return manifest
+
+
+def _training_sample(path: str, count: int, batch_size: int, max_training_vectors: int = 100_000) -> np.ndarray:
+    """Evenly spaced rows across the whole export, so training isn't biased to the first documents"""
+    step = max(1, -(-count // max_training_vectors))
+    sample, offset = [], 0
+    for vectors, _ in _iter_export(path, batch_size):
+        sample.append(vectors[(-offset) % step::step])
+        offset += len(vectors)
+    return normalize(np.vstack(sample))
+
+
+def import_store(src: str, index_type: IndexType | None = None, batch_size: int = 10_000) -> dict:
+    """
+    Replace the live store with an export, streaming it into a new index. The
+    current files are kept with a .bak suffix, and running workers reload on
+    their next request. Trained index types stay flat below
+    QUANTIZATION_MIN_VECTORS, as they do for a growing store.
+    """
+    start = time.perf_counter()
+    manifest = _read_manifest(src)
+    dim, count = manifest["dimensions"], manifest["count"]
+    if dim != embedding_dim():
+        raise ValueError(
+            f"Export has {dim}-dimensional vectors but EMBEDDING_DIMENSIONS implies {embedding_dim()}"
+        )
+    index_type = index_type or settings.vector_index_type
+    if needs_training(index_type) and count < settings.quantization_min_vectors:
+        index_type = "flat"
+
+    index = new_index(index_type, dim)
+    if not index.is_trained:
+        index.train(_training_sample(src, count, batch_size))
+
+    index_path, meta_path = _store_files(settings.vector_store_path)
+    os.makedirs(settings.vector_store_path, exist_ok=True)
+    imported = 0
+    with open(meta_path + ".import", "w", encoding="utf-8") as f:
+        f.write("[")
+        for vectors, metas in _iter_export(src, batch_size):
+            index.add(normalize(vectors))
+            for m in metas:
+                f.write(("\n" if not imported else ",\n") + json.dumps(m, ensure_ascii=False))
+                imported += 1
+        f.write("\n]\n")
+    if imported != index.ntotal:
+        os.remove(meta_path + ".import")
+        raise ValueError(f"Export has {index.ntotal} vectors but {imported} metadata records")
+    faiss.write_index(index, index_path + ".import")
+
+    with writer_lock():
+        for path in (index_path, meta_path):
+            if os.path.exists(path):
+                shutil.copy2(path, path + ".bak")
+        # Metadata last: its mtime is what workers watch for a completed save
+        os.replace(index_path + ".import", index_path)
+        os.replace(meta_path + ".import", meta_path)
+        bump_store_generation()
+
+    result = _describe(index)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
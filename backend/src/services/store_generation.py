@@ -0,0 +1,36 @@
+import os
+from src.settings import settings
+
+GENERATION_FILE = "generation"
+
+
+def _generation_path() -> str:
+    return os.path.join(settings.vector_store_path, GENERATION_FILE)
+
+
+def store_generation() -> int:
+    """
+    Version of the vector store files, shared by every process using the store
+    directory. Anything derived from the store's contents (e.g. cached answers)
+    is valid only while this is unchanged.
+    """
+    try:
+        with open(_generation_path(), "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_store_generation() -> int:
+    """
+    Advance the generation. Writers call this after replacing the store files
+    (while holding the store's writer lock), so nothing computed from the old
+    contents can be recorded under the new generation.
+    """
+    generation = store_generation() + 1
+    path = _generation_path()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(generation))
+    os.replace(tmp_path, path)
+    return generation
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional
+from src.settings import settings
+
+KEEPALIVE_COMMENT = ": keep-alive\n\n"
+
+
+def format_sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """
+    Encode one SSE frame. The payload is JSON, so newlines and other control
+    characters in model output can never break the `data:` framing.
+    """
+    frame = f"id: {event_id}\n" if event_id is not None else ""
+    frame += f"event: {event}\n"
+    frame += f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return frame
+
+
+class StreamBuffer:
+    """
+    Accumulates one assistant response as it is generated so that any number of
+    readers can follow it, starting from any character offset.
+
+    Only the last `max_chars` characters are kept in memory; `base_offset` is the
+    offset of the first buffered character within the full answer.
+    """
+    def __init__(self, stream_id: str, max_chars: int = 65536):
+        self.id = stream_id
+        self.max_chars = max_chars
+        self.text = ""
+        self.base_offset = 0
+        self.statuses: List[dict] = []
+        self.sources: Optional[List[dict]] = None
+        self.error: Optional[str] = None
+        self.finish_reason: Optional[str] = None
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def length(self) -> int:
+        """Total characters generated so far"""
+        return self.base_offset + len(self.text)
+
+    def read(self, offset: int) -> str:
+        """Text from `offset` to the end. Offsets before base_offset are no longer buffered."""
+        return self.text[offset - self.base_offset:]
+
+    def append(self, delta: str):
+        self.text += delta
+        overflow = len(self.text) - self.max_chars
+        if overflow > 0:
+            self.text = self.text[overflow:]
+            self.base_offset += overflow
+        self._notify()
+
+    def add_status(self, stage: str, data: dict):
+        """Record a progress event (e.g. retrieval stages) ahead of the answer"""
+        self.statuses.append({"stage": stage, **data})
+        self._notify()
+
+    def set_sources(self, sources: List[dict]):
+        self.sources = sources
+        self._notify()
+
+    def finish(self, error: Optional[str] = None, finish_reason: Optional[str] = None):
+        """Mark the response complete. finish_reason is e.g. stop, length, cancelled or time_budget."""
+        self.error = error
+        self.finish_reason = finish_reason
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self):
+        # Wake everyone waiting on the current event, then arm a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for the buffer to change. Returns False on timeout."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class StreamRegistry:
+    """
+    Bounded, in-memory registry of the responses being generated by this worker,
+    keyed by message id, so clients can (re)attach to them.
+    Finished streams are kept for `retention_seconds`; when full, the oldest
+    finished streams are evicted first.
+    """
+    def __init__(self, max_streams: int, retention_seconds: float, buffer_max_chars: int):
+        self.max_streams = max_streams
+        self.retention_seconds = retention_seconds
+        self.buffer_max_chars = buffer_max_chars
+        self._streams: "OrderedDict[str, StreamBuffer]" = OrderedDict()
+
+    def create(self) -> StreamBuffer:
+        self._prune()
+        buffer = StreamBuffer(str(uuid.uuid4()), max_chars=self.buffer_max_chars)
+        self._streams[buffer.id] = buffer
+        return buffer
+
+    def active(self) -> List[StreamBuffer]:
+        """Responses still being generated"""
+        return [buf for buf in self._streams.values() if not buf.done]
+
+    def active_count(self) -> int:
+        """Number of responses still being generated"""
+        return len(self.active())
+
+    def get(self, stream_id: str) -> Optional[StreamBuffer]:
+        self._prune()
+        return self._streams.get(stream_id)
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [
+            sid for sid, buf in self._streams.items()
+            if buf.done and now - buf.finished_at > self.retention_seconds
+        ]
+        for sid in expired:
+            del self._streams[sid]
+
+        overflow = len(self._streams) - self.max_streams + 1
+        if overflow > 0:
+            finished = [sid for sid, buf in self._streams.items() if buf.done]
+            for sid in finished[:overflow]:
+                del self._streams[sid]
+
+
+@lru_cache(maxsize=1)
+def get_stream_registry() -> StreamRegistry:
+    """Process-wide stream registry (acts like a singleton)."""
+    return StreamRegistry(
+        max_streams=settings.sse_max_buffered_streams,
+        retention_seconds=settings.sse_stream_retention_seconds,
+        buffer_max_chars=settings.generation_buffer_max_chars
+    )
+
+
+async def event_frames(buffer: StreamBuffer, offset: int = 0) -> AsyncIterator[str]:
+    """
+    Follow a StreamBuffer from `offset` and yield SSE frames: pending `status`
+    events first, then `sources` once known, then the answer text.
+
+    Deltas are coalesced: once new text is available it is held back until
+    `sse_coalesce_ms` has passed or `sse_coalesce_chars` characters are
+    pending, then sent as a single `token` frame. Every frame's id is the
+    character offset reached, which is what a client sends back as
+    Last-Event-ID to resume. A keep-alive comment is sent when nothing has been
+    written for `sse_keepalive_seconds`.
+    """
+    max_delay = settings.sse_coalesce_ms / 1000
+    max_chars = settings.sse_coalesce_chars
+    keepalive = settings.sse_keepalive_seconds
+    offset = max(buffer.base_offset, min(offset, buffer.length))
+    # Progress events only matter before the answer starts, so a resumed reader skips them
+    status_idx = len(buffer.statuses) if offset > 0 else 0
+    sources_sent = False
+    last_write = time.monotonic()
+
+    while True:
+        if status_idx < len(buffer.statuses):
+            yield format_sse("status", buffer.statuses[status_idx], offset)
+            status_idx += 1
+            last_write = time.monotonic()
+            continue
+
+        if buffer.sources is not None and not sources_sent:
+            yield format_sse("sources", {"sources": buffer.sources}, offset)
+            sources_sent = True
+            last_write = time.monotonic()
+            continue
+
+        if buffer.length > offset:
+            window_end = time.monotonic() + max_delay
+            while not buffer.done and buffer.length - offset < max_chars:
+                remaining = window_end - time.monotonic()
+                if remaining <= 0 or not await buffer.wait(remaining):
+                    break
+            if offset < buffer.base_offset:
+                yield format_sse("error", {"message": "Reader fell behind the buffered response"}, offset)
+                yield format_sse("done", {}, offset)
+                return
+            chunk = buffer.read(offset)
+            offset += len(chunk)
+            yield format_sse("token", {"text": chunk}, offset)
+            last_write = time.monotonic()
+            continue
+
+        if buffer.done:
+            if buffer.error:
+                yield format_sse("error", {"message": buffer.error}, offset)
+            yield format_sse("done", {"finish_reason": buffer.finish_reason} if buffer.finish_reason else {}, offset)
+            return
+
+        idle = time.monotonic() - last_write
+        if not await buffer.wait(max(0.0, keepalive - idle)) and time.monotonic() - last_write >= keepalive:
+            yield KEEPALIVE_COMMENT
+            last_write = time.monotonic()
+
+
+async def legacy_frames(buffer: StreamBuffer) -> AsyncIterator[str]:
+    """
+    Follow a StreamBuffer using the original framing: a `data: [SOURCES]` JSON
+    line, raw text deltas as `data:` lines, then `data: [DONE]`.
+    """
+    offset = buffer.base_offset
+    sources_sent = False
+
+    while True:
+        if buffer.sources is not None and not sources_sent:
+            if buffer.sources:
+                yield f"data: [SOURCES]{json.dumps({'sources': buffer.sources}, separators=(',', ':'))}\n\n"
+            sources_sent = True
+            continue
+
+        if offset < buffer.base_offset:
+            yield "data: Error: Reader fell behind the buffered response\n\n"
+            yield "data: [DONE]\n\n"
+            return
+
+        if buffer.length > offset:
+            chunk = buffer.read(offset)
+            offset += len(chunk)
+            yield f"data: {chunk}\n\n"
+            continue
+
+        if buffer.done:
+            if buffer.error:
+                yield f"data: Error: {buffer.error}\n\n"
+            yield "data: [DONE]\n\n"
+            return
+
+        await buffer.wait(settings.sse_keepalive_seconds)
@@ -1,29 +1,131 @@
 
 import faiss
+import fcntl
 import os
 import json
+import threading
 import numpy as np
 import logging
+from contextlib import contextmanager
+from functools import lru_cache
 from logging import getLogger
 from src.settings import settings
-from src.services.openai_client import get_openai
+from src.services.openai_client import get_openai, EMBEDDING_TIMEOUT
+from src.services.rerank import mmr_select
+from src.services.index_factory import (
+    embedding_dim, new_index, needs_training, index_type_of, build_index, reconstruct_all, normalize, uses_inner_product
+)
+from src.services.metrics import STAGE_SECONDS, EMBEDDING_REQUESTS, EMBEDDED_TEXTS
+from src.services.store_generation import bump_store_generation
 
 logger = getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+
+def _embedding_params() -> dict:
+    params = {"model": settings.azure_openai_embedding_deployment, "timeout": EMBEDDING_TIMEOUT}
+    if settings.embedding_dimensions:
+        params["dimensions"] = settings.embedding_dimensions
+    return params
+
+
+# Azure OpenAI accepts at most this many inputs per embeddings request
+MAX_EMBEDDING_INPUTS = 2048
+
+
+def embed_texts(texts: list[str], batch_size: int = 20) -> np.ndarray:
+    """Embed document chunks in batches, returned as an (n, dim) float32 array"""
+    openai = get_openai()
+    embeddings = []
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i+batch_size]
+        resp = openai.embeddings.create(input=batch, **_embedding_params())
+        EMBEDDING_REQUESTS.inc(operation="documents")
+        EMBEDDED_TEXTS.inc(len(batch), operation="documents")
+        for d in resp.data:
+            embeddings.append(d.embedding)
+    return np.array(embeddings).astype("float32")
+
+
+def relevance(score: float) -> float:
+    """Cosine similarity of unit vectors as a relevance score in [0, 1] (higher is better)"""
+    return min(max(float(score), 0.0), 1.0)
+
+
+class StoreSnapshot:
+    """
+    One consistent version of the index and its metadata. A published snapshot
+    is never modified: a search takes one reference and maps the ids it finds
+    to the metadata of that same version, while writers build the next one.
+    """
+    __slots__ = ("index", "metadata", "_positions")
+
+    def __init__(self, index: faiss.Index, metadata: list[dict]):
+        self.index = index
+        self.metadata = metadata
+        # document_id -> positions of its chunks, built on first use
+        self._positions: dict[str, list[int]] | None = None
+
+    def chunk_positions(self, document_id: str) -> list[int]:
+        """Positions of a document's chunks in the index and metadata, in order"""
+        if self._positions is None:
+            positions = {}
+            for i, meta in enumerate(self.metadata):
+                positions.setdefault(meta.get("document_id"), []).append(i)
+            self._positions = positions
+        return self._positions.get(document_id, [])
+
+    def hits(self, scores: np.ndarray, idxs: np.ndarray) -> list[tuple[str, dict, float]]:
+        """One row of index.search output as (text, metadata, relevance) tuples"""
+        results = []
+        for score, idx in zip(scores, idxs):
+            if idx == -1 or idx >= len(self.metadata):
+                continue
+            meta = self.metadata[idx]
+            results.append((meta["text"], meta, relevance(score)))
+        return results
+
+
 class VectorStore:
     """
     A minimal disk‑persisted FAISS + JSON vector store.
-    Stores vectors in a single IndexFlatL2 index and maps them to text & metadata.
+    Stores vectors in a single FAISS index and maps them to text & metadata.
+    The index type (flat or quantised) follows settings.vector_index_type.
+    Vectors are normalised on insert and searched by inner product, so every
+    score the store returns is a cosine-similarity relevance in [0, 1].
+
+    Searches run on the current StoreSnapshot without locking. Writers change a
+    private copy (the draft) and publish it as the new snapshot when they save
+    or release the write lock, so a search never sees an index being modified.
     """
     def __init__(self):
         self.index_path = os.path.join(settings.vector_store_path, settings.faiss_index_file)
         self.meta_path = os.path.join(settings.vector_store_path, settings.metadata_file)
+        self.lock_path = os.path.join(settings.vector_store_path, ".lock")
         self._ensure_storage_dir()
-        self.index, self.metadata = self._load_or_init()
+        # Held by writers (add, save, reload); readers never take it
+        self.lock = threading.RLock()
+        self._write_depth = 0
+        with STAGE_SECONDS.time(stage="store_load"):
+            self._snapshot = StoreSnapshot(*self._load_or_init())
+        self._draft: StoreSnapshot | None = None
+        self._loaded_mtime = self._saved_mtime()
     
     def __len__(self):
-        return len(self.metadata)
+        return len(self._snapshot.metadata)
+
+    @property
+    def snapshot(self) -> StoreSnapshot:
+        """The current published version; keep the reference for any multi-step read"""
+        return self._snapshot
+
+    @property
+    def index(self) -> faiss.Index:
+        return self._snapshot.index
+
+    @property
+    def metadata(self) -> list[dict]:
+        return self._snapshot.metadata
 
     def _ensure_storage_dir(self):
         os.makedirs(settings.vector_store_path, exist_ok=True)
@@ -33,15 +135,101 @@ class VectorStore:
             index = faiss.read_index(self.index_path)
             with open(self.meta_path, "r", encoding="utf-8") as f:
                 metadata = json.load(f)
+            if index.d != embedding_dim():
+                raise RuntimeError(
+                    f"Vector index has {index.d} dimensions but EMBEDDING_DIMENSIONS implies {embedding_dim()}; "
+                    f"run python -m src.cli.migrate_index"
+                )
+            if index_type_of(index) != settings.vector_index_type and index.ntotal:
+                logger.warning(
+                    f"Vector index is {index_type_of(index)} but VECTOR_INDEX_TYPE={settings.vector_index_type}; "
+                    f"run python -m src.cli.migrate_index to convert it"
+                )
+            if not uses_inner_product(index):
+                # Stores written before the switch from L2 distance; converted in
+                # memory here and persisted by the next save (or migrate_index)
+                logger.warning("Vector index uses L2 distance; converting to normalised inner product")
+                index_type = index_type_of(index)
+                index = build_index(index_type, reconstruct_all(index)) if index.ntotal else new_index(index_type, index.d)
         else:
-            index = faiss.IndexFlatL2(1536)  # GPT‑4 / text‑embedding‑3‑large dimension
+            # Trained index types start flat until there is enough data to train on
+            initial = "flat" if needs_training(settings.vector_index_type) else settings.vector_index_type
+            index = new_index(initial, embedding_dim())
             metadata = []
         return index, metadata
 
+    def _saved_mtime(self) -> tuple | None:
+        # metadata is written last, so its mtime (and size) marks a complete save
+        try:
+            stat = os.stat(self.meta_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
     def save(self):
-        faiss.write_index(self.index, self.index_path)
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+        # Write to temp files and rename so other workers never read a partial save
+        with self.lock:
+            snapshot = self._draft or self._snapshot
+            faiss.write_index(snapshot.index, self.index_path + ".tmp")
+            with open(self.meta_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(snapshot.metadata, f, ensure_ascii=False, indent=2)
+            os.replace(self.index_path + ".tmp", self.index_path)
+            os.replace(self.meta_path + ".tmp", self.meta_path)
+            self._publish()
+            self._loaded_mtime = self._saved_mtime()
+            bump_store_generation()
+
+    def _editable(self) -> StoreSnapshot:
+        """The draft writers modify, copied from the published snapshot on first use (lock held)"""
+        if self._draft is None:
+            self._draft = StoreSnapshot(faiss.clone_index(self._snapshot.index), list(self._snapshot.metadata))
+        self._draft._positions = None
+        return self._draft
+
+    def _publish(self):
+        if self._draft is not None:
+            self._snapshot, self._draft = self._draft, None
+
+    @contextmanager
+    def write_lock(self):
+        """
+        Exclusive access for writers, across threads and across worker processes
+        sharing the same files. The store is brought up to date on entry so a
+        write never overwrites another worker's save. Changes not saved by the
+        time the outermost write_lock exits are published then; if it exits with
+        an error they are dropped.
+        """
+        with self.lock:
+            self._write_depth += 1
+            try:
+                if self._write_depth > 1:
+                    yield
+                    return
+                with open(self.lock_path, "a") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    self.refresh_if_stale()
+                    try:
+                        yield
+                    except BaseException:
+                        self._draft = None
+                        raise
+                    self._publish()
+            finally:
+                self._write_depth -= 1
+
+    def refresh_if_stale(self):
+        """Reload the index if another process (e.g. a sibling worker) saved it since we loaded"""
+        if self._saved_mtime() == self._loaded_mtime:
+            return
+        with self.lock:
+            mtime = self._saved_mtime()
+            if mtime == self._loaded_mtime:
+                return
+            with STAGE_SECONDS.time(stage="store_load"):
+                index, metadata = self._load_or_init()
+            self._snapshot = StoreSnapshot(index, metadata)
+            self._loaded_mtime = mtime
+            logger.info(f"Reloaded vector store from disk ({len(metadata)} chunks)")
 
     # --------------------
     # Public API
@@ -49,56 +237,175 @@ class VectorStore:
     def add_texts(self, texts: list[str], meta: list[dict]):
         if len(texts) == 0:
             return
-        openai = get_openai()
-        # Batch embeddings
-        embeddings = []
-        for i in range(0, len(texts), 20):
-            batch = texts[i:i+20]
-            resp = openai.embeddings.create(
-                input=batch,
-                model=settings.azure_openai_embedding_deployment
-            )
-            for d in resp.data:
-                embeddings.append(d.embedding)
-        emb_np = np.array(embeddings).astype("float32")
-        self.index.add(emb_np)
-        self.metadata.extend(meta)
-        self.save()
-
-    def similarity_search(self, query: str, k: int = 4) -> list[tuple[str, dict, float]]:
-        openai = get_openai()
-        emb = openai.embeddings.create(
-            input=[query],
-            model=settings.azure_openai_embedding_deployment
-        ).data[0].embedding
-        emb_np = np.array([emb]).astype("float32")
-        distances, idxs = self.index.search(emb_np, k)
+        self.add_embeddings(embed_texts(texts), meta)
+
+    def add_embeddings(self, vectors: np.ndarray, meta: list[dict], save: bool = True):
+        """Add precomputed vectors with their metadata"""
+        with self.write_lock():
+            draft = self._editable()
+            draft.index.add(normalize(vectors))
+            draft.metadata.extend(meta)
+            self._maybe_quantize(draft)
+            if save:
+                self.save()
+
+    def delete_document(self, document_id: str) -> int:
+        """
+        Remove a document's chunks and save once. The remaining vectors are kept as
+        stored (no re-embedding or re-training), and readers and other workers only
+        ever see the store before or after the delete. Returns the number of
+        chunks removed.
+        """
+        with self.write_lock():
+            positions = (self._draft or self._snapshot).chunk_positions(document_id)
+            if not positions:
+                return 0
+            draft = self._editable()
+            draft.index.remove_ids(np.array(positions, dtype="int64"))
+            removed = set(positions)
+            draft.metadata[:] = [meta for i, meta in enumerate(draft.metadata) if i not in removed]
+            self.save()
+        logger.info(f"Deleted {len(positions)} chunks of document {document_id}")
+        return len(positions)
+
+    def _maybe_quantize(self, draft: StoreSnapshot):
+        """Convert a flat index to the configured trained type once there is enough data"""
+        target = settings.vector_index_type
+        if index_type_of(draft.index) != "flat" or not needs_training(target):
+            return
+        if draft.index.ntotal < settings.quantization_min_vectors:
+            return
+        with STAGE_SECONDS.time(stage="index_quantize"):
+            draft.index = build_index(target, reconstruct_all(draft.index))
+        logger.info(f"Converted vector index to {target} ({draft.index.ntotal} vectors)")
+
+    def similarity_search(self, query: str, k: int = 4, query_embedding: np.ndarray = None) -> list[tuple[str, dict, float]]:
+        """Top-k chunks as (text, metadata, relevance) tuples, most relevant first"""
+        emb_np = normalize(query_embedding) if query_embedding is not None else self.embed_query(query)
+        snapshot = self._snapshot
+        with STAGE_SECONDS.time(stage="vector_search"):
+            scores, idxs = snapshot.index.search(emb_np, k)
+        return snapshot.hits(scores[0], idxs[0])
+
+    def batch_similarity_search(self, queries: list[str], k: int = 4, query_embeddings: np.ndarray = None) -> list[list[tuple[str, dict, float]]]:
+        """
+        similarity_search for many queries at once: the queries are embedded in
+        as few requests as the API allows and searched with a single
+        index.search over the (n, dim) matrix. Returns one result list per
+        query, in query order.
+        """
+        if not queries:
+            return []
+        emb_np = normalize(query_embeddings) if query_embeddings is not None else self.embed_queries(queries)
+        snapshot = self._snapshot
+        with STAGE_SECONDS.time(stage="vector_search"):
+            scores, idxs = snapshot.index.search(emb_np, k)
+        return [snapshot.hits(row_scores, row_idxs) for row_scores, row_idxs in zip(scores, idxs)]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 50, lambda_mult: float = 0.7, query_embedding: np.ndarray = None) -> list[tuple[str, dict, float]]:
+        """
+        Two-stage retrieval: over-fetch fetch_k nearest neighbours, then rerank
+        them with MMR using the stored vectors so the k chunks returned are both
+        relevant and non-redundant. Scores are the same relevance values as
+        similarity_search.
+        """
+        emb_np = normalize(query_embedding) if query_embedding is not None else self.embed_query(query)
+        snapshot = self._snapshot
+        with STAGE_SECONDS.time(stage="vector_search"):
+            scores, idxs = snapshot.index.search(emb_np, max(k, fetch_k))
+            candidates = [
+                (int(idx), relevance(score)) for score, idx in zip(scores[0], idxs[0])
+                if idx != -1 and idx < len(snapshot.metadata)
+            ]
+            if not candidates:
+                return []
+
+            ids = np.array([idx for idx, _ in candidates], dtype="int64")
+            vectors = snapshot.index.reconstruct_batch(ids)
+            order = mmr_select(emb_np[0], vectors, k, lambda_mult)
+
         results = []
-        for dist, idx in zip(distances[0], idxs[0]):
-            if idx == -1 or idx >= len(self.metadata):
-                continue
-            meta = self.metadata[idx]
-            text = meta["text"]
-            results.append((text, meta, float(dist)))
+        for pos in order:
+            idx, score = candidates[pos]
+            meta = snapshot.metadata[idx]
+            results.append((meta["text"], meta, score))
         return results
-    
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a single query, returned as a normalised (1, dim) float32 array ready for index.search"""
+        openai = get_openai()
+        with STAGE_SECONDS.time(stage="query_embedding"):
+            emb = openai.embeddings.create(
+                input=[query],
+                **_embedding_params()
+            ).data[0].embedding
+        EMBEDDING_REQUESTS.inc(operation="query")
+        EMBEDDED_TEXTS.inc(operation="query")
+        return normalize([emb])
+
+    def embed_queries(self, queries: list[str]) -> np.ndarray:
+        """
+        Embed several queries in one request (one per MAX_EMBEDDING_INPUTS
+        queries), as a normalised (n, dim) float32 array
+        """
+        embeddings = []
+        with STAGE_SECONDS.time(stage="query_embedding"):
+            for i in range(0, len(queries), MAX_EMBEDDING_INPUTS):
+                batch = queries[i:i + MAX_EMBEDDING_INPUTS]
+                resp = get_openai().embeddings.create(input=batch, **_embedding_params())
+                EMBEDDING_REQUESTS.inc(operation="query")
+                EMBEDDED_TEXTS.inc(len(batch), operation="query")
+                embeddings.extend(d.embedding for d in resp.data)
+        return normalize(embeddings)
+
+    def score_texts(self, query_embedding: np.ndarray, texts: list[str]) -> list[float]:
+        """
+        Relevance of each text to an already-embedded query, on the same scale
+        as similarity_search. All texts are embedded in one request.
+        """
+        if not texts:
+            return []
+        resp = get_openai().embeddings.create(input=texts, **_embedding_params())
+        EMBEDDING_REQUESTS.inc(operation="similarity")
+        EMBEDDED_TEXTS.inc(len(texts), operation="similarity")
+        vectors = normalize([d.embedding for d in resp.data])
+        return [relevance(score) for score in vectors @ normalize(query_embedding)[0]]
+
     def compute_text_similarity(self, text1: str, text2: str) -> float:
         """
-        Compute L2 distance between two text strings using the same embedding model.
-        Returns the same type of distance score as similarity_search.
+        Relevance of text2 to text1 using the same embedding model.
+        Returns the same type of score as similarity_search.
         """
         openai = get_openai()
-        
+
         # Get embeddings for both texts
         resp = openai.embeddings.create(
             input=[text1, text2],
-            model=settings.azure_openai_embedding_deployment
+            **_embedding_params()
         )
-        
-        emb1 = np.array(resp.data[0].embedding).astype("float32")
-        emb2 = np.array(resp.data[1].embedding).astype("float32")
-        
-        # Compute L2 distance (same as FAISS IndexFlatL2)
-        distance = np.linalg.norm(emb1 - emb2)
-        
-        return float(distance)
+        EMBEDDING_REQUESTS.inc(operation="similarity")
+        EMBEDDED_TEXTS.inc(2, operation="similarity")
+
+        emb1, emb2 = normalize([resp.data[0].embedding, resp.data[1].embedding])
+        return relevance(emb1 @ emb2)
+
+
+_shared_store_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _shared_store() -> VectorStore:
+    return VectorStore()
+
+
+def get_vector_store() -> VectorStore:
+    """
+    Process-wide vector store (acts like a singleton), so the index is read from
+    disk once per worker rather than on every request. Picks up saves made by
+    other workers before returning.
+    """
+    # Requests can arrive while warm-up is still loading the index
+    with _shared_store_lock:
+        store = _shared_store()
+    store.refresh_if_stale()
+    return store
@@ -1,4 +1,5 @@
 from src.settings import settings
+from src.services.metrics import STAGE_SECONDS, WEB_SEARCHES
 from typing import List, Optional
 import urllib.request
 import urllib.parse
@@ -25,7 +26,7 @@ class SearchResult:
 class BraveSearchService:  
     def __init__(self):  
         self.api_key = settings.brave_api_key  
-        self.base_url = "https://api.search.brave.com/res/v1/web/search"
+        self.base_url = settings.brave_search_url
         self.timeout = 10
       
     def search(self, query: str, count: int = 5) -> List[SearchResult]:
@@ -77,33 +78,41 @@ class BraveSearchService:
             logger.info(f"Searching Brave API for: {query}")
             
             # Make the request
-            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            with STAGE_SECONDS.time(stage="web_search"), urllib.request.urlopen(request, timeout=self.timeout) as response:
                 # Check status code
                 if response.getcode() != 200:
                     logger.error(f"Brave API error: {response.getcode()}")
+                    WEB_SEARCHES.inc(outcome="error")
                     return []
                 
                 # Read and parse JSON response
                 response_data = response.read().decode('utf-8')
                 data = json.loads(response_data)
+                WEB_SEARCHES.inc(outcome="ok")
                 return self._parse_results(data)
                 
         except urllib.error.HTTPError as e:
             if e.code == 429:
                 logger.warning("Brave API rate limit exceeded")
+                WEB_SEARCHES.inc(outcome="rate_limited")
             elif e.code == 401:
                 logger.error("Brave API authentication failed - check API key")
+                WEB_SEARCHES.inc(outcome="error")
             else:
                 logger.error(f"Brave API HTTP error: {e.code} - {e.reason}")
+                WEB_SEARCHES.inc(outcome="error")
             return []
         except urllib.error.URLError as e:
             logger.error(f"Brave API connection error: {str(e)}")
+            WEB_SEARCHES.inc(outcome="error")
             return []
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse Brave API response: {str(e)}")
+            WEB_SEARCHES.inc(outcome="error")
             return []
         except Exception as e:
             logger.error(f"Unexpected error during Brave search: {str(e)}")
+            WEB_SEARCHES.inc(outcome="error")
             return []
     
     def _parse_results(self, data: dict) -> List[SearchResult]:
@@ -0,0 +1,150 @@
+import json
+import logging
+import math
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import numpy as np
+from src.services.metrics import WEB_SEARCH_DECISIONS, WEB_SEARCH_SECONDS
+from src.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Whole words only: "new" must not fire on "news" or "renewal"
+TEMPORAL = re.compile(
+    r"\b(latest|recent(ly)?|current(ly)?|today|tonight|yesterday|right now|as of now|this (week|month|year)|"
+    r"up[- ]to[- ]date|breaking|news|20[2-9]\d)\b",
+    re.IGNORECASE,
+)
+WEB_TOPIC = re.compile(
+    r"\b(weather|forecast|stocks?|share price|prices?|markets?|elections?|exchange rate|"
+    r"released?|announce(d|ment)|web|internet|online|(?-i:AI))\b",
+    re.IGNORECASE,
+)
+_TOKENS = re.compile(r"\w+")
+
+
+@dataclass
+class WebSearchDecision:
+    search: bool
+    reason: str
+    best_score: float
+    probability: Optional[float] = None
+
+
+class WebSearchClassifier:
+    """
+    Logistic regression over hashed word and word-pair features of the query
+    plus the best document score, loaded from JSON written by
+    python -m src.cli.train_web_gate. Scoring a query takes microseconds.
+    """
+    def __init__(self, buckets: int, weights: List[float], bias: float, score_weight: float, threshold: float = 0.5):
+        self.buckets = buckets
+        self.weights = np.asarray(weights, dtype="float32")
+        self.bias = bias
+        self.score_weight = score_weight
+        self.threshold = threshold
+
+    @staticmethod
+    def features(query: str, buckets: int) -> np.ndarray:
+        """Indices of the hashed unigrams and bigrams of a query"""
+        words = _TOKENS.findall(query.lower())
+        grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        return np.unique([zlib.crc32(gram.encode("utf-8")) % buckets for gram in grams]).astype("int64")
+
+    @classmethod
+    def load(cls, path: str) -> "WebSearchClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["buckets"], data["weights"], data["bias"], data["score_weight"], data.get("threshold", 0.5))
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"buckets": self.buckets, "weights": self.weights.round(5).tolist(), "bias": self.bias,
+                       "score_weight": self.score_weight, "threshold": self.threshold}, f)
+
+    def probability(self, query: str, best_score: float) -> float:
+        """Estimated chance that web results help answer the query"""
+        z = self.bias + self.score_weight * best_score + float(self.weights[self.features(query, self.buckets)].sum())
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+
+
+class WebSearchGate:
+    """
+    Decides per chat turn whether to call web search, in order:
+    1. WEB_SEARCH_MODE=always / never.
+    2. Search when no document chunk reaches min_score (documents can't answer).
+    3. Otherwise ask the classifier if one is configured,
+    4. or search for time-sensitive / web-native questions (whole-word patterns)
+       unless the documents already match strongly (keyword_max_score).
+    Every decision is counted by reason; with WEB_SEARCH_DECISION_LOG set each is
+    also appended as a JSON line, with how many web results proved relevant, to
+    tune thresholds or train the classifier on real traffic.
+    """
+    def __init__(self, min_score: float, keyword_max_score: float,
+                 classifier: Optional[WebSearchClassifier] = None, decision_log: Optional[str] = None):
+        self.min_score = min_score
+        self.keyword_max_score = keyword_max_score
+        self.classifier = classifier
+        self.decision_log = decision_log
+        self._log_lock = threading.Lock()
+
+    def decide(self, query: str, docs: List[Tuple[str, dict, float]]) -> WebSearchDecision:
+        best = max((score for _, _, score in docs), default=0.0)
+        decision = self.evaluate(query, best)
+        WEB_SEARCH_DECISIONS.inc(decision="search" if decision.search else "skip", reason=decision.reason)
+        return decision
+
+    def evaluate(self, query: str, best: float) -> WebSearchDecision:
+        if settings.web_search_mode != "auto":
+            return WebSearchDecision(settings.web_search_mode == "always", settings.web_search_mode, best)
+        if best < self.min_score:
+            return WebSearchDecision(True, "low_document_score", best)
+        if self.classifier:
+            probability = self.classifier.probability(query, best)
+            return WebSearchDecision(probability >= self.classifier.threshold, "classifier", best, probability)
+        if best >= self.keyword_max_score:
+            return WebSearchDecision(False, "strong_documents", best)
+        if TEMPORAL.search(query):
+            return WebSearchDecision(True, "temporal", best)
+        if WEB_TOPIC.search(query):
+            return WebSearchDecision(True, "web_topic", best)
+        return WebSearchDecision(False, "documents_sufficient", best)
+
+    def record(self, query: str, decision: WebSearchDecision, seconds: float = 0.0, results: int = 0, relevant: int = 0):
+        """Account for a decision once the search (if any) is done"""
+        if decision.search:
+            WEB_SEARCH_SECONDS.inc(seconds, reason=decision.reason)
+        if not self.decision_log:
+            return
+        entry = {
+            "ts": round(time.time(), 3), "query": query, "search": decision.search, "reason": decision.reason,
+            "best_score": round(decision.best_score, 4), "probability": decision.probability,
+            "seconds": round(seconds, 3), "results": results, "relevant": relevant
+        }
+        try:
+            with self._log_lock, open(self.decision_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write web search decision log: {e}")
+
+
+@lru_cache(maxsize=1)
+def get_web_search_gate() -> WebSearchGate:
+    """Process-wide web search gate (acts like a singleton); loads the classifier once."""
+    classifier = None
+    if settings.web_search_classifier_path:
+        try:
+            classifier = WebSearchClassifier.load(settings.web_search_classifier_path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Web search classifier not loaded, using keyword rules: {e}")
+    return WebSearchGate(
+        min_score=settings.web_search_min_score,
+        keyword_max_score=settings.web_search_keyword_max_score,
+        classifier=classifier,
+        decision_log=settings.web_search_decision_log
+    )
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -7,15 +8,148 @@ class Settings(BaseSettings):
     azure_openai_deployment: str            # Chat completion deployment name
     azure_openai_embedding_deployment: str  # Embeddings deployment name
     openai_model_temperature: float = 0.7
+
+    # Model routing: short, simple turns go to a cheaper/faster deployment if set
+    azure_openai_fast_deployment: str | None = None
+    routing_fast_max_chars: int = 200       # longer questions stay on the main deployment
+    completion_max_tokens: int = 1024       # per-turn output cap, main deployment
+    fast_completion_max_tokens: int = 512   # per-turn output cap, fast deployment
+    completion_time_budget_seconds: float = 90.0  # wall-clock cap on a chat turn: retrieval, request and streaming
+    openai_api_version: str = "2024-10-21"   # stream usage and cached-token counts need 2024-10-21+
+
+    # Azure OpenAI HTTP clients: pooled keep-alive connections shared by all requests
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    openai_keepalive_expiry: float = 30.0     # seconds an idle connection is kept open
+    openai_http2: bool = False                # requires the h2 package (httpx[http2])
+    openai_connect_timeout: float = 5.0
+    openai_embedding_timeout: float = 30.0
+    openai_completion_timeout: float = 120.0
+    openai_max_retries: int = 2               # retries on connection errors, 429 and 5xx
+
     brave_api_key: str
+    brave_search_url: str = "https://api.search.brave.com/res/v1/web/search"
 
     vector_store_path: str = "/app/data/vector_store"
     faiss_index_file: str = "faiss.index"
     metadata_file: str = "metadata.json"
 
+    # Index compression. "flat" keeps raw float32 vectors (4 bytes/dim); "fp16" (2),
+    # "sq8" (1) and "pq" (pq_m bytes per vector) trade some recall for memory.
+    # sq8/pq need training, so the store stays flat until it holds
+    # quantization_min_vectors vectors and is then converted.
+    # embedding_dimensions requests shortened text-embedding-3 vectors; changing
+    # either setting on an existing store needs python -m src.cli.migrate_index.
+    vector_index_type: Literal["flat", "fp16", "sq8", "pq"] = "flat"
+    embedding_dimensions: int | None = None
+    pq_m: int = 64
+    pq_nbits: int = 8
+    quantization_min_vectors: int = 10000
+
+    # PDF text extraction. Page text is cached under documents_dir by file hash and
+    # extractor, so re-chunking or re-ingesting a file never parses it again.
+    # pypdfium2 is several times faster than pypdf; pypdfium2 and pdfminer are optional extras.
+    documents_dir: str = "/app/data/documents"
+    pdf_extractor: Literal["pypdf", "pypdfium2", "pdfminer"] = "pypdf"
+    pdf_extract_workers: int = 4          # processes per large PDF (1 = extract in-process)
+    pdf_parallel_min_pages: int = 40      # smaller PDFs are extracted in-process
+    # Citation previews: page thumbnails (rendered with the pdfium extra) are kept in an
+    # LRU disk cache under documents_dir/thumbnails, trimmed to preview_cache_max_mb.
+    preview_cache_max_mb: int = 256
+    thumbnail_width: int = 300            # default width in pixels
+    thumbnail_max_width: int = 1200
+
     chunk_size: int = 800      # characters
     chunk_overlap: int = 200   # characters overlap between chunks
 
+    # Retrieval: "similarity" takes the raw top-k neighbours, "mmr" over-fetches
+    # retrieval_fetch_k candidates and reranks them for relevance + diversity.
+    # Diverse chunks cover the same ground in fewer slots, so mmr passes mmr_k.
+    retrieval_mode: Literal["similarity", "mmr"] = "similarity"
+    retrieval_k: int = 4         # chunks passed to the model as context
+    mmr_k: int = 3               # chunks passed to the model as context in mmr mode
+    retrieval_fetch_k: int = 50  # candidates considered by the reranker
+    mmr_lambda: float = 0.7      # 1.0 = pure relevance, 0.0 = pure diversity
+    # Relevance scores are cosine similarities in [0, 1] (higher is better).
+    # text-embedding-3 scores on-topic chunks around 0.4-0.7 and unrelated text below 0.25.
+    retrieval_min_score: float = 0.3     # weaker chunks are dropped from context and sources
+    batch_search_max_queries: int = 2048  # per POST /documents/search:batch request
+    web_search_min_score: float = 0.45   # search the web when no chunk scores this well
+
+    # Web search gating (see web_search_gate): "auto" searches when documents score
+    # below web_search_min_score, or for time-sensitive/web-topic questions unless a
+    # chunk scores web_search_keyword_max_score. A trained classifier replaces the
+    # keyword rules; the decision log (JSON lines) is what it is trained on.
+    web_search_mode: Literal["auto", "always", "never"] = "auto"
+    web_search_keyword_max_score: float = 0.6
+    web_search_classifier_path: str | None = None
+    web_search_decision_log: str | None = None
+
+    # Retrieval query for follow-ups ("what about section 3?", see
+    # query_builder.is_follow_up): "heuristic" joins them with the earlier
+    # questions they continue (document retrieval only), "llm" has a small model
+    # (query_condensation_deployment, else the fast, else the main deployment)
+    # rewrite them, cached per conversation state. Multi-part questions become up
+    # to query_max_subqueries queries, embedded in one request and merged.
+    query_condensation: Literal["off", "heuristic", "llm"] = "heuristic"
+    query_condensation_deployment: str | None = None
+    query_condensation_history_turns: int = 6      # earlier messages considered
+    query_condensation_timeout_seconds: float = 5.0
+    query_condensation_cache_size: int = 1024
+    query_max_subqueries: int = 3
+
+    # Chat history search ranks only the newest matches of very common words,
+    # which keeps queries fast on large histories
+    chat_search_max_candidates: int = 5000
+
+    # Semantic response cache (opt-in): replay answers to near-identical questions
+    semantic_cache_enabled: bool = False
+    semantic_cache_threshold: float = 0.95   # minimum cosine similarity for a hit
+    semantic_cache_max_entries: int = 1000
+
+    # Streaming (stream_format=events): delta coalescing window, keep-alives
+    # and how long finished streams stay resumable via Last-Event-ID
+    sse_coalesce_ms: int = 30
+    sse_coalesce_chars: int = 256
+    sse_keepalive_seconds: float = 15.0
+    sse_stream_retention_seconds: float = 300.0
+    sse_max_buffered_streams: int = 256
+
+    # Responses are generated in background tasks that outlive the request
+    generation_buffer_max_chars: int = 65536  # answer text kept in memory for re-attaching clients
+    generation_cancel_poll_seconds: float = 1.0  # how often workers check for cancels sent to other workers
+
+    # Admission control (per worker). Chat turns and ingestion (upload/delete) share
+    # admission_max_active slots; queued chat requests are admitted before queued
+    # ingestion. A full queue returns 429, waiting past the timeout returns 503.
+    admission_max_active: int = 32
+    max_concurrent_generations: int = 32      # chat turns being generated at once
+    chat_queue_max: int = 64
+    chat_queue_timeout_seconds: float = 10.0
+    max_concurrent_ingestions: int = 2        # uploads/deletes running at once
+    ingest_queue_max: int = 16
+    ingest_queue_timeout_seconds: float = 120.0
+    admission_retry_after_seconds: int = 5
+
+    # FAISS OpenMP threads per worker (0 = library default). With several
+    # workers, keep workers x threads at or below the CPU count.
+    faiss_omp_threads: int = 0
+
+    # Per-stage latency histograms and counters served on /metrics
+    metrics_enabled: bool = False
+
+    # Opt-in request profiling: requests with the profiling header (equal to
+    # profiling_token when set) or a random profiling_sample_rate share are
+    # sampled and saved as speedscope files under <logs_dir>/profiles (GET /profiles)
+    logs_dir: str = "/app/data/logs"
+    profiling_enabled: bool = False
+    profiling_header: str = "X-Profile"
+    profiling_token: str | None = None
+    profiling_sample_rate: float = 0.0
+    profiling_interval_ms: float = 5.0
+    profiling_max_seconds: float = 300.0   # stop sampling (not the request) after this long
+    profiling_max_files: int = 200
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 settings = Settings()
@@ -25,7 +25,7 @@ export function ChatBubble({ message }: { message: ChatMessage }) {
           <span className="inline-block w-2 h-5 bg-gray-600 animate-pulse ml-1"></span>
         )}
       </div>
-      {!isUser && message.sources && !message.isStreaming && (
+      {!isUser && message.sources && message.sources.length > 0 && (
         <SourcesTable sources={message.sources} />
       )}
     </div>
@@ -38,7 +38,14 @@ export function SourcesTable({ sources }: SourcesTableProps) {
                         {source.filename}  
                       </a>  
                     ) : (  
-                      source.filename  
+                      <a
+                        href={`/api/documents/${source.document_id}/file#page=${source.page + 1}`}
+                        target="_blank"
+                        rel="noopener noreferrer"
+                        className="text-blue-600 hover:text-blue-800 underline"
+                      >
+                        {source.filename}
+                      </a>
                     )}  
                   </div>  
                 </td>
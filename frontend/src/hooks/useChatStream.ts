@@ -1,11 +1,27 @@
-import { useState, useCallback } from "react";
-import { parseSSE } from "../sse/sse.js";
+import { useState, useCallback, useRef } from "react";
+import { parseSSEEvents } from "../sse/sse.js";
 import { ChatMessage, SourceReference } from "../types";
 
+const MAX_RESUME_ATTEMPTS = 3;
+
+// Human-readable label for a retrieval progress event
+function describeStatus(status: { stage: string; state: string; results?: number }): string {
+  if (status.stage === "vector_search") {
+    return `Found ${status.results ?? 0} relevant passages...`;
+  }
+  if (status.stage === "web_search") {
+    return status.state === "started" ? "Searching the web..." : "Writing answer...";
+  }
+  return "Thinking...";
+}
+
 export function useChatStream(sessionId: string, onMessageSent?: () => void) {
   const [messages, setMessages] = useState<ChatMessage[]>([]);
   const [streamingMessageId, setStreamingMessageId] = useState<string | null>(null);
   const [isThinking, setIsThinking] = useState(false);
+  const [thinkingStatus, setThinkingStatus] = useState<string | null>(null);
+  // Server-side id of the response being generated, used to cancel it
+  const activeMessageId = useRef<string | null>(null);
 
   const append = (msg: ChatMessage) =>
     setMessages((prev) => [...prev, msg]);
@@ -21,8 +37,9 @@ export function useChatStream(sessionId: string, onMessageSent?: () => void) {
 
       // Show thinking state
       setIsThinking(true);
+      setThinkingStatus(null);
 
-      const resp = await fetch(`/api/chat/message?session_id=${sessionId}`, {
+      const resp = await fetch(`/api/chat/message?session_id=${sessionId}&stream_format=events`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ message: content })
@@ -34,57 +51,85 @@ export function useChatStream(sessionId: string, onMessageSent?: () => void) {
       }
 
       const assistantId = "assistant-" + Date.now();
+      const messageId = resp.headers.get("X-Message-Id");
+      activeMessageId.current = messageId;
       let assistantSources: SourceReference[] = [];
       let firstToken = true;
       let messageCompleted = false;
+      let lastEventId: string | undefined;
+      let body: ReadableStream<Uint8Array> | null = resp.body;
+      let resumeAttempts = 0;
       
       // Set streaming state
       setStreamingMessageId(assistantId);
 
-      try {
-        for await (const chunk of parseSSE(resp.body)) {
-          if (chunk === "[DONE]") {
-            messageCompleted = true;
-            break;
-          }
-          
-          if (chunk.startsWith("[SOURCES]")) {
-            const meta = JSON.parse(chunk.slice(9));
-            assistantSources = meta.sources ?? [];
-            continue;
-          }
-
-          // Hide thinking animation and create initial message on first token
-          if (firstToken) {
-            setIsThinking(false);
-            const initialMsg: ChatMessage = {
-              id: assistantId,
-              role: "assistant",
-              content: chunk,
+      const appendText = (text: string) => {
+        // Hide thinking animation and create initial message on first token
+        if (firstToken) {
+          setIsThinking(false);
+          append({
+            id: assistantId,
+            role: "assistant",
+            content: text,
+            sources: assistantSources,
+            isStreaming: true
+          });
+          firstToken = false;
+          return;
+        }
+        // Tokens arrive coalesced by the backend, so this runs once per batch
+        setMessages((prev) => {
+          const idx = prev.findIndex((m) => m.id === assistantId);
+          if (idx >= 0) {
+            const copy = [...prev];
+            const currentMsg = copy[idx];
+            copy[idx] = {
+              ...currentMsg,
+              content: currentMsg.content + text,
               isStreaming: true
             };
-            append(initialMsg);
-            firstToken = false;
-          } else {
-            // Add each subsequent token to the message content
-            setMessages((prev) => {
-              const idx = prev.findIndex((m) => m.id === assistantId);
-              if (idx >= 0) {
-                const copy = [...prev];
-                const currentMsg = copy[idx];
-                copy[idx] = {
-                  ...currentMsg,
-                  content: currentMsg.content + chunk,
-                  isStreaming: true
-                };
-                return copy;
+            return copy;
+          }
+          return prev;
+        });
+      };
+
+      try {
+        while (body && !messageCompleted) {
+          try {
+            for await (const evt of parseSSEEvents(body)) {
+              if (evt.id) lastEventId = evt.id;
+              const payload = JSON.parse(evt.data);
+
+              if (evt.event === "done") {
+                messageCompleted = true;
+                break;
               }
-              return prev;
-            });
+              if (evt.event === "status") {
+                setThinkingStatus(describeStatus(payload));
+              } else if (evt.event === "sources") {
+                // Sources arrive before the answer, so citations render while text streams
+                assistantSources = payload.sources ?? [];
+              } else if (evt.event === "error") {
+                appendText(`Error: ${payload.message}`);
+              } else if (evt.event === "token") {
+                appendText(payload.text);
+              }
+            }
+          } catch (error) {
+            console.warn("Stream interrupted:", error);
           }
 
-          // Small delay to make streaming visible even with fast tokens
-          await new Promise(resolve => setTimeout(resolve, 60));
+          // Connection dropped before the response finished. Generation carries on
+          // server-side, so re-attach and continue where we left off
+          body = null;
+          if (!messageCompleted && messageId && resumeAttempts < MAX_RESUME_ATTEMPTS) {
+            resumeAttempts += 1;
+            const resumed = await fetch(`/api/chat/messages/${messageId}/stream`, {
+              headers: lastEventId ? { "Last-Event-ID": lastEventId } : {}
+            });
+            body = resumed.ok ? resumed.body : null;
+          }
         }
 
         // Finalize the message with sources and remove streaming state
@@ -124,13 +169,26 @@ export function useChatStream(sessionId: string, onMessageSent?: () => void) {
           return prev;
         });
       } finally {
+        activeMessageId.current = null;
         setStreamingMessageId(null);
         setIsThinking(false);
+        setThinkingStatus(null);
       }
     },
     [sessionId, onMessageSent]
   );
 
+  // Stop generation server-side; the partial answer is kept and the stream ends with `done`
+  const stopGeneration = useCallback(async () => {
+    const messageId = activeMessageId.current;
+    if (!messageId) return;
+    try {
+      await fetch(`/api/chat/messages/${messageId}/cancel`, { method: "POST" });
+    } catch (error) {
+      console.error("Error cancelling response:", error);
+    }
+  }, []);
+
   const loadHistory = useCallback(async () => {
     try {
       const response = await fetch(`/api/chat/sessions/${sessionId}/history`);
@@ -163,5 +221,5 @@ export function useChatStream(sessionId: string, onMessageSent?: () => void) {
     }
   }, [sessionId]);
 
-  return { messages, sendMessage, loadHistory, streamingMessageId, isThinking };
+  return { messages, sendMessage, stopGeneration, loadHistory, streamingMessageId, isThinking, thinkingStatus };
 }
@@ -34,7 +34,8 @@ export default function ChatPage() {
   }, []);
 
   // Use the chat stream hook with the loadSessions callback
-  const { messages, sendMessage, loadHistory, isThinking } = useChatStream(sessionId, loadSessions);
+  const { messages, sendMessage, stopGeneration, loadHistory, streamingMessageId, isThinking, thinkingStatus } = useChatStream(sessionId, loadSessions);
+  const isGenerating = isThinking || streamingMessageId !== null;
 
   useEffect(() => {
     loadHistory();
@@ -133,7 +134,7 @@ export default function ChatPage() {
                       <div className="w-2 h-2 bg-gray-500 rounded-full animate-bounce" style={{animationDelay: '0.1s'}}></div>
                       <div className="w-2 h-2 bg-gray-500 rounded-full animate-bounce" style={{animationDelay: '0.2s'}}></div>
                     </div>
-                    <span className="text-gray-500 text-sm ml-2">Thinking...</span>
+                    <span className="text-gray-500 text-sm ml-2">{thinkingStatus ?? "Thinking..."}</span>
                   </div>
                 </div>
               </div>
@@ -157,13 +158,22 @@ export default function ChatPage() {
               onChange={(e) => setInput(e.target.value)}
               onKeyPress={handleKeyPress}
             />
-            <button
-              className="bg-blue-600 hover:bg-blue-700 text-white px-6 py-3 rounded-lg font-medium transition-colors"
-              onClick={handleSend}
-              disabled={input.trim().length === 0}
-            >
-              Send
-            </button>
+            {isGenerating ? (
+              <button
+                className="bg-gray-600 hover:bg-gray-700 text-white px-6 py-3 rounded-lg font-medium transition-colors"
+                onClick={stopGeneration}
+              >
+                Stop
+              </button>
+            ) : (
+              <button
+                className="bg-blue-600 hover:bg-blue-700 text-white px-6 py-3 rounded-lg font-medium transition-colors"
+                onClick={handleSend}
+                disabled={input.trim().length === 0}
+              >
+                Send
+              </button>
+            )}
           </div>
         </div>
       </main>
@@ -26,4 +26,45 @@ export async function* parseSSE(body: ReadableStream<Uint8Array>): AsyncGenerato
   } finally {
     reader.releaseLock();
   }
-} 
\ No newline at end of file
+} 
+export interface SSEEvent {
+  id?: string;
+  event: string;
+  data: string;
+}
+
+// Parses full SSE frames (id/event/data fields, comments ignored) as produced
+// by the backend's `stream_format=events` mode.
+export async function* parseSSEEvents(body: ReadableStream<Uint8Array>): AsyncGenerator<SSEEvent, void, unknown> {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  try {
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const frames = buffer.split('\n\n');
+
+      // Keep the last frame in buffer in case it's incomplete
+      buffer = frames.pop() || '';
+
+      for (const frame of frames) {
+        const evt: SSEEvent = { event: 'message', data: '' };
+        for (const line of frame.split('\n')) {
+          if (line.startsWith(':')) continue; // keep-alive comment
+          if (line.startsWith('id: ')) evt.id = line.slice(4);
+          else if (line.startsWith('event: ')) evt.event = line.slice(7);
+          else if (line.startsWith('data: ')) evt.data += line.slice(6);
+        }
+        if (evt.data) {
+          yield evt;
+        }
+      }
+    }
+  } finally {
+    reader.releaseLock();
+  }
+}